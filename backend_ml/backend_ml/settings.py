@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,6 +46,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'corsheaders',
     'django.contrib.staticfiles',
+    'ml_models',
 ]
 
 MIDDLEWARE = [
@@ -90,6 +92,48 @@ DATABASES = {
 }
 
 
+# Where the customer book is read from: "csv" (db/houseloan/sample_data.csv
+# through the in-memory store), "orm" (the ml_models.Customer table) or
+# "columnar" (a memory-mapped Arrow copy of the CSV; needs pyarrow).
+CUSTOMER_STORE_BACKEND = os.getenv("CUSTOMER_STORE_BACKEND", "csv")
+
+# Uploads to the CSV-backed stores are queued on a write-ahead log and folded
+# into the CSV once this many rows are pending or this many seconds pass.
+INGEST_COMPACT_ROWS = int(os.getenv("INGEST_COMPACT_ROWS", "1000"))
+INGEST_COMPACT_SECONDS = float(os.getenv("INGEST_COMPACT_SECONDS", "2"))
+
+# Model version served when model_weights/ACTIVE_VERSION has not been written
+# yet ("base" is the flat model_weights layout; others are sub-directories).
+# Hot swaps go through /api/admin/model-version/, guarded by MODEL_ADMIN_TOKEN
+# when it is set.
+MODEL_VERSION = os.getenv("MODEL_VERSION")
+MODEL_ADMIN_TOKEN = os.getenv("MODEL_ADMIN_TOKEN")
+
+# Pricing rule set served when ml_models/rule_sets/ACTIVE_RULE_SET has not been
+# written yet ("base" is the weights and bands built into house_loan_interest;
+# others are ml_models/rule_sets/<version>.json). Swapped through
+# /api/admin/rule-set/.
+RULE_SET_VERSION = os.getenv("RULE_SET_VERSION")
+
+# Threads XGBoost uses per RAS prediction (unset: all cores) and the rows
+# scored per in-place predict call.
+RAS_PREDICT_THREADS = int(os.getenv("RAS_PREDICT_THREADS", "0")) or None
+RAS_BATCH_ROWS = int(os.getenv("RAS_BATCH_ROWS", "4096"))
+
+# Single-quote CRS / RAS predictions kept in the in-process LRU (0 disables it).
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "50000"))
+
+# Concurrent single-row predictions are coalesced for up to this many
+# milliseconds (only while other requests are in flight) or rows.
+INFERENCE_BATCHING = os.getenv("INFERENCE_BATCHING", "1") not in ("0", "false", "False")
+INFERENCE_BATCH_WINDOW_MS = float(os.getenv("INFERENCE_BATCH_WINDOW_MS", "2"))
+INFERENCE_MAX_BATCH = int(os.getenv("INFERENCE_MAX_BATCH", "64"))
+
+# Worker processes that run model scoring outside the request threads'
+# GIL (0: score in the request thread).
+INFERENCE_POOL_WORKERS = int(os.getenv("INFERENCE_POOL_WORKERS", "0"))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -1,3 +1,9 @@
 from django.contrib import admin
+from .models import Customer
 
-# Register your models here.
+
+@admin.register(Customer)
+class CustomerAdmin(admin.ModelAdmin):
+    list_display = ("CustomerID", "CustomerName", "CreditScore", "Geography", "AddedBy", "updated_at")
+    search_fields = ("CustomerID", "CustomerName")
+    list_filter = ("Geography", "HomeOwnershipStatus")
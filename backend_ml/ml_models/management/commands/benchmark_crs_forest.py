@@ -0,0 +1,66 @@
+import time
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+
+from ml_models.utils.customer_store import get_customer_store
+from ml_models.utils.model_features import CRS_FEATURES
+from ml_models.utils.model_registry import get_models
+from ml_models.utils.house_loan import FLAT_FOREST_MAX_ROWS
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare CRS scoring through the sklearn forest's predict_proba against the "
+        "flattened forest arrays, for single rows and growing batches, and check that "
+        "both return identical probabilities."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000,
+                            help="Batch size (the book's scorable rows are tiled to reach it).")
+        parser.add_argument("--single", type=int, default=200, help="Single-row calls to time.")
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        models = get_models()
+        X = self._scaled_rows(models, options["rows"])
+        rf, forest = models.classification_model, models.crs_forest
+        self.stdout.write(f"model {models.version}: {forest.n_trees} trees, {len(forest.feature)} nodes, "
+                          f"max depth {forest.max_depth}; batch of {len(X)} rows")
+
+        expected, actual = rf.predict_proba(X), forest.predict_proba(X)
+        if not np.array_equal(expected, actual):
+            raise CommandError(f"Probabilities differ (max abs diff {np.abs(expected - actual).max():.3g}).")
+        self.stdout.write("probabilities: bit-identical")
+
+        rows = [X[i:i + 1] for i in range(min(options["single"], len(X)))]
+        single_rf = self._time(lambda: [rf.predict_proba(row) for row in rows], options["repeat"]) / len(rows)
+        single_flat = self._time(lambda: [forest.predict_proba(row) for row in rows], options["repeat"]) / len(rows)
+        self.stdout.write(f"{'rows':>8}  {'predict_proba':>14}  {'flat forest':>14}  speedup")
+        self.stdout.write(f"{1:>8}  {single_rf * 1000:11.3f} ms  {single_flat * 1000:11.3f} ms  x{single_rf / single_flat:.1f}")
+        for size in sorted({32, FLAT_FOREST_MAX_ROWS, 1000, len(X)}):
+            batch = X[:size]
+            batch_rf = self._time(lambda: rf.predict_proba(batch), options["repeat"])
+            batch_flat = self._time(lambda: forest.predict_proba(batch), options["repeat"])
+            self.stdout.write(f"{len(batch):>8}  {batch_rf * 1000:11.3f} ms  {batch_flat * 1000:11.3f} ms  "
+                              f"x{batch_rf / batch_flat:.1f}")
+        self.stdout.write(self.style.SUCCESS(
+            f"single-row speedup x{single_rf / single_flat:.1f}; CRS matrices up to "
+            f"{FLAT_FOREST_MAX_ROWS} rows are scored with the flat forest"))
+
+    def _scaled_rows(self, models, rows):
+        crs = get_customer_store().features().crs
+        crs = crs[~np.isnan(crs).any(axis=1)]
+        if not len(crs):
+            raise CommandError("The customer book has no rows with complete CRS inputs.")
+        crs = np.tile(crs, (int(np.ceil(rows / len(crs))), 1))[:rows]
+        return models.classification_scaler.transform(pd.DataFrame(crs, columns=CRS_FEATURES))
+
+    def _time(self, fn, repeat):
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - started)
+        return best
@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+
+from ml_models.utils.customer_store import CUSTOMER_CSV_PATH, read_customer_csv
+from ml_models.utils import columnar_store
+
+
+# Columns the CRS model input is assembled from.
+DEFAULT_COLUMNS = [
+    "CustomerID", "CreditScore", "Geography", "Gender", "Age", "Tenure",
+    "SavingsAccountBalance", "CheckingAccountBalance", "NumOfProducts",
+    "HasCrCard", "IsActiveMember", "AnnualIncome",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare cold reads of the customer book: full pd.read_csv (the old per-request path) "
+        "against a projected read of the memory-mapped Arrow file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100000,
+                            help="Size of the synthetic book built by tiling sample_data.csv.")
+        parser.add_argument("--columns", nargs="*", default=DEFAULT_COLUMNS)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        if columnar_store.pa is None:
+            raise CommandError("pyarrow is not installed.")
+
+        workdir = tempfile.mkdtemp(prefix="customer_bench_")
+        try:
+            csv_path = os.path.join(workdir, "book.csv")
+            self._build_book(csv_path, options["rows"])
+            started = time.perf_counter()
+            arrow_path = columnar_store.write_columnar(csv_path)
+            convert_s = time.perf_counter() - started
+
+            columns = options["columns"]
+            csv_s, csv_df = self._time(lambda: pd.read_csv(csv_path), options["repeat"])
+            arrow_s, arrow_df = self._time(
+                lambda: columnar_store.read_columnar(arrow_path, columns), options["repeat"])
+
+            csv_mb = csv_df.memory_usage(deep=True).sum() / 1e6
+            arrow_mb = arrow_df.memory_usage(deep=True).sum() / 1e6
+            self.stdout.write(f"rows={len(csv_df)} columns requested={len(columns)} "
+                              f"csv={os.path.getsize(csv_path) / 1e6:.1f}MB "
+                              f"arrow={os.path.getsize(arrow_path) / 1e6:.1f}MB "
+                              f"(conversion {convert_s:.2f}s)")
+            self.stdout.write(f"pd.read_csv (all columns)   : {csv_s * 1000:9.1f} ms  {csv_mb:8.1f} MB in pandas")
+            self.stdout.write(f"arrow mmap (projected)      : {arrow_s * 1000:9.1f} ms  {arrow_mb:8.1f} MB in pandas")
+            self.stdout.write(self.style.SUCCESS(f"speedup x{csv_s / arrow_s:.1f}"))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def _build_book(self, csv_path, rows):
+        seed = read_customer_csv(CUSTOMER_CSV_PATH)
+        reps = int(np.ceil(rows / len(seed)))
+        book = pd.concat([seed] * reps, ignore_index=True).iloc[:rows]
+        book["CustomerID"] = [f"BENCH{i:08d}" for i in range(len(book))]
+        book.to_csv(csv_path, index=False)
+
+    def _time(self, fn, repeat):
+        best, result = float("inf"), None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = fn()
+            best = min(best, time.perf_counter() - started)
+        return best, result
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from ml_models.utils.customer_store import CUSTOMER_CSV_PATH
+from ml_models.utils.ingest_log import get_ingest_log
+
+
+class Command(BaseCommand):
+    help = "Fold pending customer uploads from the ingestion log into the customer CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--csv", default=CUSTOMER_CSV_PATH, help="Customer CSV whose log to compact.")
+
+    def handle(self, *args, **options):
+        log = get_ingest_log(options["csv"])
+        pending = len(log.pending_batches())
+        written = log.compact(wait=True)
+        self.stdout.write(self.style.SUCCESS(f"Compacted {pending} batch(es), {written} rows."))
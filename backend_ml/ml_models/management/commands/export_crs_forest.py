@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ml_models.utils.crs_forest import export_forest
+from ml_models.utils.model_registry import get_models, CRS_MODEL_FILE
+
+
+class Command(BaseCommand):
+    help = (
+        "Flatten the CRS random forest (rf_model.joblib) of a model version into "
+        "contiguous node arrays (rf_model.forest.npz) used for CRS scoring."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model-version",
+                            help="Model version to export (default: the active one).")
+        parser.add_argument("--output", help="Where to write the arrays (default: next to rf_model.joblib).")
+
+    def handle(self, *args, **options):
+        try:
+            models = get_models(options["model_version"]) if options["model_version"] else get_models()
+        except (ValueError, FileNotFoundError) as e:
+            raise CommandError(str(e))
+        forest = export_forest(models.classification_model, models.file(CRS_MODEL_FILE), options["output"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported model version {models.version}: {forest.n_trees} trees, "
+            f"{len(forest.feature)} nodes, max depth {forest.max_depth}"))
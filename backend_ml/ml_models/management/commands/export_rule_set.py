@@ -0,0 +1,29 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+
+from ml_models.utils.rule_sets import get_rule_set, write_rule_set, registry
+
+
+class Command(BaseCommand):
+    help = (
+        "Write a pricing rule set (weights and health bands) as a rule-set JSON "
+        "file, e.g. the built-in base set as the starting point for a new version."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rule-set-version",
+                            help="Rule set to export (default: the active one).")
+        parser.add_argument("--output", required=True,
+                            help="File to write, or a version name (written to ml_models/rule_sets/<name>.json).")
+
+    def handle(self, *args, **options):
+        try:
+            rules = get_rule_set(options["rule_set_version"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        output = options["output"]
+        if not output.endswith(".json"):
+            os.makedirs(registry.rules_dir, exist_ok=True)
+            output = registry.path_for(output)
+        write_rule_set(rules, output)
+        self.stdout.write(self.style.SUCCESS(f"Exported rule set {rules.version} to {output}"))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ml_models.utils.ras_preprocessing import fit_ras_preprocessor, RAS_PREPROCESSOR_PATH, TRAIN_CSV_RAS
+
+
+class Command(BaseCommand):
+    help = (
+        "Fit the RAS regression preprocessing (categorical mappings, scaler and "
+        "power transform) on the training CSV and save it next to reg_final_model.pkl."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--train-csv", default=TRAIN_CSV_RAS, help="Training data for the regression model.")
+        parser.add_argument("--output", default=RAS_PREPROCESSOR_PATH, help="Where to save the fitted artifact.")
+
+    def handle(self, *args, **options):
+        try:
+            preprocessor = fit_ras_preprocessor(options["train_csv"], options["output"])
+        except (FileNotFoundError, ValueError) as e:
+            raise CommandError(str(e))
+        power = [f for f, p in zip(preprocessor.features, preprocessor.power_mask) if p]
+        self.stdout.write(f"Power-transformed columns: {', '.join(power) or 'none'}")
+        self.stdout.write(self.style.SUCCESS(f"Saved RAS preprocessor to {options['output']}"))
@@ -0,0 +1,60 @@
+import glob
+import os
+import time
+import pandas as pd
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ml_models.models import Customer
+from ml_models.utils.customer_store import customer_objects_from_frame, save_customer_objects
+
+
+DEFAULT_CSV_DIR = os.path.join(settings.BASE_DIR, 'db', 'houseloan')
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-load customer CSVs into the Customer table using batched inserts. "
+        "Defaults to every CSV in db/houseloan/, with sample_data.csv loaded last "
+        "so it wins for CustomerIDs that appear in several files."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="*", help="CSV files to load (default: db/houseloan/*.csv)")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--truncate", action="store_true",
+                            help="Delete all existing customers before loading.")
+
+    def handle(self, *args, **options):
+        paths = options["paths"] or self._default_paths()
+        missing = [p for p in paths if not os.path.exists(p)]
+        if missing:
+            raise CommandError(f"CSV file(s) not found: {', '.join(missing)}")
+
+        if options["truncate"]:
+            deleted, _ = Customer.objects.all().delete()
+            self.stdout.write(f"Deleted {deleted} existing customers.")
+
+        total = 0
+        for path in paths:
+            started = time.perf_counter()
+            df = pd.read_csv(path)
+            objs = customer_objects_from_frame(df)
+            if not objs:
+                self.stdout.write(self.style.WARNING(f"Skipped {path}: no CustomerID column."))
+                continue
+            saved = save_customer_objects(objs, batch_size=options["batch_size"])
+            total += saved
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"Loaded {saved} rows from {os.path.basename(path)} in {elapsed:.2f}s")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {total} rows written, {Customer.objects.count()} customers in table."))
+
+    def _default_paths(self):
+        paths = sorted(glob.glob(os.path.join(DEFAULT_CSV_DIR, "*.csv")))
+        main = os.path.join(DEFAULT_CSV_DIR, "sample_data.csv")
+        if main in paths:
+            paths.remove(main)
+            paths.append(main)
+        return paths
@@ -0,0 +1,186 @@
+import os
+import time
+import multiprocessing
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ml_models.utils.customer_store import get_customer_store, CUSTOMER_CSV_PATH
+from ml_models.utils.model_registry import get_models
+from ml_models.utils.rule_sets import get_rule_set
+
+
+DEFAULT_OUTPUT_DIR = os.path.join(settings.BASE_DIR, 'db', 'houseloan', 'repricing')
+
+REPRICING_COLUMNS = [
+    "CustomerID", "CRS", "RAS", "model_bps", "model_final_rate",
+    "rule_bps", "factor_bps", "market_bps", "rule_final_rate", "model_version",
+    "rule_set_version", "error",
+]
+
+# Set in each worker by _init_worker (and in-process for --workers 1).
+_options = {}
+
+
+def _init_worker(options):
+    import django
+    from django.apps import apps
+    from django.db import connections
+    if not apps.ready:  # spawn start method: the worker starts from a bare interpreter
+        django.setup()
+    # Never share the parent's database connections across a fork.
+    connections.close_all()
+    # Each repricing worker already owns a core; score in-process.
+    from ml_models.utils.inference_pool import disable_inference_pool
+    disable_inference_pool()
+    _options.clear()
+    _options.update(options)
+
+
+def _factor_bps(df, models):
+    """Combined RF+XGB factor BPS per row; NaN where a row cannot be allocated."""
+    try:
+        from ml_models.utils.issuehouseloan import factor_allocator
+        allocator = factor_allocator(models)
+    except Exception as e:
+        print(f"[WARN] Factor BPS unavailable in worker {os.getpid()}: {e}")
+        _options["factor_bps"] = False
+        return [np.nan] * len(df)
+    return allocator.allocate(df)[0]
+
+
+def _reprice_chunk(task):
+    """Prices rows [start, stop) of the book; returns (index, frame, seconds, pid)."""
+    from ml_models.utils.model_features import FeatureMatrix
+    from ml_models.utils.batch_pricing import house_loan_quotes
+
+    index, start, stop = task
+    started = time.perf_counter()
+    # Every worker prices with the versions the run started on.
+    models = get_models(_options["model_version"])
+    rules = get_rule_set(_options["rule_set_version"])
+    if models.ras_booster is not None and _options["ras_threads"] is not None:
+        models.ras_booster.set_threads(_options["ras_threads"])
+    df = get_customer_store(_options["csv"]).rows(start, stop).reset_index(drop=True)
+    if "CustomerID" in df.columns:
+        labels = df["CustomerID"].astype(str).tolist()
+    else:
+        labels = [str(i) for i in range(start, stop)]
+
+    terms = np.tile([_options["loan_amount"], _options["loan_duration"], _options["base_rate"]], (len(df), 1))
+    quotes = [quote for chunk in house_loan_quotes(labels, FeatureMatrix.from_frame(df),
+                                                   np.arange(len(df), dtype=np.int64), terms,
+                                                   chunk_size=max(len(df), 1), models=models)
+              for quote in chunk]
+
+    out = pd.DataFrame({
+        "CustomerID": labels,
+        "CRS": [q.get("CRS") for q in quotes],
+        "RAS": [q.get("RAS") for q in quotes],
+        "model_bps": [q.get("BPS") for q in quotes],
+        "model_final_rate": [q.get("FinalRate") for q in quotes],
+        "error": [q.get("error") for q in quotes],
+    })
+    out["rule_bps"] = rules.score("house_loan", df)[0]
+    out["factor_bps"] = _factor_bps(df, models) if _options["factor_bps"] else np.nan
+    out["market_bps"] = _options["market_bps"]
+    out["rule_final_rate"] = (_options["base_rate"] - out["rule_bps"] / 100
+                              - _options["market_bps"] / 100).round(4)
+    out["model_version"] = models.version
+    out["rule_set_version"] = rules.version
+    return index, out[REPRICING_COLUMNS], time.perf_counter() - started, os.getpid()
+
+
+class Command(BaseCommand):
+    help = (
+        "Reprice the whole customer book offline. The book is split into row "
+        "chunks that are priced on a process pool (CRS/RAS models, rule BPS and "
+        "factor BPS) and written in book order to a repricing CSV."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--csv", default=CUSTOMER_CSV_PATH, help="Customer book to reprice.")
+        parser.add_argument("--output", help="Repricing CSV to write (default: db/houseloan/repricing/).")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                            help="Worker processes (1 runs in-process).")
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument("--loan-amount", type=float, required=True)
+        parser.add_argument("--loan-duration", type=float, required=True)
+        parser.add_argument("--base-rate", type=float, required=True)
+        parser.add_argument("--market-bps", type=float,
+                            help="Market BPS to apply (default: fetched once via get_market_trends).")
+        parser.add_argument("--ras-threads", type=int,
+                            help="XGBoost threads per worker (default: 1 with several workers, "
+                                 "else settings.RAS_PREDICT_THREADS).")
+        parser.add_argument("--no-factor-bps", action="store_true",
+                            help="Skip the per-customer factor BPS allocation.")
+
+    def handle(self, *args, **options):
+        store = get_customer_store(options["csv"])
+        if not store.exists():
+            raise CommandError(f"Customer book not found: {options['csv']}")
+        if options["workers"] < 1 or options["chunk_size"] < 1:
+            raise CommandError("--workers and --chunk-size must be at least 1.")
+
+        # Load the snapshot before forking so workers share it copy-on-write.
+        total = len(store)
+        chunk_size = options["chunk_size"]
+        tasks = [(i, start, min(start + chunk_size, total))
+                 for i, start in enumerate(range(0, total, chunk_size))]
+
+        output = options["output"] or os.path.join(
+            DEFAULT_OUTPUT_DIR, time.strftime("reprice_%Y%m%d_%H%M%S.csv"))
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+
+        worker_options = {
+            "csv": options["csv"],
+            "loan_amount": options["loan_amount"],
+            "loan_duration": options["loan_duration"],
+            "base_rate": options["base_rate"],
+            "market_bps": self._market_bps(options["market_bps"]),
+            "factor_bps": not options["no_factor_bps"],
+            "model_version": get_models().version,
+            "rule_set_version": get_rule_set().version,
+            # Several workers each using every core would oversubscribe the CPUs.
+            "ras_threads": options["ras_threads"] if options["ras_threads"] is not None
+            else (1 if options["workers"] > 1 else None),
+        }
+        self.stdout.write(f"Repricing {total} customers in {len(tasks)} chunk(s) "
+                          f"on {options['workers']} worker(s) with model {worker_options['model_version']} "
+                          f"and rule set {worker_options['rule_set_version']} -> {output}")
+
+        started = time.perf_counter()
+        tmp_path = output + ".tmp"
+        with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+            pd.DataFrame(columns=REPRICING_COLUMNS).to_csv(f, index=False)
+            for index, frame, seconds, pid in self._run(tasks, worker_options, options["workers"]):
+                frame.to_csv(f, header=False, index=False)
+                self.stdout.write(f"  chunk {index + 1}/{len(tasks)}: {len(frame)} rows "
+                                  f"in {seconds:.2f}s (pid {pid})")
+        os.replace(tmp_path, output)
+
+        elapsed = time.perf_counter() - started
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Repriced {total} customers in {elapsed:.2f}s ({rate:.0f} customers/s): {output}"))
+
+    def _run(self, tasks, worker_options, workers):
+        if workers == 1:
+            _init_worker(worker_options)
+            for task in tasks:
+                yield _reprice_chunk(task)
+            return
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(worker_options,)) as pool:
+            # imap keeps book order while later chunks are still being priced.
+            yield from pool.imap(_reprice_chunk, tasks)
+
+    def _market_bps(self, market_bps):
+        if market_bps is not None:
+            return market_bps
+        try:
+            from ml_models.utils.market_trends import get_market_trends
+            return float(get_market_trends())
+        except Exception as e:
+            self.stdout.write(self.style.WARNING(f"Market trends unavailable ({e}); using 0 market BPS."))
+            return 0.0
@@ -0,0 +1,69 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Customer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('CustomerID', models.CharField(max_length=64, unique=True)),
+                ('CustomerName', models.CharField(blank=True, max_length=255, null=True)),
+                ('Gender', models.CharField(blank=True, max_length=32, null=True)),
+                ('MaritalStatus', models.CharField(blank=True, max_length=64, null=True)),
+                ('EmploymentStatus', models.CharField(blank=True, max_length=64, null=True)),
+                ('EducationLevel', models.CharField(blank=True, max_length=64, null=True)),
+                ('HomeOwnershipStatus', models.CharField(blank=True, max_length=64, null=True)),
+                ('BankruptcyHistory', models.CharField(blank=True, max_length=16, null=True)),
+                ('LoanPurpose', models.CharField(blank=True, max_length=64, null=True)),
+                ('PaymentHistory', models.CharField(blank=True, max_length=32, null=True)),
+                ('Geography', models.CharField(blank=True, max_length=64, null=True)),
+                ('HasCrCard', models.CharField(blank=True, max_length=16, null=True)),
+                ('IsActiveMember', models.CharField(blank=True, max_length=16, null=True)),
+                ('AddedBy', models.CharField(blank=True, max_length=64, null=True)),
+                ('Tenure', models.FloatField(blank=True, null=True)),
+                ('Age', models.FloatField(blank=True, null=True)),
+                ('AnnualIncome', models.FloatField(blank=True, null=True)),
+                ('MonthlyIncome', models.FloatField(blank=True, null=True)),
+                ('CreditScore', models.FloatField(blank=True, null=True)),
+                ('Experience', models.FloatField(blank=True, null=True)),
+                ('LoanAmount', models.FloatField(blank=True, null=True)),
+                ('LoanDuration', models.FloatField(blank=True, null=True)),
+                ('NumberOfDependents', models.FloatField(blank=True, null=True)),
+                ('MonthlyDebtPayments', models.FloatField(blank=True, null=True)),
+                ('CreditCardUtilizationRate', models.FloatField(blank=True, null=True)),
+                ('NumberOfOpenCreditLines', models.FloatField(blank=True, null=True)),
+                ('NumberOfCreditInquiries', models.FloatField(blank=True, null=True)),
+                ('DebtToIncomeRatio', models.FloatField(blank=True, null=True)),
+                ('PreviousLoanDefaults', models.FloatField(blank=True, null=True)),
+                ('LengthOfCreditHistory', models.FloatField(blank=True, null=True)),
+                ('SavingsAccountBalance', models.FloatField(blank=True, null=True)),
+                ('CheckingAccountBalance', models.FloatField(blank=True, null=True)),
+                ('TotalAssets', models.FloatField(blank=True, null=True)),
+                ('TotalLiabilities', models.FloatField(blank=True, null=True)),
+                ('UtilityBillsPaymentHistory', models.FloatField(blank=True, null=True)),
+                ('JobTenure', models.FloatField(blank=True, null=True)),
+                ('NetWorth', models.FloatField(blank=True, null=True)),
+                ('BaseInterestRate', models.FloatField(blank=True, null=True)),
+                ('InterestRate', models.FloatField(blank=True, null=True)),
+                ('MonthlyLoanPayment', models.FloatField(blank=True, null=True)),
+                ('TotalDebtToIncomeRatio', models.FloatField(blank=True, null=True)),
+                ('NumOfProducts', models.FloatField(blank=True, null=True)),
+                ('Balance', models.FloatField(blank=True, null=True)),
+                ('EstimatedSalary', models.FloatField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'customer',
+                'indexes': [models.Index(fields=['CreditScore'], name='customer_credit_score_idx'), models.Index(fields=['Geography'], name='customer_geography_idx'), models.Index(fields=['HomeOwnershipStatus'], name='customer_home_ownership_idx'), models.Index(fields=['AnnualIncome'], name='customer_annual_income_idx')],
+            },
+        ),
+    ]
@@ -1,3 +1,90 @@
 from django.db import models
 
-# Create your models here.
+
+# Numeric columns of the customer book (LOCAL_SCHEMA_COLUMNS plus the
+# Balance / EstimatedSalary columns the rule engine reads directly).
+CUSTOMER_NUMERIC_FIELDS = [
+    "Tenure", "Age", "AnnualIncome", "MonthlyIncome", "CreditScore", "Experience",
+    "LoanAmount", "LoanDuration", "NumberOfDependents", "MonthlyDebtPayments",
+    "CreditCardUtilizationRate", "NumberOfOpenCreditLines", "NumberOfCreditInquiries",
+    "DebtToIncomeRatio", "PreviousLoanDefaults", "LengthOfCreditHistory",
+    "SavingsAccountBalance", "CheckingAccountBalance", "TotalAssets", "TotalLiabilities",
+    "UtilityBillsPaymentHistory", "JobTenure", "NetWorth", "BaseInterestRate", "InterestRate",
+    "MonthlyLoanPayment", "TotalDebtToIncomeRatio", "NumOfProducts", "Balance", "EstimatedSalary",
+]
+
+# Free-text / categorical columns, stored verbatim as they arrive in uploads.
+CUSTOMER_TEXT_FIELDS = [
+    "CustomerName", "Gender", "MaritalStatus", "EmploymentStatus", "EducationLevel",
+    "HomeOwnershipStatus", "BankruptcyHistory", "LoanPurpose", "PaymentHistory",
+    "Geography", "HasCrCard", "IsActiveMember", "AddedBy",
+]
+
+CUSTOMER_FIELDS = ["CustomerID"] + CUSTOMER_TEXT_FIELDS + CUSTOMER_NUMERIC_FIELDS
+
+
+class Customer(models.Model):
+    """
+    One row of the customer book. Field names mirror the CSV column names so
+    rows read through the ORM line up with rows read from sample_data.csv.
+    """
+    CustomerID = models.CharField(max_length=64, unique=True)
+
+    CustomerName = models.CharField(max_length=255, null=True, blank=True)
+    Gender = models.CharField(max_length=32, null=True, blank=True)
+    MaritalStatus = models.CharField(max_length=64, null=True, blank=True)
+    EmploymentStatus = models.CharField(max_length=64, null=True, blank=True)
+    EducationLevel = models.CharField(max_length=64, null=True, blank=True)
+    HomeOwnershipStatus = models.CharField(max_length=64, null=True, blank=True)
+    BankruptcyHistory = models.CharField(max_length=16, null=True, blank=True)
+    LoanPurpose = models.CharField(max_length=64, null=True, blank=True)
+    PaymentHistory = models.CharField(max_length=32, null=True, blank=True)
+    Geography = models.CharField(max_length=64, null=True, blank=True)
+    HasCrCard = models.CharField(max_length=16, null=True, blank=True)
+    IsActiveMember = models.CharField(max_length=16, null=True, blank=True)
+    AddedBy = models.CharField(max_length=64, null=True, blank=True)
+
+    Tenure = models.FloatField(null=True, blank=True)
+    Age = models.FloatField(null=True, blank=True)
+    AnnualIncome = models.FloatField(null=True, blank=True)
+    MonthlyIncome = models.FloatField(null=True, blank=True)
+    CreditScore = models.FloatField(null=True, blank=True)
+    Experience = models.FloatField(null=True, blank=True)
+    LoanAmount = models.FloatField(null=True, blank=True)
+    LoanDuration = models.FloatField(null=True, blank=True)
+    NumberOfDependents = models.FloatField(null=True, blank=True)
+    MonthlyDebtPayments = models.FloatField(null=True, blank=True)
+    CreditCardUtilizationRate = models.FloatField(null=True, blank=True)
+    NumberOfOpenCreditLines = models.FloatField(null=True, blank=True)
+    NumberOfCreditInquiries = models.FloatField(null=True, blank=True)
+    DebtToIncomeRatio = models.FloatField(null=True, blank=True)
+    PreviousLoanDefaults = models.FloatField(null=True, blank=True)
+    LengthOfCreditHistory = models.FloatField(null=True, blank=True)
+    SavingsAccountBalance = models.FloatField(null=True, blank=True)
+    CheckingAccountBalance = models.FloatField(null=True, blank=True)
+    TotalAssets = models.FloatField(null=True, blank=True)
+    TotalLiabilities = models.FloatField(null=True, blank=True)
+    UtilityBillsPaymentHistory = models.FloatField(null=True, blank=True)
+    JobTenure = models.FloatField(null=True, blank=True)
+    NetWorth = models.FloatField(null=True, blank=True)
+    BaseInterestRate = models.FloatField(null=True, blank=True)
+    InterestRate = models.FloatField(null=True, blank=True)
+    MonthlyLoanPayment = models.FloatField(null=True, blank=True)
+    TotalDebtToIncomeRatio = models.FloatField(null=True, blank=True)
+    NumOfProducts = models.FloatField(null=True, blank=True)
+    Balance = models.FloatField(null=True, blank=True)
+    EstimatedSalary = models.FloatField(null=True, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "customer"
+        indexes = [
+            models.Index(fields=["CreditScore"], name="customer_credit_score_idx"),
+            models.Index(fields=["Geography"], name="customer_geography_idx"),
+            models.Index(fields=["HomeOwnershipStatus"], name="customer_home_ownership_idx"),
+            models.Index(fields=["AnnualIncome"], name="customer_annual_income_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.CustomerID} ({self.CustomerName})"
@@ -1,3 +1,1237 @@
-from django.test import TestCase
+import io
+import contextlib
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+import numpy as np
+import pandas as pd
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
 
-# Create your tests here.
+from ml_models.utils.customer_query import ColumnIndex, parse_query, query_frame
+from ml_models.utils.customer_store import (
+    CustomerStore, OrmCustomerStore, customer_objects_from_frame, get_customer_store, save_customer_objects,
+)
+from ml_models.utils.house_loan_interest import (
+    RuleEngine, calculate_final_bps, calculate_final_bps_fd, feature_bps, feature_bps_fd, health_mapping,
+    process_customer_house_loan, process_customer_fixed_deposit,
+)
+from ml_models.utils.fixed_deposit import calculate_fd_bps, calculate_fd_bps_array
+from ml_models.utils.customer_upsert import canonical_strings, classify_rows, upsert_strings
+from ml_models.utils.house_loan import (
+    classification_matrix_prediction, classification_model_prediction, calculate_house_loan_bps,
+    calculate_house_loan_bps_array, crs_batcher, predict_ras_raw, regression_matrix_prediction,
+    regression_model_prediction,
+)
+from ml_models.utils.ingest_log import FileLock, IngestLog, get_ingest_log
+from ml_models.utils.model_features import (
+    CRS_SPEC, FEATURE_SOURCE_COLUMNS, RAS_CATEGORY_MAPPINGS, RAS_SPEC, RAS_TRAINING_CODES, FeatureMatrix, crs_label_classes,
+    encode_ras_features, unmapped_categories,
+)
+from ml_models.utils.model_registry import ModelRegistry, get_models
+from ml_models.utils.inference_batcher import MicroBatcher
+from ml_models.utils.inference_pool import InferencePool
+from ml_models.utils.prediction_cache import PredictionCache
+from ml_models.utils.rule_impact import candidate_rule_set
+from ml_models.utils.rule_sets import BASE, RuleSet, RuleSetRegistry, get_rule_set, write_rule_set
+from ml_models.utils.score_table import score_tables
+from ml_models.models import CUSTOMER_FIELDS, CUSTOMER_NUMERIC_FIELDS, Customer
+from ml_models.utils.columnar_store import ColumnarCustomerStore, columnar_path_for, columnar_signature
+from ml_models.utils.crs_forest import (
+    FOREST_CHUNK_ROWS, FOREST_FORMAT_VERSION, FlatForest, export_forest, forest_path_for,
+)
+from ml_models.utils.ras_booster import RasBooster
+from ml_models.utils.ras_preprocessing import TRAIN_CSV_RAS, RasPreprocessor, load_ras_preprocessor
+from ml_models.utils import issuehouseloan
+
+try:
+    import pyarrow
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+try:
+    import xgboost
+except ImportError:  # pragma: no cover
+    xgboost = None
+
+try:
+    import joblib
+    from sklearn.ensemble import RandomForestClassifier
+except ImportError:  # pragma: no cover
+    RandomForestClassifier = None
+
+
+class RasBoosterTests(SimpleTestCase):
+    """The native RAS path must reproduce XGBRegressor.predict."""
+
+    TOLERANCE = 1e-5
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        if xgboost is None:
+            raise unittest.SkipTest("xgboost is not installed")
+        rng = np.random.default_rng(7)
+        X = rng.normal(size=(500, 33))
+        y = X[:, 0] * 10 + np.sin(X[:, 1]) * 5 + rng.normal(size=500)
+        cls.model = xgboost.XGBRegressor(n_estimators=40, max_depth=4).fit(X, y)
+        cls.rows = rng.normal(size=(1000, 33)) * 1.5
+        cls.rows[rng.random(cls.rows.shape) < 0.05] = np.nan
+
+    def assertMatchesWrapper(self, booster, X):
+        expected = self.model.predict(X)
+        actual = booster.predict(X)
+        self.assertEqual(actual.shape, expected.shape)
+        np.testing.assert_allclose(actual, expected, rtol=0, atol=self.TOLERANCE)
+
+    def test_single_row(self):
+        booster = RasBooster(self.model)
+        for i in range(5):
+            self.assertMatchesWrapper(booster, self.rows[i:i + 1])
+        self.assertEqual(booster.predict(self.rows[0]).shape, (1,))
+
+    def test_batch_larger_than_buffer(self):
+        booster = RasBooster(self.model, batch_rows=64)
+        self.assertMatchesWrapper(booster, self.rows)
+        chunks = [self.rows[:10], self.rows[10:300], self.rows[300:]]
+        batched = np.concatenate(list(booster.predict_batches(chunks)))
+        np.testing.assert_allclose(batched, self.model.predict(self.rows), rtol=0, atol=self.TOLERANCE)
+
+    def test_buffer_reuse_does_not_leak_rows(self):
+        booster = RasBooster(self.model)
+        first = booster.predict(self.rows[:100]).copy()
+        booster.predict(self.rows[500:520])
+        np.testing.assert_array_equal(booster.predict(self.rows[:100]), first)
+
+    def test_thread_counts(self):
+        def nthread(booster):
+            return json.loads(booster.save_config())["learner"]["generic_param"]["nthread"]
+
+        before = nthread(self.model.get_booster())
+        booster = RasBooster(self.model, nthread=1)
+        self.assertMatchesWrapper(booster, self.rows)
+        booster.set_threads(2)
+        self.assertEqual(nthread(booster.booster), "2")
+        self.assertMatchesWrapper(booster, self.rows)
+        # The sklearn model's own booster is left alone.
+        self.assertEqual(nthread(self.model.get_booster()), before)
+
+    def test_wrong_width_is_rejected(self):
+        with self.assertRaises(ValueError):
+            RasBooster(self.model).predict(np.zeros((2, 5)))
+
+
+QUERY_BOOK = pd.DataFrame({
+    "CustomerID": [f"C{i}" for i in range(8)],
+    "CreditScore": [700, 750, 750, 800, np.nan, 650, 750, 720],
+    "HomeOwnershipStatus": ["Renting", "Own", "Renting", "Mortgage", "Renting", None, "Own", "Renting"],
+})
+
+# (filters, matching CustomerIDs): repeated and mixed-type values must match
+# each row once and agree with the range ops.
+QUERY_CASES = [
+    ([{"field": "HomeOwnershipStatus", "op": "in", "value": ["Renting", "Renting"]}], ["C0", "C2", "C4", "C7"]),
+    ([{"field": "CreditScore", "op": "in", "value": [750, "750", 750.0]},
+      {"field": "HomeOwnershipStatus", "op": "in", "value": ["Own", "Own"]}], ["C1", "C6"]),
+    ([{"field": "CreditScore", "op": "==", "value": "750"}], ["C1", "C2", "C6"]),
+    ([{"field": "CreditScore", "op": "==", "value": 750.0}], ["C1", "C2", "C6"]),
+    ([{"field": "CreditScore", "op": ">", "value": "749"},
+      {"field": "CreditScore", "op": "<", "value": 751}], ["C1", "C2", "C6"]),
+    ([{"field": "CreditScore", "op": "in", "value": ["750", "abc"]}], ["C1", "C2", "C6"]),
+    ([{"field": "CreditScore", "op": "==", "value": "abc"}], []),
+    ([{"field": "CreditScore", "op": "!=", "value": "750"}], ["C0", "C3", "C4", "C5", "C7"]),
+]
+
+
+def parsed(filters):
+    return parse_query({"filters": [dict(f) for f in filters], "limit": 100})
+
+
+class CustomerQueryTests(SimpleTestCase):
+    """Indexed and unindexed predicates must agree and never repeat a row."""
+
+    def run_query(self, filters, indexed):
+        filters, sort, limit, columns = parsed(filters)
+        indexes = {col: ColumnIndex(QUERY_BOOK[col]) for col in ("CreditScore", "HomeOwnershipStatus")}
+        count, result = query_frame(QUERY_BOOK, filters, sort, limit, columns,
+                                    index_for=indexes.get if indexed else None)
+        self.assertEqual(count, len(result))
+        return sorted(result["CustomerID"])
+
+    def test_cases(self):
+        for filters, expected in QUERY_CASES:
+            for indexed in (True, False):
+                with self.subTest(filters=filters, indexed=indexed):
+                    self.assertEqual(self.run_query(filters, indexed), expected)
+
+    def test_nested_values_are_rejected(self):
+        with self.assertRaises(ValueError):
+            parsed([{"field": "CreditScore", "op": "in", "value": [[750]]}])
+
+
+class OrmCustomerQueryTests(TestCase):
+    """The ORM store answers the same queries as the in-memory stores."""
+
+    def test_cases(self):
+        save_customer_objects(customer_objects_from_frame(QUERY_BOOK))
+        store = OrmCustomerStore()
+        for filters, expected in QUERY_CASES:
+            with self.subTest(filters=filters):
+                count, result = store.query(*parsed(filters))
+                self.assertEqual(count, len(expected))
+                self.assertEqual(sorted(result["CustomerID"]), expected)
+
+
+class TempBookMixin:
+    """A customer CSV in a temporary directory, with its ingest log torn down after the test."""
+
+    BOOK = (
+        "CustomerID,CustomerName,AnnualIncome,CreditScore\n"
+        "C1,Ann,10.0,700\n"
+        "C2,Bob,20.5,710\n"
+        "C3,Cid,30,720\n"
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.csv_path = os.path.join(self.tmp, "book.csv")
+        with open(self.csv_path, "w") as f:
+            f.write(self.BOOK)
+        self.log = get_ingest_log(self.csv_path)
+
+    def tearDown(self):
+        if self.log._timer is not None:
+            self.log._timer.cancel()
+        if self.log._refresh_thread is not None:
+            self.log._refresh_thread.join()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        super().tearDown()
+
+    def read_lines(self):
+        with open(self.csv_path) as f:
+            return f.read().splitlines()
+
+
+class CustomerUpsertTests(TempBookMixin, SimpleTestCase):
+
+    def upload(self, rows):
+        return CustomerStore(self.csv_path).append(pd.DataFrame(rows))
+
+    def test_rows_without_id_are_reported(self):
+        columns = ["CustomerID", "CreditScore"]
+        incoming = pd.DataFrame({"CustomerID": ["C1", "", None, " C2 "], "CreditScore": [1, 2, 3, 4]})
+        report, changed = classify_rows({}, incoming, columns)
+        self.assertEqual(report["rejected"], 2)
+        self.assertEqual(report["inserted"], 2)
+        self.assertEqual(list(changed["CustomerID"]), ["C1", "C2"])
+
+    def test_upsert_keeps_untouched_rows_as_read(self):
+        book = pd.DataFrame({"CustomerID": ["C1", "C2", "C2", "C3"], "AnnualIncome": ["10.0", "1", "2", "30.50"]})
+        incoming = canonical_strings(pd.DataFrame({"CustomerID": ["C2", "C4"], "AnnualIncome": [25.0, 40]}))
+        result = upsert_strings(book, incoming)
+        self.assertEqual(result.values.tolist(),
+                         [["C1", "10.0"], ["C2", "25"], ["C3", "30.50"], ["C4", "40"]])
+
+    def test_upload_report_and_compaction(self):
+        report = self.upload({
+            "CustomerID": ["C1", "C2", "C4", "", "C4"],
+            "CustomerName": ["Ann", "Bob", "Dee", "Nobody", "Dee"],
+            "AnnualIncome": [10, 21, 40, 1, 40],
+            "CreditScore": [700, 710, 740, 1, 740],
+        })
+        self.assertEqual(report, {"inserted": 1, "updated": 1, "unchanged": 1,
+                                  "duplicates_in_batch": 1, "rejected": 1})
+
+        # Still pending in the log: the same rows again change nothing.
+        again = self.upload({"CustomerID": ["C2", "C4"], "CustomerName": ["Bob", "Dee"],
+                             "AnnualIncome": [21, 40], "CreditScore": [710, 740]})
+        self.assertEqual((again["inserted"], again["updated"], again["unchanged"]), (0, 0, 2))
+        self.assertEqual(len(self.log.pending_batches()), 1)
+
+        self.assertEqual(self.log.compact(), 2)
+        self.assertEqual(self.read_lines(), [
+            "CustomerID,CustomerName,AnnualIncome,CreditScore",
+            "C1,Ann,10.0,700",
+            "C2,Bob,21,710",
+            "C3,Cid,30,720",
+            "C4,Dee,40,740",
+        ])
+        after = self.upload({"CustomerID": ["C1", "C2", "C3"], "CustomerName": ["Ann", "Bob", "Cid"],
+                             "AnnualIncome": [10, 21, 30], "CreditScore": [700, 710, 720]})
+        self.assertEqual(after["unchanged"], 3)
+
+
+SAMPLE_BOOK = os.path.join(os.path.dirname(__file__), os.pardir, "db", "houseloan", "sample_data.csv")
+
+
+class RuleRaterTests(SimpleTestCase):
+    """The rule rater prices from the book and the rule set alone."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.csv_path = os.path.join(self.tmp, "book.csv")
+        shutil.copyfile(SAMPLE_BOOK, self.csv_path)
+        self.book = pd.read_csv(self.csv_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def customer_data(self, row, weights):
+        # Missing or empty features count as 0, as in process_customer_house_loan.
+        return {feat: (row[feat] if feat in row and not pd.isna(row[feat]) else 0) for feat in weights}
+
+    def test_matches_scalar_bps_without_models(self):
+        rules = get_rule_set("base")
+        no_models = mock.patch("ml_models.utils.score_table.get_models", side_effect=AssertionError("models loaded"))
+        with no_models, mock.patch("ml_models.utils.model_registry.registry.active",
+                                   side_effect=AssertionError("models loaded")):
+            for _, row in self.book.iterrows():
+                cid = row["CustomerID"]
+                _, total = process_customer_house_loan(self.csv_path, cid, rules=rules)
+                expected = calculate_final_bps(self.customer_data(row, rules.weights["house_loan"]))[0]
+                self.assertAlmostEqual(total, expected, places=9)
+                _, total = process_customer_fixed_deposit(self.csv_path, cid, rules=rules)
+                expected = calculate_final_bps_fd(self.customer_data(row, rules.weights["fixed_deposit"]))[0]
+                self.assertAlmostEqual(total, expected, places=9)
+            table = score_tables.rules(get_customer_store(self.csv_path), rules)
+        self.assertIsNone(table.version)
+        self.assertTrue(np.isnan(table.crs).all())
+
+
+class RuleSetTests(SimpleTestCase):
+    """Rule-set files are validated in full and swapped in without losing a working set."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.registry = RuleSetRegistry(self.tmp)
+        self.book = pd.read_csv(SAMPLE_BOOK)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def document(self, **changes):
+        data = json.loads(json.dumps(BASE.to_dict()))
+        data.update(changes)
+        return data
+
+    def write(self, version, data):
+        path = self.registry.path_for(version)
+        with open(path, "w") as f:
+            f.write(data if isinstance(data, str) else json.dumps(data))
+        # Make sure the registry sees a new stamp even within one mtime tick.
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + len(os.listdir(self.tmp))))
+
+    def test_base_round_trip_scores_the_same(self):
+        data = BASE.to_dict()
+        self.assertIsNone(data["health_mapping"]["LoanDuration"])
+        rules = RuleSet.from_dict("copy", json.loads(json.dumps(data)))
+        for name in ("house_loan", "fixed_deposit"):
+            np.testing.assert_array_equal(rules.score(name, self.book)[0], BASE.score(name, self.book)[0])
+
+    def test_health_mapping_is_required(self):
+        data = self.document()
+        del data["health_mapping"]
+        with self.assertRaisesRegex(ValueError, "health_mapping is required"):
+            RuleSet.from_dict("v2", data)
+        with self.assertRaisesRegex(ValueError, "health_mapping is required"):
+            candidate_rule_set(data)
+
+    def test_weighted_features_need_bands(self):
+        data = self.document()
+        del data["health_mapping"]["CreditScore"]
+        data["feature_bps"]["NewFeature"] = 1.0
+        with self.assertRaises(ValueError) as caught:
+            RuleSet.from_dict("v2", data)
+        self.assertIn("CreditScore", str(caught.exception))
+        self.assertIn("NewFeature", str(caught.exception))
+        with self.assertRaises(ValueError):
+            candidate_rule_set(data)
+
+        # null opts a feature into its full weight.
+        data["health_mapping"].update({"CreditScore": None, "NewFeature": None})
+        rules = RuleSet.from_dict("v2", data)
+        health = rules.score("house_loan", self.book)[2]
+        row = list(rules.weights["house_loan"]).index("CreditScore")
+        self.assertTrue((health[row] == 100).all())
+
+    def test_hot_swap_keeps_the_last_good_rule_set(self):
+        self.assertEqual(self.registry.active().version, "base")
+        data = self.document()
+        data["feature_bps"]["CreditScore"] = 50.0
+        self.write("v2", data)
+        rules, previous = self.registry.activate("v2")
+        self.assertEqual((rules.version, previous), ("v2", "base"))
+        self.assertIs(self.registry.active(), rules)
+        self.assertEqual(RuleSetRegistry(self.tmp).active().fingerprint, rules.fingerprint)
+
+        # A broken or incomplete edit of the live file keeps the compiled set.
+        self.write("v2", "{not json")
+        self.assertIs(self.registry.active(), rules)
+        incomplete = self.document()
+        del incomplete["health_mapping"]
+        self.write("v2", incomplete)
+        self.assertIs(self.registry.active(), rules)
+        with self.assertRaises(ValueError):
+            self.registry.activate("v2")
+
+        # A valid edit is picked up on the next quote.
+        data["feature_bps"]["CreditScore"] = 60.0
+        self.write("v2", data)
+        self.assertEqual(self.registry.active().feature_bps["CreditScore"], 60.0)
+
+        with self.assertRaises(ValueError):
+            self.registry.activate("missing")
+        self.assertEqual(self.registry.activate("base")[0], BASE)
+
+
+class RuleEngineTests(SimpleTestCase):
+    """The compiled RuleEngine must score exactly like calculate_final_bps row by row."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        columns = {}
+        for feat in set(feature_bps) | set(feature_bps_fd):
+            bands = health_mapping.get(feat, [])
+            if all(isinstance(lower, (int, float)) for lower, _, _ in bands):
+                # Every finite bound, just below it and just above it, plus missing values.
+                bounds = {b for lower, upper, _ in bands for b in (lower, upper) if np.isfinite(b)} or {0.0}
+                values = [v for b in sorted(bounds) for v in (np.nextafter(b, -np.inf), b, np.nextafter(b, np.inf))]
+                columns[feat] = values + [np.nan, 0]
+            else:
+                columns[feat] = [label for label, _, _ in bands] + ["Unknown", np.nan]
+        n = max(len(values) for values in columns.values())
+        rng = np.random.default_rng(21)
+        frame = pd.DataFrame({feat: pd.Series([values[i % len(values)] for i in rng.permutation(3 * n)], dtype=object)
+                              for feat, values in columns.items()})
+        cls.frame = pd.concat([frame.infer_objects(), pd.read_csv(SAMPLE_BOOK)[list(columns)]], ignore_index=True)
+
+    def assertMatchesScalar(self, weights, scalar):
+        total, bps, health = RuleEngine(weights).score(self.frame)
+        for i, row in enumerate(self.frame[list(weights)].to_dict(orient="records")):
+            # Missing values count as 0, as in process_customer_house_loan.
+            customer = {feat: (0 if pd.isna(value) else value) for feat, value in row.items()}
+            expected_total, expected_bps, expected_health = scalar(customer)
+            self.assertEqual(total[i], expected_total, row)
+            self.assertEqual(bps[:, i].tolist(), list(expected_bps.values()))
+            self.assertEqual(health[:, i].tolist(), list(expected_health.values()))
+
+    def test_house_loan(self):
+        self.assertMatchesScalar(feature_bps, calculate_final_bps)
+
+    def test_fixed_deposit(self):
+        self.assertMatchesScalar(feature_bps_fd, calculate_final_bps_fd)
+
+    def test_non_numeric_values_score_zero_health(self):
+        engine = RuleEngine({"CreditScore": 1.0, "HasCrCard": 1.0})
+        frame = pd.DataFrame({"CreditScore": [800, "800", "No", None, ""], "HasCrCard": ["Yes", 1, None, "No", ""]})
+        health = engine.score(frame)[2]
+        self.assertEqual(health[0].tolist(), [100, 100, 0, 20, 0])
+        self.assertEqual(health[1].tolist(), [80, 0, 0, 50, 0])
+
+
+class FlatForestTests(SimpleTestCase):
+    """The flattened CRS forest must reproduce RandomForestClassifier.predict_proba bit for bit."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        if RandomForestClassifier is None:
+            raise unittest.SkipTest("scikit-learn is not installed")
+        rng = np.random.default_rng(14)
+        X = rng.normal(size=(600, 12))
+        y = (X[:, 0] + X[:, 1] * X[:, 2] + rng.normal(scale=0.5, size=600) > 0).astype(int)
+        y[X[:, 3] > 1.2] = 2
+        cls.model = RandomForestClassifier(n_estimators=25, max_depth=9, random_state=0).fit(X, y)
+        rows = rng.normal(size=(2 * FOREST_CHUNK_ROWS + 37, 12)) * 1.5
+        # Rows sitting exactly on split thresholds exercise the float32 comparison.
+        thresholds = np.concatenate([e.tree_.threshold[e.tree_.children_left != -1] for e in cls.model.estimators_])
+        rows[:200, 0] = thresholds[:200]
+        cls.rows = rows
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_matches_predict_proba(self):
+        forest = FlatForest.from_sklearn(self.model)
+        np.testing.assert_array_equal(forest.predict_proba(self.rows), self.model.predict_proba(self.rows))
+        np.testing.assert_array_equal(forest.predict_proba(self.rows[0]), self.model.predict_proba(self.rows[:1]))
+        np.testing.assert_array_equal(forest.classes, self.model.classes_)
+        with self.assertRaises(ValueError):
+            forest.predict_proba(np.zeros((2, 5)))
+
+    def test_save_load_round_trip(self):
+        model_path = os.path.join(self.tmp, "rf_model.joblib")
+        joblib.dump(self.model, model_path)
+        export_forest(self.model, model_path)
+        forest = FlatForest.load(forest_path_for(model_path), model_path)
+        self.assertIsNotNone(forest)
+        np.testing.assert_array_equal(forest.predict_proba(self.rows), self.model.predict_proba(self.rows))
+
+    def test_stale_export_is_ignored(self):
+        model_path = os.path.join(self.tmp, "rf_model.joblib")
+        joblib.dump(self.model, model_path)
+        path = forest_path_for(model_path)
+        export_forest(self.model, model_path)
+        self.assertIsNone(FlatForest.load(os.path.join(self.tmp, "missing.forest.npz"), model_path))
+        with np.load(path) as data:
+            arrays = dict(data)
+        np.savez(path, **{**arrays, "format": np.array(FOREST_FORMAT_VERSION + 1)})
+        self.assertIsNone(FlatForest.load(path, model_path))
+        np.savez(path, **arrays)
+        self.assertIsNotNone(FlatForest.load(path, model_path))
+        # A retrained model written over the source file invalidates the export.
+        stat = os.stat(model_path)
+        os.utime(model_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        self.assertIsNone(FlatForest.load(path, model_path))
+
+
+def reference_factor_bps(profile, models):
+    """The one-profile RF+XGB allocation as get_factor_bps computed it before FactorAllocator."""
+    fitted = models.derived('issuehouseloan', issuehouseloan._fit_allocators)
+
+    imp = models.classification_model.feature_importances_
+    imp_share = imp / imp.sum()
+    df = pd.DataFrame([profile])
+    df['Geography'] = fitted['le_geo'].transform(df['Geography'])
+    df['Gender'] = fitted['le_gen'].transform(df['Gender'])
+    ranks = []
+    for f in issuehouseloan.FEATURES_RF:
+        raw = float(df.at[0, f])
+        mn, mx = fitted['feature_min_max_rf'][f]
+        ranks.append(1.0 if mx <= mn else 1.0 + (np.clip(raw, mn, mx) - mn) / (mx - mn) * 99.0)
+    avg_rank = np.mean(ranks)
+    init_bps = imp_share * issuehouseloan.compute_scaled_bps(avg_rank)
+    rf = np.round(init_bps * np.array(ranks) / 100.0, 2)
+    drift = round(init_bps.sum() * avg_rank / 100.0, 2) - rf.sum()
+    if abs(drift) >= 10**(-2):
+        rf[np.argmax(imp_share)] += drift
+    rf = pd.DataFrame({'feature': issuehouseloan.FEATURES_RF, 'bps': rf})
+
+    scores = models.regression_model.get_booster().get_score(importance_type='gain')
+    total_imp = sum(scores.values()) or 1.0
+    share = {f: w / total_imp for f, w in scores.items()}
+    raw = {}
+    for f in scores:
+        if f == 'EmploymentStatus':
+            raw[f] = issuehouseloan.EMP_MAP[profile[f]]
+        elif f == 'EducationLevel':
+            raw[f] = issuehouseloan.EDU_MAP[profile[f]]
+        elif f in issuehouseloan.XGB_CAT:
+            le = fitted['xgb_encoders'][f]
+            v = profile[f]
+            raw[f] = le.transform([v if v in le.classes_ else le.classes_[0]])[0]
+        else:
+            raw[f] = float(profile.get(f, 0.0))
+    ranks = {f: 1.0 if mx <= mn else 1.0 + (np.clip(raw[f], mn, mx) - mn) / (mx - mn) * 99.0
+             for f, (mn, mx) in fitted['feature_min_max_xgb'].items() if f in scores}
+    avg_rank = np.mean(list(ranks.values()))
+    init_bps = {f: share[f] * issuehouseloan.compute_scaled_bps(avg_rank) for f in scores}
+    final = {f: round(init_bps[f] * ranks[f] / 100.0, 2) for f in scores}
+    drift = round(sum(init_bps.values()) * avg_rank / 100.0, 2) - sum(final.values())
+    if abs(drift) >= 10**(-2):
+        final[max(share, key=share.get)] += drift
+    xgb = pd.DataFrame({'feature': list(final), 'bps': list(final.values())})
+
+    merged = pd.concat([rf, xgb]).groupby('feature', as_index=False)['bps'].sum()
+    bps = {row.feature: row.bps for row in merged.itertuples()}
+    bps['total_bps'] = float(merged['bps'].sum())
+    return bps
+
+
+class FactorAllocatorTests(SimpleTestCase):
+    """The batched allocation must match the one-profile allocation value for value."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        if xgboost is None or RandomForestClassifier is None:
+            raise unittest.SkipTest("xgboost / scikit-learn are not installed")
+        try:
+            cls.models = get_models("base")
+            cls.allocator = issuehouseloan.factor_allocator(cls.models)
+        except (OSError, ValueError) as e:  # model_weights is not checked in
+            raise unittest.SkipTest(f"base model weights unavailable: {e}")
+
+        n = 300
+        rng = np.random.default_rng(25)
+        rf = pd.read_csv(cls.models.train_csv('train.csv')).sample(n, replace=True, random_state=1)
+        xgb = pd.read_csv(cls.models.train_csv('Loan.csv')).sample(n, replace=True, random_state=2)
+        rf, xgb = rf.reset_index(drop=True), xgb.reset_index(drop=True)
+        df = pd.concat([xgb, rf[[c for c in rf.columns if c not in xgb.columns]]], axis=1)
+        for col in ["CreditScore", "Age", "Balance", "AnnualIncome", "LoanAmount", "EstimatedSalary"]:
+            # Out-of-range values on both sides of the training range.
+            df[col] = df[col].astype(float)
+            scaled = rng.random(n) < 0.1
+            df.loc[scaled, col] *= rng.choice([0.1, 3.0], scaled.sum())
+        df.loc[rng.random(n) < 0.03, "Geography"] = "USA"
+        df.loc[rng.random(n) < 0.05, "LoanPurpose"] = "Yacht"
+        df.loc[rng.random(n) < 0.03, "EmploymentStatus"] = "Astronaut"
+        cls.profiles = df
+
+    def test_matches_one_profile_allocation(self):
+        total, bps, valid = self.allocator.allocate(self.profiles)
+        self.assertEqual(bps.shape, (len(self.allocator.features), len(self.profiles)))
+        self.assertFalse(valid.all())
+        for i, profile in enumerate(self.profiles.to_dict(orient="records")):
+            try:
+                expected = reference_factor_bps(profile, self.models)
+            except (KeyError, ValueError):
+                self.assertFalse(valid[i], profile)
+                with self.assertRaises(ValueError):
+                    issuehouseloan.get_factor_bps(profile, models=self.models)
+                continue
+            self.assertTrue(valid[i], profile)
+            self.assertEqual(list(expected), self.allocator.features + ["total_bps"])
+            self.assertEqual([expected[f] for f in self.allocator.features], bps[:, i].tolist())
+            self.assertEqual(expected["total_bps"], float(total[i]))
+            self.assertEqual(issuehouseloan.get_factor_bps(profile, models=self.models), expected)
+
+    def test_invalid_rows_are_masked_and_named(self):
+        profiles = self.profiles.head(4).copy()
+        profiles = profiles.astype({"Geography": object, "CreditScore": object})
+        profiles.loc[1, "Geography"] = "USA"
+        profiles.loc[2, "EmploymentStatus"] = "Astronaut"
+        profiles.loc[3, "CreditScore"] = "high"
+        total, bps, valid = self.allocator.allocate(profiles)
+        self.assertEqual(valid.tolist(), [True, False, False, False])
+        self.assertTrue(np.isnan(bps[:, 1:]).all() and np.isnan(total[1:]).all())
+        self.assertFalse(np.isnan(bps[:, 0]).any())
+
+        records = profiles.to_dict(orient="records")
+        for record, field in zip(records[1:], ["Geography='USA'", "EmploymentStatus='Astronaut'",
+                                               "CreditScore='high'"]):
+            with self.assertRaisesRegex(ValueError, field):
+                issuehouseloan.get_factor_bps(record, models=self.models)
+        del records[0]["Gender"]
+        with self.assertRaisesRegex(ValueError, r"Gender \(missing\)"):
+            issuehouseloan.allocate_bps_rf_new(records[0], models=self.models)
+
+
+class RasBatchTests(SimpleTestCase):
+    """A batch quote must price a customer exactly like a single quote."""
+
+    def test_batch_matches_single_quotes(self):
+        if xgboost is None:
+            raise unittest.SkipTest("xgboost is not installed")
+        try:
+            models = get_models("base")
+            models.regression_model
+        except (OSError, ValueError) as e:  # model_weights is not checked in
+            raise unittest.SkipTest(f"base model weights unavailable: {e}")
+        matrix = FeatureMatrix.from_frame(pd.read_csv(SAMPLE_BOOK))
+        n = len(matrix)
+        ras = RAS_SPEC.gather(matrix, np.arange(n), LoanAmount=np.linspace(1e5, 9e5, n), LoanDuration=240)
+        batch = regression_matrix_prediction(ras, models)
+        self.assertEqual(batch.dtype, np.float64)
+        crs = np.linspace(0.1, 0.9, n)
+        bps = calculate_house_loan_bps_array(crs, batch, np.full(n, 8.5))
+        for i in range(n):
+            single = regression_model_prediction(ras[i], models)
+            self.assertEqual(batch[i], single)
+            self.assertEqual([values[i] for values in bps], list(calculate_house_loan_bps(crs[i], single, 8.5)))
+
+    def test_array_rounding_matches_scalar(self):
+        # Rates such as 8.5 - 0.515 print as ties; np.round and round() disagree on them.
+        crs = np.linspace(0, 1, 2001)
+        ras = np.linspace(1, 0, 2001)
+        bps = calculate_house_loan_bps_array(crs, ras, np.full(len(crs), 8.5))
+        for i in range(len(crs)):
+            expected = calculate_house_loan_bps(float(crs[i]), float(ras[i]), 8.5)
+            self.assertEqual([float(values[i]) for values in bps], list(expected))
+
+
+class OrmCustomerStoreTests(TestCase):
+    """load_customers and OrmCustomerStore serve the same rows as the CSV store."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def write_csv(self, name, text):
+        path = os.path.join(self.tmp, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def load(self, *paths, **options):
+        call_command("load_customers", *paths, stdout=io.StringIO(), **options)
+
+    def test_load_customers_cleans_and_upserts(self):
+        first = self.write_csv("first.csv", (
+            "\ufeffCID,Name,CreditScore,Geography,Unknown\n"
+            " C1 ,Ann,700,France,x\n"
+            "C2,Bob,,Spain,x\n"
+            ",Nobody,1,Spain,x\n"
+            "C1,Ann Again,710,France,x\n"
+        ))
+        self.load(first, batch_size=1)
+        self.assertEqual(Customer.objects.count(), 2)
+        ann = Customer.objects.get(CustomerID="C1")
+        self.assertEqual((ann.CustomerName, ann.CreditScore), ("Ann Again", 710.0))
+        self.assertIsNone(Customer.objects.get(CustomerID="C2").CreditScore)
+
+        second = self.write_csv("second.csv", "CustomerID,CreditScore\nC2,650\nC3,800\n")
+        self.load(second)
+        self.assertEqual(Customer.objects.count(), 3)
+        self.assertEqual(Customer.objects.get(CustomerID="C2").CreditScore, 650.0)
+        self.load(second, truncate=True)
+        self.assertEqual(sorted(Customer.objects.values_list("CustomerID", flat=True)), ["C2", "C3"])
+
+        with self.assertRaises(CommandError):
+            self.load(os.path.join(self.tmp, "missing.csv"))
+
+    def test_reads_match_the_csv_store(self):
+        self.load(SAMPLE_BOOK)
+        csv_store, orm_store = CustomerStore(SAMPLE_BOOK), OrmCustomerStore()
+        book = csv_store.frame()
+        self.assertEqual(len(orm_store), len(book))
+        columns = [col for col in book.columns if col in CUSTOMER_FIELDS]
+        numeric = [col for col in columns if col in CUSTOMER_NUMERIC_FIELDS]
+        for cid in book["CustomerID"]:
+            self.assertIn(cid, orm_store)
+            expected, actual = csv_store.get(cid, columns), orm_store.get(f" {cid} ", columns)
+            np.testing.assert_allclose(actual[numeric].astype(float), expected[numeric].astype(float))
+            text = [col for col in columns if col not in numeric]
+            self.assertEqual(actual[text].fillna("").astype(str).tolist(),
+                             expected[text].fillna("").astype(str).tolist())
+        self.assertIsNone(orm_store.get("NOPE"))
+        self.assertNotIn("NOPE", orm_store)
+        self.assertEqual(list(orm_store.frame(["CustomerID"])["CustomerID"]), list(book["CustomerID"]))
+        self.assertEqual(list(orm_store.rows(2, 5, ["CustomerID"])["CustomerID"]), list(book["CustomerID"][2:5]))
+        np.testing.assert_array_equal(orm_store.features().crs, csv_store.features().crs)
+
+    def test_append_reports_and_upserts(self):
+        self.load(SAMPLE_BOOK)
+        store = OrmCustomerStore()
+        row = store.get("CUSTBEST").to_dict()
+        changed = dict(row, CreditScore=row["CreditScore"] - 100)
+        report = store.append(pd.DataFrame([row, changed, dict(row, CustomerID="NEW1"), dict(row, CustomerID="")]))
+        self.assertEqual(report, {"inserted": 1, "updated": 1, "unchanged": 0,
+                                  "duplicates_in_batch": 1, "rejected": 1})
+        self.assertEqual(store.get("CUSTBEST")["CreditScore"], row["CreditScore"] - 100)
+        self.assertIn("NEW1", store)
+
+        again = store.append(pd.DataFrame([changed]))
+        self.assertEqual((again["updated"], again["unchanged"]), (0, 1))
+        appended = store.append(pd.DataFrame([changed]), mode="append")
+        self.assertEqual((appended["updated"], appended["unchanged"]), (1, 0))
+
+
+@mock.patch.object(IngestLog, "_schedule_compaction", lambda self: None)
+class IngestLogTests(TempBookMixin, SimpleTestCase):
+    """The locked write-ahead log: appends, compaction and replay after a crash."""
+
+    def test_file_lock_is_exclusive(self):
+        lock_path = os.path.join(self.tmp, "book.lock")
+        held, other = FileLock(lock_path), FileLock(lock_path)
+        with held:
+            self.assertFalse(other.acquire(blocking=False))
+            # A second thread on the same lock object is refused as well.
+            results = []
+            thread = threading.Thread(target=lambda: results.append(held.acquire(blocking=False)))
+            thread.start()
+            thread.join()
+            self.assertEqual(results, [False])
+            self.assertEqual(self.log.compact(blocking=False), 0)
+        self.assertTrue(other.acquire(blocking=False))
+        other.release()
+
+    def test_append_mode_compacts_aligned_to_header(self):
+        batch = pd.DataFrame({"CreditScore": [730], "Extra": ["x"], "CustomerID": ["C4"], "CustomerName": ["Dee"]})
+        self.log.append(batch, added_by="test", mode="append")
+        self.assertEqual(self.log.pending_rows(), 1)
+        self.assertEqual(self.read_lines(), self.BOOK.splitlines())
+
+        self.assertEqual(self.log.compact(), 1)
+        self.assertEqual(self.read_lines(), self.BOOK.splitlines() + ["C4,Dee,,730"])
+        self.assertFalse(os.path.exists(self.log.log_path))
+        self.assertEqual(self.log.compact(), 0)
+
+    def test_pending_batches_are_replayed_after_a_crash(self):
+        # A batch made durable but never compacted, as if the worker died.
+        with self.log._lock:
+            row = {"CustomerID": "C2", "CustomerName": "Bob", "AnnualIncome": 20.5, "CreditScore": 999}
+            self.log._write(pd.DataFrame([row]), "crashed", "upsert")
+        self.assertEqual(self.read_lines(), self.BOOK.splitlines())
+
+        restarted = IngestLog(self.csv_path)
+        self.assertEqual([b["added_by"] for b in restarted.pending_batches()], ["crashed"])
+        self.assertEqual(restarted.compact(), 1)
+        lines = self.read_lines()
+        self.assertEqual(lines[2], "C2,Bob,20.5,999")
+        self.assertEqual(lines[:2] + lines[3:], self.BOOK.splitlines()[:2] + self.BOOK.splitlines()[3:])
+        self.assertFalse(os.path.exists(restarted.log_path))
+
+    def test_crash_after_swap_does_not_replay_appends(self):
+        self.log.append(pd.DataFrame({"CustomerID": ["C4"], "CreditScore": [730]}), mode="append")
+        remove = os.remove
+
+        def crash(path):
+            if path == self.log.log_path:
+                raise RuntimeError("worker died")
+            remove(path)
+
+        # The new CSV is in place but the log was never removed.
+        with mock.patch("ml_models.utils.ingest_log.os.remove", side_effect=crash):
+            with self.assertRaises(RuntimeError):
+                self.log.compact()
+        swapped = self.read_lines()
+        self.assertEqual(swapped, self.BOOK.splitlines() + ["C4,,,730"])
+        self.assertTrue(os.path.exists(self.log.log_path))
+
+        restarted = IngestLog(self.csv_path)
+        self.assertEqual(restarted.pending_batches(), [])
+        self.assertEqual(restarted.compact(), 0)
+        self.assertEqual(self.read_lines(), swapped)
+        self.assertFalse(os.path.exists(restarted.log_path))
+        self.assertFalse(os.path.exists(restarted.applied_path))
+
+        # A stale record (the CSV changed since) does not hide new batches.
+        restarted.append(pd.DataFrame({"CustomerID": ["C5"], "CreditScore": [740]}), mode="append")
+        with open(restarted.applied_path, "w") as f:
+            json.dump({"batch_ids": [b["batch_id"] for b in restarted.pending_batches()], "signature": [0, 0]}, f)
+        self.assertEqual(restarted.compact(), 1)
+        self.assertEqual(self.read_lines(), swapped + ["C5,,,740"])
+
+    def test_refresh_runs_after_the_lock_is_released(self):
+        seen = []
+
+        def refresh(log):
+            other = FileLock(log._lock.path)
+            free = other.acquire(blocking=False)
+            if free:
+                other.release()
+            seen.append((free, threading.current_thread() is threading.main_thread()))
+
+        with mock.patch.object(IngestLog, "_refresh_features", refresh):
+            self.log.append(pd.DataFrame({"CustomerID": ["C4"]}), mode="append")
+            self.assertEqual(self.log.compact(), 1)
+            self.log._refresh_thread.join()
+            self.log.append(pd.DataFrame({"CustomerID": ["C5"]}), mode="append")
+            self.assertEqual(self.log.compact(wait=True), 1)
+        # In the background after a plain compact, inline with wait=True.
+        self.assertEqual(seen, [(True, False), (True, True)])
+
+    def test_writes_do_not_reparse_the_log(self):
+        row = {"CustomerID": "C4", "CustomerName": "Dee", "AnnualIncome": 40, "CreditScore": 740}
+        self.log.append(pd.DataFrame([row]))
+        with mock.patch.object(IngestLog, "pending_batches", side_effect=AssertionError("log re-read")):
+            # Another worker's batch is picked up from the new log lines alone.
+            IngestLog(self.csv_path).append(pd.DataFrame([dict(row, CustomerID="C5")]), mode="append")
+            report = CustomerStore(self.csv_path).append(pd.DataFrame([row, dict(row, CustomerID="C5")]))
+            self.assertEqual((report["inserted"], report["unchanged"]), (0, 2))
+            self.assertEqual(self.log.pending_rows(), 2)
+            changed = CustomerStore(self.csv_path).append(pd.DataFrame([dict(row, CreditScore=750)]))
+            self.assertEqual(changed["updated"], 1)
+            self.assertEqual(self.log.pending_rows(), 3)
+        self.assertEqual(self.log.compact(), 3)
+        self.assertEqual(self.log.pending_rows(), 0)
+        self.assertEqual(self.read_lines()[-2:], ["C4,Dee,40,750", "C5,Dee,40,740"])
+
+    def test_concurrent_appends_keep_every_row(self):
+        threads, per_thread = 8, 25
+
+        def upload(k):
+            rows = [{"CustomerID": f"T{k}-{i}", "CreditScore": i} for i in range(per_thread)]
+            self.log.append(pd.DataFrame(rows), mode="append")
+
+        workers = [threading.Thread(target=upload, args=(k,)) for k in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(len(self.log.pending_batches()), threads)
+        self.assertEqual(self.log.compact(), threads * per_thread)
+
+        book = pd.read_csv(self.csv_path)
+        self.assertEqual(len(book), 3 + threads * per_thread)
+        expected = {f"T{k}-{i}" for k in range(threads) for i in range(per_thread)}
+        self.assertEqual(set(book["CustomerID"][3:]), expected)
+
+
+class RasPreprocessorTests(SimpleTestCase):
+    """The RAS preprocessing is fitted on the training vocabulary and never degenerate."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        if not os.path.exists(TRAIN_CSV_RAS):  # model_weights is not checked in
+            raise unittest.SkipTest(f"{TRAIN_CSV_RAS} unavailable")
+        cls.train = pd.read_csv(TRAIN_CSV_RAS, nrows=500)
+
+    def test_fit_has_no_degenerate_column(self):
+        preprocessor = RasPreprocessor.fit(self.train)
+        encoded = encode_ras_features(self.train, blank_request=False)
+        for col in RAS_TRAINING_CODES:
+            self.assertFalse((encoded[col] < 0).any(), col)
+        self.assertTrue((encoded.std() > 0).all(), encoded.columns[encoded.std() <= 0].tolist())
+
+        X = preprocessor.transform_frame(self.train)
+        np.testing.assert_allclose(np.nanmean(X, axis=0), 0, atol=1e-6)
+        np.testing.assert_allclose(np.nanstd(X, axis=0), 1, atol=1e-6)
+
+    def test_unmapped_training_category_raises(self):
+        train = self.train.copy()
+        train.loc[0, "EducationLevel"] = "Astronaut"
+        with self.assertRaisesRegex(ValueError, "Astronaut"):
+            RasPreprocessor.fit(train)
+
+    def test_book_labels_map_to_training_codes(self):
+        book = pd.read_csv(SAMPLE_BOOK)
+        book.columns = book.columns.str.strip().str.replace(" ", "")
+        self.assertEqual(unmapped_categories(book), {})
+        encoded = encode_ras_features(book)
+        for col, codes in RAS_TRAINING_CODES.items():
+            self.assertTrue(encoded[col].isin(codes.values()).all(), col)
+        payment = encoded["PaymentHistory"]
+        self.assertTrue(payment.between(self.train["PaymentHistory"].min(), self.train["PaymentHistory"].max()).all())
+
+    def test_missing_or_stale_artifact_fails(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, True)
+        path = os.path.join(tmp, "ras_preprocessor.joblib")
+        with self.assertRaises(FileNotFoundError):
+            load_ras_preprocessor(path)
+
+        preprocessor = RasPreprocessor.fit(self.train)
+        preprocessor.save(path)
+        self.assertEqual(load_ras_preprocessor(path).mappings, RAS_CATEGORY_MAPPINGS)
+        preprocessor.mappings = {**RAS_CATEGORY_MAPPINGS, "EducationLevel": {"Bachelor's Degree": 2}}
+        preprocessor.save(path)
+        with self.assertRaises(ValueError):
+            load_ras_preprocessor(path)
+
+
+class CrsLabelTests(SimpleTestCase):
+    """CRS labels the random forest never saw are reported, not silently recoded."""
+
+    def test_unseen_labels_are_reported(self):
+        classes = crs_label_classes()["Geography"]
+        frame = pd.DataFrame({"Geography": [classes[1], "USA", "UK", "USA", None]})
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            codes = CRS_SPEC.encode(frame)[:, CRS_SPEC.index["Geography"]]
+        np.testing.assert_array_equal(codes, [1, 0, 0, 0, np.nan])
+        self.assertIn("Geography: 3 value(s) not seen in training", out.getvalue())
+        self.assertIn("USA (2), UK (1)", out.getvalue())
+
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            CRS_SPEC.encode(frame.iloc[[0, 4]])
+        self.assertNotIn("not seen in training", out.getvalue())
+
+
+@mock.patch.object(IngestLog, "_schedule_compaction", lambda self: None)
+class ColumnarStoreTests(TempBookMixin, SimpleTestCase):
+    """The Arrow store reads only the columns it needs and is rebuilt on compaction."""
+
+    with open(SAMPLE_BOOK, encoding="utf-8") as f:
+        BOOK = f.read()
+
+    def setUp(self):
+        if pyarrow is None:
+            raise unittest.SkipTest("pyarrow is not installed")
+        super().setUp()
+        self.store = ColumnarCustomerStore(self.csv_path)
+
+    def test_features_and_hashes_match_the_csv_store(self):
+        from ml_models.utils import columnar_store
+        csv_store = CustomerStore(self.csv_path)
+        with mock.patch.object(columnar_store, "write_features", wraps=columnar_store.write_features) as write:
+            matrix = self.store.features()
+        self.assertLessEqual(set(write.call_args[0][1].columns), set(FEATURE_SOURCE_COLUMNS))
+        expected = csv_store.features()
+        np.testing.assert_array_equal(matrix.ids, expected.ids)
+        np.testing.assert_array_equal(matrix.crs, expected.crs)
+        np.testing.assert_array_equal(matrix.ras, expected.ras)
+        self.assertEqual(self.store._row_hashes(), csv_store._row_hashes())
+
+    def test_compaction_regenerates_the_arrow_copy(self):
+        self.assertEqual(len(self.store), 13)
+        arrow_path = columnar_path_for(self.csv_path)
+        self.log.append(pd.DataFrame({"CustomerID": ["NEW1"], "CreditScore": [700]}), mode="append")
+        self.assertEqual(self.log.compact(wait=True), 1)
+        stat = os.stat(self.csv_path)
+        self.assertEqual(columnar_signature(arrow_path), (stat.st_mtime_ns, stat.st_size))
+        self.assertIn("NEW1", self.store)
+
+
+class FdOfferGridTests(SimpleTestCase):
+    """Every cell of a batch FD offer grid equals the single-customer FD quote."""
+
+    AMOUNTS = [10000, 123456.78, 500000, 2500000]
+    TENURES = [0.5, 1, 3, 7.25]
+
+    def test_array_formula_matches_scalar(self):
+        crs = np.linspace(0, 100, 1001)
+        amounts, tenures = np.array(self.AMOUNTS, dtype=float), np.array(self.TENURES)
+        grid = calculate_fd_bps_array(crs[:, None, None], amounts[None, :, None], tenures[None, None, :], 6.5)
+        for i, a, t in np.ndindex(grid[0].shape):
+            expected = calculate_fd_bps(float(crs[i]), amounts[a], tenures[t], 6.5)
+            self.assertEqual([float(values[i, a, t]) for values in grid], list(expected))
+
+    def test_endpoint_matches_single_quotes(self):
+        try:
+            models = get_models()
+            models.crs_forest
+        except (OSError, ValueError) as e:  # model_weights is not checked in
+            raise unittest.SkipTest(f"model weights unavailable: {e}")
+        store = get_customer_store()
+        ids = list(store.frame(["CustomerID"])["CustomerID"]) + ["NOPE"]
+        response = self.client.post("/api/fixed_deposit_batch_offers/", json.dumps({
+            "customer_ids": ids, "amounts": self.AMOUNTS, "tenures": self.TENURES, "BaseRate": 6.5,
+        }), content_type="application/json")
+        self.assertEqual(response.status_code, 200, response.content)
+        result = response.json()
+        self.assertEqual(result["errors"], {"NOPE": "No customer with ID NOPE"})
+
+        matrix = store.features(ids)
+        for i, cid in enumerate(ids[:-1]):
+            crs = classification_model_prediction(CRS_SPEC.gather(matrix, matrix.positions([cid])[0]), models)
+            self.assertEqual(result["CRS"][i], crs)
+            for a, amount in enumerate(self.AMOUNTS):
+                for t, tenure in enumerate(self.TENURES):
+                    _, bonus_bps, final_rate = calculate_fd_bps(crs * 100, amount, tenure, 6.5)
+                    self.assertEqual(result["bonus_bps"][i][a][t], bonus_bps, (cid, amount, tenure))
+                    self.assertEqual(result["final_rate"][i][a][t], final_rate, (cid, amount, tenure))
+
+
+class PredictionCacheTests(SimpleTestCase):
+    """Single-quote predictions are reused only for the same input and model."""
+
+    def setUp(self):
+        self.cache = PredictionCache(max_entries=2)
+        self.models = SimpleNamespace(version="v1", fingerprint="v1:aaaa")
+
+    def test_hit_and_miss(self):
+        key = self.cache.key("crs", self.models, [1.0, 2.0, 3.0])
+        self.assertIsNone(self.cache.get(key))
+        self.assertEqual(self.cache.put(key, 0.25), 0.25)
+        self.assertEqual(self.cache.get(self.cache.key("crs", self.models, np.array([1, 2, 3]))), 0.25)
+        self.assertIsNone(self.cache.get(self.cache.key("crs", self.models, [1.0, 2.0, 3.5])))
+        self.assertIsNone(self.cache.get(self.cache.key("ras", self.models, [1.0, 2.0, 3.0])))
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"]), (1, 3, 1))
+
+    def test_lru_eviction(self):
+        keys = [self.cache.key("crs", self.models, [float(i)]) for i in range(3)]
+        self.cache.put(keys[0], 0.0)
+        self.cache.put(keys[1], 1.0)
+        self.cache.get(keys[0])
+        self.cache.put(keys[2], 2.0)
+        self.assertIsNone(self.cache.get(keys[1]))
+        self.assertEqual((self.cache.get(keys[0]), self.cache.get(keys[2])), (0.0, 2.0))
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_other_fingerprint_misses(self):
+        # Weights replaced in place under the same version name get a new fingerprint.
+        self.cache.put(self.cache.key("crs", self.models, [1.0]), 0.5)
+        retrained = SimpleNamespace(version="v1", fingerprint="v1:bbbb")
+        self.assertIsNone(self.cache.get(self.cache.key("crs", retrained, [1.0])))
+
+    def test_model_swap_clears_cache(self):
+        registry = ModelRegistry(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, registry.model_dir, ignore_errors=True)
+        with mock.patch("ml_models.utils.prediction_cache.prediction_cache", self.cache):
+            registry._swap(self.models)
+            key = self.cache.key("crs", self.models, [1.0])
+            self.cache.put(key, 0.5)
+            registry._swap(self.models)  # re-activating the same bundle keeps its entries
+            self.assertEqual(self.cache.get(key), 0.5)
+            registry._swap(SimpleNamespace(version="v2", fingerprint="v2:cccc"))
+        self.assertEqual(self.cache.stats()["entries"], 0)
+        self.assertIsNone(self.cache.get(key))
+
+    def test_repeat_quote_skips_inference(self):
+        try:
+            models = get_models()
+            models.crs_forest
+        except (OSError, ValueError) as e:  # model_weights is not checked in
+            raise unittest.SkipTest(f"model weights unavailable: {e}")
+        matrix = FeatureMatrix.from_frame(pd.read_csv(SAMPLE_BOOK))
+        row = CRS_SPEC.gather(matrix, 0)
+        with mock.patch("ml_models.utils.house_loan.prediction_cache", self.cache), \
+                contextlib.redirect_stdout(io.StringIO()):
+            crs = classification_model_prediction(row, models)
+            with mock.patch.object(crs_batcher, "predict", side_effect=AssertionError("not cached")):
+                self.assertEqual(classification_model_prediction(row, models), crs)
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+
+class MicroBatcherTests(SimpleTestCase):
+    """Concurrent callers share model calls but each gets its own row's result."""
+
+    CALLERS = 16
+
+    def setUp(self):
+        self.calls = []
+        self.first_call = threading.Event()
+        self.release = threading.Event()
+
+    def batch_fn(self, models, X):
+        self.calls.append((models.name, len(X)))
+        if not self.first_call.is_set():
+            # Hold the first batch so every other caller queues up behind it.
+            self.first_call.set()
+            self.release.wait(5)
+        if models.name == "broken":
+            raise ValueError("scoring failed")
+        return X[:, 0] * 10 + X[:, 1] + models.offset
+
+    def submit_concurrently(self, batcher, jobs):
+        results = [None] * len(jobs)
+
+        def run(i, models, row):
+            try:
+                results[i] = batcher.predict(models, row)
+            except Exception as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=run, args=(i, *job)) for i, job in enumerate(jobs)]
+        threads[0].start()
+        self.assertTrue(self.first_call.wait(5))
+        for thread in threads[1:]:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while len(batcher._pending) < len(jobs) - 1 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_results_routed_to_callers(self):
+        batcher = MicroBatcher("test", self.batch_fn, window_ms=1, max_batch=64)
+        bundles = [SimpleNamespace(name="a", offset=0.0), SimpleNamespace(name="b", offset=1000.0)]
+        jobs = [(bundles[i % 2], [i, 0.5]) for i in range(self.CALLERS)]
+        results = self.submit_concurrently(batcher, jobs)
+        self.assertEqual(results, [i * 10 + 0.5 + bundles[i % 2].offset for i in range(self.CALLERS)])
+        # The first caller scores alone; the rest share one call per model bundle.
+        self.assertEqual(sorted(self.calls), [("a", 1), ("a", 7), ("b", 8)])
+        self.assertEqual(batcher.stats()["rows"], self.CALLERS)
+        self.assertEqual(batcher.stats()["max_batch_size"], self.CALLERS - 1)
+
+    def test_max_batch_and_errors(self):
+        batcher = MicroBatcher("test", self.batch_fn, window_ms=1, max_batch=4)
+        broken = SimpleNamespace(name="broken", offset=0.0)
+        healthy = SimpleNamespace(name="ok", offset=0.0)
+        jobs = [(broken if i % 3 == 0 else healthy, [i, 0]) for i in range(self.CALLERS)]
+        results = self.submit_concurrently(batcher, jobs)
+        for i, result in enumerate(results):
+            if i % 3 == 0:
+                self.assertIsInstance(result, ValueError)
+            else:
+                self.assertEqual(result, i * 10)
+        self.assertLessEqual(batcher.stats()["max_batch_size"], 4)
+        self.assertEqual(batcher.stats()["rows"], self.CALLERS)
+
+    def test_disabled_scores_directly(self):
+        batcher = MicroBatcher("test", lambda models, X: X[:, 0] + models.offset, enabled=False)
+        self.assertEqual(batcher.predict(SimpleNamespace(offset=1.0), [2.0, 0.0]), 3.0)
+        self.assertEqual(batcher.stats()["batches"], 0)
+
+
+class InferencePoolTests(SimpleTestCase):
+    """Scores from the worker processes equal in-process scores."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        try:
+            cls.models = get_models()
+            cls.models.load()
+        except (OSError, ValueError) as e:  # model_weights is not checked in
+            raise unittest.SkipTest(f"model weights unavailable: {e}")
+        cls.pool = InferencePool(1, cls.models.version)
+        cls.addClassCleanup(cls.pool.shutdown)
+        with contextlib.redirect_stdout(io.StringIO()):
+            cls.pool.warm()
+
+    def setUp(self):
+        matrix = FeatureMatrix.from_frame(pd.read_csv(SAMPLE_BOOK))
+        self.rows = np.arange(len(matrix))
+        self.crs = CRS_SPEC.gather(matrix, self.rows)
+        self.ras = RAS_SPEC.gather(matrix, self.rows, LoanAmount=np.linspace(1e5, 9e5, len(self.rows)),
+                                   LoanDuration=240)
+
+    def test_matches_in_process(self):
+        version = self.models.version
+        np.testing.assert_array_equal(self.pool.predict("crs", version, self.crs),
+                                      classification_matrix_prediction(self.crs, self.models))
+        np.testing.assert_array_equal(self.pool.predict("ras", version, self.ras),
+                                      regression_matrix_prediction(self.ras, self.models))
+        np.testing.assert_array_equal(self.pool.predict("ras_raw", version, self.ras[0]),
+                                      predict_ras_raw(self.ras[:1], self.models))
+        self.assertEqual(self.pool.predict("crs", version, self.crs[:0]).shape, (0,))
+
+
+class SensitivityTests(SimpleTestCase):
+    """A what-if scenario that changes nothing prices like the customer as is."""
+
+    def test_zero_change_gives_zero_delta(self):
+        try:
+            get_models().crs_forest
+        except (OSError, ValueError) as e:  # model_weights is not checked in
+            raise unittest.SkipTest(f"model weights unavailable: {e}")
+        response = self.client.post("/api/house_loan_sensitivity/", json.dumps({
+            "customer_id": "CUSTBEST", "LoanAmount": 500000, "LoanDuration": 240, "BaseRate": 8.5,
+            "market_bps": 12.5,
+            "perturbations": {"CreditScore": {"delta": [0]}, "CreditCardUtilizationRate": {"delta": [0, 0]},
+                              "LoanAmount": {"delta": [0]}},
+        }), content_type="application/json")
+        self.assertEqual(response.status_code, 200, response.content)
+        result = response.json()
+        self.assertNotIn("model_error", result)
+        for feat, marginal in result["marginal_bps"].items():
+            self.assertEqual(marginal["rule_bps"], [0.0] * len(marginal["values"]), feat)
+            self.assertEqual(marginal["model_bps"], [0.0] * len(marginal["values"]), feat)
+        baseline = result["baseline"]
+        for key, surface in result["surface"].items():
+            self.assertEqual(np.unique(surface).tolist(), [baseline[key]], key)
+
+
+@override_settings(MODEL_ADMIN_TOKEN="secret")
+class RuleSetImpactTests(SimpleTestCase):
+    """Simulating the active rule set against itself moves no customer."""
+
+    def impact(self, payload, **headers):
+        return self.client.post("/api/admin/rule-set/impact/", json.dumps(payload),
+                                content_type="application/json", **headers)
+
+    def test_requires_admin_token(self):
+        self.assertEqual(self.impact({"candidate": get_rule_set().version}).status_code, 403)
+
+    def test_candidate_equal_to_baseline(self):
+        version = get_rule_set().version
+        for rule_set in ("house_loan", "fixed_deposit"):
+            response = self.impact({"candidate": version, "rule_set": rule_set, "segments": ["Geography"]},
+                                   HTTP_X_ADMIN_TOKEN="secret")
+            self.assertEqual(response.status_code, 200, response.content)
+            report = response.json()
+            self.assertGreater(report["customers"], 0)
+            summary = report["summary"]
+            self.assertEqual(summary["unchanged"], report["customers"])
+            self.assertEqual((summary["better_rate"], summary["worse_rate"]), (0, 0))
+            self.assertEqual(summary["baseline_bps"], summary["candidate_bps"])
+            for stats in (summary["delta_bps"], summary["rate_delta"]):
+                self.assertEqual(set(stats.values()), {0})
+            self.assertEqual(report["histograms"]["bps"]["baseline"], report["histograms"]["bps"]["candidate"])
+            self.assertEqual(sum(report["histograms"]["delta_bps"]["counts"]), report["customers"])
+            self.assertTrue(all(row["delta_bps"] == 0 for row in report["by_feature"]))
+            self.assertTrue(all(row["delta_bps"] == 0 for row in report["segments"]["Geography"]))
+            self.assertTrue(report["top_movers"])
+            for mover in report["top_movers"]:
+                self.assertEqual((mover["delta_bps"], mover["rate_delta"], mover["drivers"]), (0, 0, {}))
@@ -1,6 +1,6 @@
 from django.urls import path
-from .views import save_house_loan_json,get_house_loan_json_last_modified,add_customer_data, share_house_loan_json,customer_details,get_house_loan_interest_rate,customer_details_by_id,build_faiss_database,get_house_loan_interest_rater
-from .views import get_fixed_deposit_last_modified ,save_fixed_deposit_json ,share_fixed_deposit_json,get_fixed_deposit_interest_rate,get_fixed_deposit_interest_rater,process_question
+from .views import save_house_loan_json,get_house_loan_json_last_modified,add_customer_data, share_house_loan_json,customer_details,customer_query,get_house_loan_interest_rate,customer_details_by_id,build_faiss_database,get_house_loan_interest_rater,house_loan_batch_predict,model_version_admin,rule_set_admin,rule_set_impact,house_loan_sensitivity
+from .views import get_fixed_deposit_last_modified ,save_fixed_deposit_json ,share_fixed_deposit_json,get_fixed_deposit_interest_rate,get_fixed_deposit_interest_rater,fixed_deposit_batch_offers,process_question
 
 urlpatterns = [
     
@@ -10,12 +10,18 @@ urlpatterns = [
     path("api/house_loan_last_modified/", get_house_loan_json_last_modified, name="get_house_loan_json_last_modified"),
     path("api/house_loan_predict/", get_house_loan_interest_rate, name="house_loan_prediction"),
     path("api/house_loan_predictor/", get_house_loan_interest_rater, name="house_loan_prediction1"),
+    path("api/house_loan_batch_predict/", house_loan_batch_predict, name="house_loan_batch_predict"),
+    path("api/house_loan_sensitivity/", house_loan_sensitivity, name="house_loan_sensitivity"),
     
     # -------------------- GENERAL VIEWS -----------------------
     path("api/add-customer/", add_customer_data, name="add_customer_data"),
     path("api/build-faiss/", build_faiss_database, name="build_faiss_database"),
     path("api/customer-details/<str:cid>/", customer_details_by_id, name="customer_details_by_id"),
     path("api/customer-details/", customer_details, name="customer_details"),
+    path("api/customer-query/", customer_query, name="customer_query"),
+    path("api/admin/model-version/", model_version_admin, name="model_version_admin"),
+    path("api/admin/rule-set/", rule_set_admin, name="rule_set_admin"),
+    path("api/admin/rule-set/impact/", rule_set_impact, name="rule_set_impact"),
     
     
     # -------------------- FIXED DEPOSIT VIEWS -----------------
@@ -24,6 +30,7 @@ urlpatterns = [
     path("api/fixed_deposit_last_modified/", get_fixed_deposit_last_modified, name="get_fixed_deposit_last_modified"),
     path("api/fixed_deposit_predict/", get_fixed_deposit_interest_rate, name="get_fixed_deposit_interest_rate"),
     path("api/get_fixed_deposit_interest_rater/", get_fixed_deposit_interest_rater, name="get_fixed_deposit_interest_rater"),
+    path("api/fixed_deposit_batch_offers/", fixed_deposit_batch_offers, name="fixed_deposit_batch_offers"),
     
     
     # -------------------- Customer  Chat bot VIEWS -----------------
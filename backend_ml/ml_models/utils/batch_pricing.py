@@ -0,0 +1,229 @@
+import numpy as np
+import pandas as pd
+from .customer_store import normalize_customer_id
+from .model_features import FeatureMatrix, CRS_SPEC, RAS_SPEC
+from .house_loan import (
+    classification_matrix_prediction, regression_matrix_prediction, calculate_house_loan_bps_array,
+)
+from .fixed_deposit import calculate_fd_bps_array
+from .model_registry import get_models
+
+
+# -------------------- Batch Pricing --------------------
+# Quotes are priced a chunk at a time: the chunk's rows are gathered from the
+# encoded feature matrix, the CRS and RAS models are called once on the whole
+# chunk and the BPS formula runs over arrays, so the cost per quote is a few
+# array operations instead of two single-row DataFrames and model calls.
+
+PRICING_BATCH_CHUNK_SIZE = 1000
+PRICING_BATCH_MAX_ITEMS = 100000
+FD_GRID_MAX_CELLS = 2000000
+
+LOAN_TERMS = ("LoanAmount", "LoanDuration", "BaseRate")
+
+
+def loan_terms(source, defaults):
+    """
+    Returns [LoanAmount, LoanDuration, BaseRate] as floats, taken from source
+    with defaults as fallback. Raises ValueError if one is missing or invalid.
+    """
+    terms = []
+    for key in LOAN_TERMS:
+        value = source.get(key, defaults.get(key))
+        if value is None or value == "":
+            raise ValueError(f"{key} is required.")
+        try:
+            terms.append(float(value))
+        except (TypeError, ValueError):
+            raise ValueError(f"{key} must be a number.")
+    return terms
+
+
+def batch_customers_from_payload(data, store):
+    """
+    Returns (labels, matrix, positions) for the customers of a batch payload.
+
+    The payload has either "customer_ids" (looked up in the book through
+    store.features) or "profiles" (ad-hoc customer records with the CSV's
+    field names, encoded on the fly). Raises ValueError on bad input.
+    """
+    if data.get("profiles") is not None:
+        profiles = data["profiles"]
+        if not isinstance(profiles, list) or not all(isinstance(p, dict) for p in profiles):
+            raise ValueError("profiles must be a list of objects.")
+        _check_batch_size(len(profiles))
+        labels = [str(p.get("CustomerID", i)) for i, p in enumerate(profiles)]
+        matrix = FeatureMatrix.from_frame(pd.DataFrame.from_records(profiles))
+        return labels, matrix, np.arange(len(profiles), dtype=np.int64)
+
+    customer_ids = data.get("customer_ids")
+    if not isinstance(customer_ids, list):
+        raise ValueError("Provide customer_ids (a list) or profiles.")
+    _check_batch_size(len(customer_ids))
+    labels = [normalize_customer_id(cid) for cid in customer_ids]
+    matrix = store.features(labels)
+    return labels, matrix, matrix.positions(labels)
+
+
+def batch_items_from_payload(data, store):
+    """
+    Turns a batch house-loan payload into (labels, matrix, positions, terms).
+    Loan terms come from the top level and a profile may override them.
+    """
+    labels, matrix, positions = batch_customers_from_payload(data, store)
+    defaults = {key: data.get(key) for key in LOAN_TERMS}
+    profiles = data.get("profiles")
+    if profiles is not None:
+        terms = np.array([loan_terms(p, defaults) for p in profiles], dtype=float).reshape(-1, 3)
+    else:
+        terms = np.tile(loan_terms({}, defaults), (len(labels), 1))
+    return labels, matrix, positions, terms
+
+
+def _check_batch_size(n):
+    if n == 0:
+        raise ValueError("The batch is empty.")
+    if n > PRICING_BATCH_MAX_ITEMS:
+        raise ValueError(f"At most {PRICING_BATCH_MAX_ITEMS} quotes per batch.")
+
+
+def house_loan_quotes(labels, matrix, positions, terms, chunk_size=PRICING_BATCH_CHUNK_SIZE, models=None,
+                      scores=None):
+    """
+    Yields one list of quote dicts per chunk. Quotes carry the same fields as
+    the single-customer endpoint; unknown customers and rows with missing CRS
+    inputs get an "error" entry instead (there is no LLM fallback in batch).
+    Every chunk is priced with the same model bundle (the active one unless
+    models is given), even if another version is activated mid-stream.
+    CRS is read from scores (a score_table.ScoreTable) when it covers matrix.
+    """
+    models = models or get_models()
+    for start in range(0, len(labels), chunk_size):
+        stop = min(start + chunk_size, len(labels))
+        pos = positions[start:stop]
+        chunk_terms = terms[start:stop]
+        known = pos >= 0
+        crs, complete, crs_scores, ras_scores, bps, deduction, final_rate = house_loan_arrays(
+            matrix, pos, chunk_terms, models, scores)
+
+        quotes = []
+        values = zip(crs_scores.tolist(), ras_scores.tolist(), bps.tolist(), deduction.tolist(),
+                     final_rate.tolist(), chunk_terms.tolist())
+        for i, (crs_score, ras_score, b, d, rate, (amount, duration, base_rate)) in enumerate(values):
+            label = labels[start + i]
+            if not known[i]:
+                quotes.append({"customer_id": label, "error": f"No customer with ID {label}"})
+            elif not complete[i]:
+                quotes.append({"customer_id": label, "error": "Missing CRS fields",
+                               "missing": CRS_SPEC.missing_fields(crs[i])})
+            else:
+                quotes.append({
+                    "customer_id": label,
+                    "CRS": crs_score,
+                    "RAS": ras_score,
+                    "base_rate": base_rate,
+                    "BPS": b,
+                    "BPS_Deduction": d,
+                    "loan_amount": amount,
+                    "loan_duration": duration,
+                    "FinalRate": rate,
+                    "model_version": models.version,
+                })
+        yield quotes
+
+
+def house_loan_arrays(matrix, positions, terms, models, scores=None):
+    """
+    Prices the rows at positions of matrix (-1: unknown customer) with one
+    CRS and one RAS model call. terms holds [LoanAmount, LoanDuration,
+    BaseRate] per row. Returns (crs inputs, complete, CRS, RAS, BPS,
+    deduction, final rate) as arrays; the scores are NaN where complete is False.
+    """
+    known = positions >= 0
+    rows = np.where(known, positions, 0)
+    crs = CRS_SPEC.gather(matrix, rows)
+    ras = RAS_SPEC.gather(matrix, rows, LoanAmount=terms[:, 0], LoanDuration=terms[:, 1])
+    # The RF cannot score missing values; XGBoost handles them natively.
+    complete = known & ~CRS_SPEC.missing(crs).any(axis=1)
+
+    crs_scores = np.full(len(positions), np.nan)
+    ras_scores = np.full(len(positions), np.nan)
+    if complete.any():
+        crs_scores[complete] = _crs_scores(crs, rows, complete, models, scores, matrix)
+        ras_scores[complete] = regression_matrix_prediction(ras[complete], models)
+    bps, deduction, final_rate = calculate_house_loan_bps_array(crs_scores, ras_scores, terms[:, 2])
+    return crs, complete, crs_scores, ras_scores, bps, deduction, final_rate
+
+
+def _number_list(data, key):
+    values = data.get(key)
+    if not isinstance(values, list) or not values:
+        raise ValueError(f"{key} must be a non-empty list of numbers.")
+    try:
+        return np.array([float(v) for v in values])
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} must be a non-empty list of numbers.")
+
+
+def _crs_scores(crs, rows, complete, models, scores, matrix):
+    # Materialized CRS when the score table was built from this matrix.
+    if scores is not None and scores.features is matrix and scores.fingerprint == models.fingerprint:
+        return scores.crs[rows[complete]]
+    return classification_matrix_prediction(crs[complete], models)
+
+
+def fd_offer_grid(data, store, models=None, scores=None):
+    """
+    Scores CRS for every requested customer in one model call and evaluates
+    the FD bonus formula over the customer x amount x tenure grid.
+
+    Returns a columnar dict: the axes (customer_ids, amounts, tenures), CRS
+    per customer, bonus_bps / final_rate as nested lists indexed
+    [customer][amount][tenure] and the model_version that scored CRS. Customers that cannot be scored get null
+    rows and an entry in "errors". CRS is read from scores (a ScoreTable)
+    when it covers the book. Raises ValueError on bad input.
+    """
+    labels, matrix, positions = batch_customers_from_payload(data, store)
+    amounts = _number_list(data, "amounts")
+    tenures = _number_list(data, "tenures")
+    try:
+        base_rate = float(data.get("BaseRate"))
+    except (TypeError, ValueError):
+        raise ValueError("BaseRate is required and must be a number.")
+    if len(labels) * len(amounts) * len(tenures) > FD_GRID_MAX_CELLS:
+        raise ValueError(f"At most {FD_GRID_MAX_CELLS} offers (customers x amounts x tenures) per batch.")
+
+    models = models or get_models()
+    known = positions >= 0
+    rows = np.where(known, positions, 0)
+    crs = CRS_SPEC.gather(matrix, rows)
+    complete = known & ~CRS_SPEC.missing(crs).any(axis=1)
+    crs_scores = np.full(len(labels), np.nan)
+    if complete.any():
+        crs_scores[complete] = _crs_scores(crs, rows, complete, models, scores, matrix)
+
+    _, bonus_bps, final_rate = calculate_fd_bps_array(
+        (crs_scores * 100)[:, None, None], amounts[None, :, None], tenures[None, None, :], base_rate,
+    )
+
+    errors = {}
+    for i in np.flatnonzero(~complete):
+        if not known[i]:
+            errors[labels[i]] = f"No customer with ID {labels[i]}"
+        else:
+            errors[labels[i]] = "Missing CRS fields: " + ", ".join(CRS_SPEC.missing_fields(crs[i]))
+
+    def nested(values):
+        return [row if ok else None for row, ok in zip(values.tolist(), complete)]
+
+    return {
+        "customer_ids": labels,
+        "amounts": amounts.tolist(),
+        "tenures": tenures.tolist(),
+        "base_rate": base_rate,
+        "CRS": [score if ok else None for score, ok in zip(crs_scores.tolist(), complete)],
+        "bonus_bps": nested(bonus_bps),
+        "final_rate": nested(final_rate),
+        "errors": errors,
+        "model_version": models.version,
+    }
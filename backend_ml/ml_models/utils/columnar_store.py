@@ -0,0 +1,241 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+from .customer_store import (
+    read_customer_csv, build_customer_index, normalize_customer_id, queue_customer_rows, FEATURES_KEY,
+    ROW_HASHES_KEY,
+)
+from .customer_upsert import UPSERT, APPEND, HASH_EXCLUDED_COLUMNS, book_hashes
+from .model_features import FEATURE_SOURCE_COLUMNS, read_features, write_features
+from .customer_query import ColumnIndex, INDEXED_COLUMNS, DEFAULT_QUERY_LIMIT, query_frame, referenced_columns
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+except ImportError:  # optional dependency, only needed for the columnar backend
+    pa = None
+    ipc = None
+
+
+# -------------------- Columnar (Arrow IPC) Customer Store --------------------
+# The CSV stays the ingestion format; an Arrow IPC file next to it is the read
+# format. It is regenerated when ingest compaction changes the CSV (and on the
+# first read of a CSV changed any other way) and memory-mapped on read, so a
+# reader that asks for 8 columns only touches those 8 column buffers.
+
+SOURCE_MTIME_KEY = b"jatayu.source_mtime_ns"
+SOURCE_SIZE_KEY = b"jatayu.source_size"
+
+
+def columnar_path_for(csv_path):
+    return os.path.splitext(csv_path)[0] + ".arrow"
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("pyarrow is required for the columnar customer store (pip install pyarrow).")
+
+
+def _source_signature(csv_path):
+    stat = os.stat(csv_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def frame_to_arrow(df):
+    """
+    Converts a customer DataFrame to an Arrow table. Object columns are
+    stored as strings because uploads mix numbers and text in the same column.
+    """
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].map(lambda v: None if pd.isna(v) else str(v))
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def write_columnar(csv_path, arrow_path=None):
+    """
+    Regenerates the Arrow IPC file from csv_path. The CSV's mtime/size is
+    stamped into the schema metadata so readers can tell if it is stale.
+    The file is written next to the target and renamed into place.
+    """
+    _require_pyarrow()
+    arrow_path = arrow_path or columnar_path_for(csv_path)
+    mtime_ns, size = _source_signature(csv_path)
+    table = frame_to_arrow(read_customer_csv(csv_path))
+    metadata = dict(table.schema.metadata or {})
+    metadata[SOURCE_MTIME_KEY] = str(mtime_ns).encode()
+    metadata[SOURCE_SIZE_KEY] = str(size).encode()
+    table = table.replace_schema_metadata(metadata)
+
+    tmp_path = arrow_path + ".tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, arrow_path)
+    print(f"Columnar customer file written: {arrow_path} ({table.num_rows} rows)")
+    return arrow_path
+
+
+def refresh_columnar(csv_path):
+    """Regenerates the Arrow copy of csv_path if one is kept and it is stale; called after compaction."""
+    arrow_path = columnar_path_for(csv_path)
+    if pa is None or not os.path.exists(arrow_path) or not os.path.exists(csv_path):
+        return None
+    if columnar_signature(arrow_path) == _source_signature(csv_path):
+        return arrow_path
+    return write_columnar(csv_path, arrow_path)
+
+
+def columnar_signature(arrow_path):
+    """Returns the (mtime_ns, size) of the CSV the Arrow file was built from, or None."""
+    if not os.path.exists(arrow_path):
+        return None
+    with pa.memory_map(arrow_path, "r") as source:
+        metadata = ipc.open_file(source).schema.metadata or {}
+    try:
+        return int(metadata[SOURCE_MTIME_KEY]), int(metadata[SOURCE_SIZE_KEY])
+    except (KeyError, ValueError):
+        return None
+
+
+def read_columnar(arrow_path, columns=None):
+    """Memory-maps arrow_path and returns only the requested columns as a DataFrame."""
+    _require_pyarrow()
+    table = ipc.open_file(pa.memory_map(arrow_path, "r")).read_all()
+    if columns is not None:
+        table = table.select([col for col in columns if col in table.column_names])
+    return table.to_pandas()
+
+
+class ColumnarCustomerStore:
+    """
+    Customer store that serves reads from a memory-mapped Arrow IPC copy of
+    the CSV. Column projection happens before anything is converted to
+    pandas, so narrow readers (scoring, detail views) never materialise the
+    full 45-column book.
+    """
+
+    def __init__(self, csv_path, arrow_path=None):
+        _require_pyarrow()
+        self.csv_path = csv_path
+        self.arrow_path = arrow_path or columnar_path_for(csv_path)
+        self._lock = threading.Lock()
+        # (arrow Table, {CustomerID: row position}, source signature, {column: ColumnIndex})
+        self._snapshot = None
+
+    def _current(self):
+        signature = _source_signature(self.csv_path)
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot[2] == signature:
+            return snapshot
+        with self._lock:
+            if self._snapshot is not None and self._snapshot[2] == signature:
+                return self._snapshot
+            if columnar_signature(self.arrow_path) != signature:
+                write_columnar(self.csv_path, self.arrow_path)
+            table = ipc.open_file(pa.memory_map(self.arrow_path, "r")).read_all()
+            if "CustomerID" in table.column_names:
+                index = build_customer_index(table.column("CustomerID").to_pylist())
+            else:
+                index = {}
+            self._snapshot = (table, index, signature, {})
+            return self._snapshot
+
+    def _select(self, table, columns):
+        if columns is None:
+            return table
+        return table.select([col for col in columns if col in table.column_names])
+
+    def exists(self):
+        return os.path.exists(self.csv_path)
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+    def frame(self, columns=None):
+        table = self._current()[0]
+        return self._select(table, columns).to_pandas()
+
+    def rows(self, start, stop, columns=None):
+        table = self._current()[0]
+        start = min(start, table.num_rows)
+        stop = min(stop, table.num_rows)
+        return self._select(table.slice(start, max(stop - start, 0)), columns).to_pandas()
+
+    def get(self, customer_id, columns=None):
+        table, index, _, _ = self._current()
+        pos = index.get(normalize_customer_id(customer_id))
+        if pos is None:
+            return None
+        record = self._select(table.slice(int(pos), 1), columns).to_pylist()[0]
+        return pd.Series({k: (np.nan if v is None else v) for k, v in record.items()})
+
+    def append(self, df, added_by=None, mode=UPSERT):
+        """
+        Queues the rows on the CSV's ingestion log and returns the upsert
+        report. The columnar file is regenerated when the log is compacted
+        into the CSV.
+        """
+        if not self.exists():
+            return queue_customer_rows(self.csv_path, None, [], df, added_by, APPEND)
+        columns = self._current()[0].column_names
+        return queue_customer_rows(self.csv_path, self._row_hashes, columns, df, added_by, mode)
+
+    def _row_hashes(self):
+        # {CustomerID: content hash} of the current snapshot, cached with it.
+        table, _, _, cache = self._current()
+        hashes = cache.get(ROW_HASHES_KEY)
+        if hashes is None:
+            # AddedBy is not part of a row's content hash, so it is never read.
+            hashed = [col for col in table.column_names if col not in HASH_EXCLUDED_COLUMNS]
+            hashes = cache[ROW_HASHES_KEY] = book_hashes(table.select(hashed).to_pandas(), hashed)
+        return hashes
+
+    def features(self, customer_ids=None):
+        """Returns the encoded CRS / RAS FeatureMatrix of the current snapshot."""
+        table, _, signature, cache = self._current()
+        return self._features(table, signature, cache)
+
+    def _features(self, table, signature, cache):
+        matrix = cache.get(FEATURES_KEY)
+        if matrix is None:
+            matrix = read_features(self.csv_path, signature)
+            if matrix is None:
+                # Only the encoded columns are read out of the Arrow file.
+                df = self._select(table, FEATURE_SOURCE_COLUMNS).to_pandas()
+                matrix = write_features(self.csv_path, df, signature)
+            cache[FEATURES_KEY] = matrix
+        return matrix
+
+    def snapshot(self, columns=None):
+        """(frame, FeatureMatrix) of one and the same snapshot; see frame and features."""
+        table, _, signature, cache = self._current()
+        return self._select(table, columns).to_pandas(), self._features(table, signature, cache)
+
+    def query(self, filters, sort=(), limit=DEFAULT_QUERY_LIMIT, columns=None):
+        """
+        Runs a filtered query, materialising only the columns the query
+        references (all columns when none are requested).
+        """
+        table, _, _, column_indexes = self._current()
+        needed = referenced_columns(filters, sort, columns) if columns else None
+        df = self._select(table, needed).to_pandas()
+
+        def index_for(column):
+            if column not in INDEXED_COLUMNS or column not in table.column_names:
+                return None
+            if column not in column_indexes:
+                column_indexes[column] = ColumnIndex(table.column(column).to_pandas())
+            return column_indexes[column]
+
+        return query_frame(df, filters, sort, limit, columns, index_for=index_for)
+
+    def __contains__(self, customer_id):
+        return normalize_customer_id(customer_id) in self._current()[1]
+
+    def __len__(self):
+        return self._current()[0].num_rows
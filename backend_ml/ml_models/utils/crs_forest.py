@@ -0,0 +1,166 @@
+import os
+import numpy as np
+
+
+# -------------------- Flattened CRS Forest --------------------
+# The CRS random forest is exported once into contiguous node arrays (all trees
+# back to back) and evaluated with numpy: every row walks every tree in
+# lock-step, one level per step, so one row costs max_depth array gathers
+# instead of sklearn's per-call validation and per-tree dispatch.
+# It reproduces RandomForestClassifier.predict_proba bit for bit: inputs are
+# compared as float32 (as sklearn's trees do), leaf values are normalised the
+# same way and the per-tree probabilities are summed in tree order before
+# dividing by the number of trees.
+
+FOREST_FORMAT_VERSION = 1
+
+# Rows walked together; keeps the (rows x trees) node arrays cache-sized.
+FOREST_CHUNK_ROWS = 512
+
+
+def forest_path_for(model_path):
+    return os.path.splitext(model_path)[0] + ".forest.npz"
+
+
+def _file_stamp(path):
+    stat = os.stat(path)
+    return np.array([stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+
+
+class FlatForest:
+    """
+    A fitted single-output forest classifier as flat node arrays. children
+    holds (left, right) per node and leaves point to themselves, so a walk
+    can run a fixed number of steps.
+    """
+
+    def __init__(self, feature, threshold, children, leaf_proba, roots, classes,
+                 n_features, max_depth, missing_left=None):
+        self.feature = np.ascontiguousarray(feature, dtype=np.intp)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.children = np.ascontiguousarray(children, dtype=np.intp).reshape(-1, 2)
+        self.leaf_proba = np.ascontiguousarray(leaf_proba, dtype=np.float64)
+        self.roots = np.ascontiguousarray(roots, dtype=np.intp)
+        self.classes = np.asarray(classes)
+        self.n_features = int(n_features)
+        self.max_depth = int(max_depth)
+        self.missing_left = None if missing_left is None else np.asarray(missing_left, dtype=bool)
+        self._next = self.children.ravel()
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Flattens a fitted RandomForestClassifier (or any forest of DecisionTreeClassifiers)."""
+        if getattr(model, "n_outputs_", 1) != 1:
+            raise ValueError("Only single-output forests can be flattened.")
+        n_classes = int(model.n_classes_)
+        features, thresholds, children, probas, missing, roots = [], [], [], [], [], []
+        offset, max_depth = 0, 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n = tree.node_count
+            leaf = tree.children_left == -1
+            idx = np.arange(offset, offset + n)
+            roots.append(offset)
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(np.where(leaf, 0.0, tree.threshold))
+            children.append(np.column_stack([np.where(leaf, idx, tree.children_left + offset),
+                                             np.where(leaf, idx, tree.children_right + offset)]))
+            # DecisionTreeClassifier.predict_proba: leaf value over its row sum.
+            proba = tree.value[:, 0, :n_classes].copy()
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            proba /= normalizer
+            probas.append(proba)
+            if hasattr(tree, "missing_go_to_left"):
+                missing.append(np.asarray(tree.missing_go_to_left, dtype=bool))
+            max_depth = max(max_depth, tree.max_depth)
+            offset += n
+        return cls(
+            np.concatenate(features), np.concatenate(thresholds), np.concatenate(children),
+            np.concatenate(probas), roots, model.classes_, model.n_features_in_, max_depth,
+            np.concatenate(missing) if missing else None,
+        )
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def _check(self, X):
+        X = np.asarray(X, dtype=np.float32)  # sklearn's trees compare float32 inputs
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"X has {X.shape[1]} features, the forest expects {self.n_features}.")
+        return np.ascontiguousarray(X)
+
+    def _walk(self, X):
+        flat = X.ravel()
+        base = (np.arange(X.shape[0]) * self.n_features)[:, np.newaxis]
+        node = np.broadcast_to(self.roots, (X.shape[0], self.n_trees)).copy()
+        for _ in range(self.max_depth):
+            x = flat[base + self.feature[node]]
+            go_right = ~(x <= self.threshold[node])  # NaN goes right, as in sklearn
+            if self.missing_left is not None:
+                go_right &= ~(np.isnan(x) & self.missing_left[node])
+            node = self._next[2 * node + go_right]
+        return node
+
+    def apply(self, X):
+        """Leaf node (flat index) reached by every row in every tree, shape (n_rows, n_trees)."""
+        X = self._check(X)
+        if len(X) <= FOREST_CHUNK_ROWS:
+            return self._walk(X)
+        return np.concatenate([self._walk(X[i:i + FOREST_CHUNK_ROWS])
+                               for i in range(0, len(X), FOREST_CHUNK_ROWS)])
+
+    def predict_proba(self, X):
+        """Same values as the source forest's predict_proba(X)."""
+        proba = self.leaf_proba[self.apply(X)]
+        # Sequential sum over trees (cumsum does not reorder), as sklearn accumulates them.
+        total = np.cumsum(proba, axis=1)[:, -1]
+        total /= self.n_trees
+        return total
+
+    # ---- persistence ----
+    def save(self, path, source_path=None):
+        """Writes the arrays to path, stamped with the source model file if given."""
+        arrays = {
+            "format": np.array(FOREST_FORMAT_VERSION),
+            "feature": self.feature, "threshold": self.threshold,
+            "children": self.children, "leaf_proba": self.leaf_proba,
+            "roots": self.roots, "classes": np.asarray(self.classes.tolist()),
+            "shape": np.array([self.n_features, self.max_depth]),
+            "source_stamp": _file_stamp(source_path) if source_path else np.zeros(2, dtype=np.int64),
+        }
+        if self.missing_left is not None:
+            arrays["missing_left"] = self.missing_left
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path, source_path=None):
+        """Loads an exported forest; None if missing, stale or written in another format."""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            if int(data["format"]) != FOREST_FORMAT_VERSION:
+                return None
+            if source_path and os.path.exists(source_path) and \
+                    not np.array_equal(data["source_stamp"], _file_stamp(source_path)):
+                return None
+            n_features, max_depth = data["shape"]
+            return cls(data["feature"], data["threshold"], data["children"], data["leaf_proba"],
+                       data["roots"], data["classes"], n_features, max_depth,
+                       data["missing_left"] if "missing_left" in data else None)
+
+
+def export_forest(model, model_path, path=None):
+    """Flattens model (loaded from model_path) and saves it next to it."""
+    forest = FlatForest.from_sklearn(model)
+    path = path or forest_path_for(model_path)
+    forest.save(path, model_path)
+    print(f"CRS forest exported: {path} ({forest.n_trees} trees, {len(forest.feature)} nodes, "
+          f"depth {forest.max_depth})")
+    return forest
@@ -0,0 +1,172 @@
+import numpy as np
+import pandas as pd
+
+
+# -------------------- Customer Query Engine --------------------
+# Filters look like {"field": "CreditScore", "op": ">", "value": 750}.
+# Equality / range predicates on indexed columns are answered from a sorted
+# secondary index (hash groups for ==/in, searchsorted for ranges); every other
+# predicate is a vectorised mask over the surviving rows only.
+
+RANGE_OPS = {">", ">=", "<", "<=", "between"}
+EQUALITY_OPS = {"==", "in"}
+QUERY_OPS = RANGE_OPS | EQUALITY_OPS | {"!="}
+
+# Columns that get a secondary index in the in-memory stores; mirrors the
+# indexes declared on the Customer model.
+INDEXED_COLUMNS = ("CreditScore", "Geography", "HomeOwnershipStatus", "AnnualIncome")
+
+DEFAULT_QUERY_LIMIT = 100
+MAX_QUERY_LIMIT = 5000
+
+_EMPTY = np.empty(0, dtype=np.int64)
+
+
+def parse_query(payload):
+    """
+    Validates a query payload and returns (filters, sort, limit, columns).
+    Raises ValueError with a user-facing message on bad input.
+    """
+    filters = payload.get("filters") or []
+    if not isinstance(filters, list):
+        raise ValueError("filters must be a list.")
+    for f in filters:
+        if not isinstance(f, dict) or "field" not in f or "value" not in f:
+            raise ValueError("Each filter needs 'field', 'op' and 'value'.")
+        f.setdefault("op", "==")
+        if f["op"] not in QUERY_OPS:
+            raise ValueError(f"Unsupported op {f['op']!r}; use one of {sorted(QUERY_OPS)}.")
+        if f["op"] == "in" and not isinstance(f["value"], list):
+            raise ValueError("'in' needs a list value.")
+        values = f["value"] if isinstance(f["value"], list) else [f["value"]]
+        if any(isinstance(v, (list, dict)) for v in values):
+            raise ValueError(f"Filter values for {f['field']} must be numbers or labels.")
+        if f["op"] == "between" and (not isinstance(f["value"], list) or len(f["value"]) != 2):
+            raise ValueError("'between' needs a [low, high] value.")
+
+    sort = payload.get("sort") or []
+    if isinstance(sort, (str, dict)):
+        sort = [sort]
+    sort = [{"field": s, "desc": False} if isinstance(s, str) else s for s in sort]
+    if any("field" not in s for s in sort):
+        raise ValueError("Each sort entry needs a 'field'.")
+
+    limit = int(payload.get("limit") or DEFAULT_QUERY_LIMIT)
+    if not 0 < limit <= MAX_QUERY_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_QUERY_LIMIT}.")
+
+    columns = payload.get("columns")
+    if columns is not None and not isinstance(columns, list):
+        raise ValueError("columns must be a list.")
+    return filters, sort, limit, columns
+
+
+def referenced_columns(filters, sort, columns):
+    """Every column a query touches, in a stable order (for projection)."""
+    needed = [f["field"] for f in filters] + [s["field"] for s in sort] + list(columns or [])
+    return list(dict.fromkeys(needed))
+
+
+def equality_values(numeric, value):
+    """
+    The distinct values of an ==/in/!= filter, converted like the range ops
+    do: to numbers for a numeric column (values that are not numbers match
+    nothing) and numbers to labels for a label column.
+    """
+    values = value if isinstance(value, list) else [value]
+    if numeric:
+        values = pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").dropna().tolist()
+    else:
+        values = [str(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else v for v in values]
+    return list(dict.fromkeys(values))
+
+
+class ColumnIndex:
+    """
+    Secondary index over one column: value -> row positions for equality,
+    and values sorted alongside their positions for range lookups.
+    """
+
+    def __init__(self, values):
+        values = pd.Series(values).reset_index(drop=True)
+        self.numeric = pd.api.types.is_numeric_dtype(values)
+        self.groups = {key: np.asarray(pos, dtype=np.int64)
+                       for key, pos in values.groupby(values, sort=False).indices.items()}
+        numeric = pd.to_numeric(values, errors="coerce").to_numpy(dtype=float)
+        valid = ~np.isnan(numeric)
+        order = np.argsort(numeric[valid], kind="stable")
+        self.sorted_positions = np.flatnonzero(valid)[order]
+        self.sorted_values = numeric[valid][order]
+
+    def lookup(self, op, value):
+        if op in EQUALITY_OPS:
+            # Distinct keys have disjoint groups, so the positions stay unique.
+            hits = [self.groups[v] for v in equality_values(self.numeric, value) if v in self.groups]
+            return np.concatenate(hits) if hits else _EMPTY
+        if op == "between":
+            lo = np.searchsorted(self.sorted_values, float(value[0]), side="left")
+            hi = np.searchsorted(self.sorted_values, float(value[1]), side="right")
+        elif op in (">", ">="):
+            lo = np.searchsorted(self.sorted_values, float(value), side="right" if op == ">" else "left")
+            hi = len(self.sorted_values)
+        else:
+            lo = 0
+            hi = np.searchsorted(self.sorted_values, float(value), side="left" if op == "<" else "right")
+        return self.sorted_positions[lo:hi]
+
+
+def _mask(series, op, value):
+    if op in RANGE_OPS:
+        series = pd.to_numeric(series, errors="coerce")
+        if op == "between":
+            return series.between(float(value[0]), float(value[1])).to_numpy()
+        value = float(value)
+        return {
+            ">": series > value, ">=": series >= value,
+            "<": series < value, "<=": series <= value,
+        }[op].to_numpy()
+    matches = series.isin(equality_values(pd.api.types.is_numeric_dtype(series), value)).to_numpy()
+    return ~matches if op == "!=" else matches
+
+
+def query_frame(df, filters, sort=(), limit=DEFAULT_QUERY_LIMIT, columns=None, index_for=None):
+    """
+    Evaluates filters against df and returns (matching row count, result frame).
+
+    index_for(column) may return a ColumnIndex (or None); indexed predicates
+    narrow the candidate row positions first so the remaining masks only run
+    over the survivors.
+    """
+    missing = [f["field"] for f in filters if f["field"] not in df.columns]
+    missing += [s["field"] for s in sort if s["field"] not in df.columns]
+    if missing:
+        raise ValueError(f"Unknown field(s): {', '.join(dict.fromkeys(missing))}")
+
+    positions = None
+    remaining = []
+    for f in filters:
+        index = index_for(f["field"]) if index_for is not None and f["op"] != "!=" else None
+        if index is None:
+            remaining.append(f)
+            continue
+        hits = index.lookup(f["op"], f["value"])
+        positions = np.sort(hits) if positions is None else np.intersect1d(positions, hits, assume_unique=True)
+
+    subset = df if positions is None else df.iloc[positions]
+    if remaining and len(subset):
+        keep = np.ones(len(subset), dtype=bool)
+        for f in remaining:
+            keep &= _mask(subset[f["field"]], f["op"], f["value"])
+        subset = subset[keep]
+
+    count = len(subset)
+    if sort:
+        subset = subset.sort_values(
+            by=[s["field"] for s in sort],
+            ascending=[not s.get("desc", False) for s in sort],
+            kind="stable",
+        )
+    subset = subset.head(limit)
+    if columns:
+        subset = subset[[col for col in columns if col in subset.columns]]
+    return count, subset
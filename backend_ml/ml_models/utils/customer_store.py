@@ -0,0 +1,414 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import transaction
+from ..models import Customer, CUSTOMER_FIELDS, CUSTOMER_NUMERIC_FIELDS
+from .ingest_log import get_ingest_log
+from .customer_query import ColumnIndex, INDEXED_COLUMNS, DEFAULT_QUERY_LIMIT, query_frame, equality_values
+from .customer_upsert import UPSERT, APPEND, book_hashes, classify_rows
+from .model_features import FeatureMatrix, book_features, write_features
+
+
+# -------------------- Customer Store Setup --------------------
+CUSTOMER_CSV_PATH = os.path.join(settings.BASE_DIR, 'db', 'houseloan', 'sample_data.csv')
+
+# Alternative spellings seen in older exports, mapped onto the current schema.
+COLUMN_ALIASES = {
+    "CID": "CustomerID",
+    "Name": "CustomerName",
+}
+
+
+def normalize_customer_id(value):
+    """
+    Normalise a CustomerID the same way everywhere: cast to str, drop any
+    UTF-8 BOM that leaked in from Excel exports and strip whitespace.
+    """
+    return str(value).replace('\ufeff', '').strip()
+
+
+def read_customer_csv(csv_path):
+    """Reads a customer CSV with BOM-free column names and normalised CustomerIDs."""
+    df = pd.read_csv(csv_path)
+    df.columns = df.columns.astype(str).str.replace('\ufeff', '').str.strip()
+    if "CustomerID" in df.columns:
+        df["CustomerID"] = df["CustomerID"].astype(str).str.replace('\ufeff', '').str.strip()
+    return df
+
+
+def build_customer_index(ids):
+    """
+    Maps each CustomerID to its row position. The first occurrence of a
+    duplicated ID wins, matching the old iloc[0] behaviour.
+    """
+    ids = pd.Series(ids)
+    first = ~ids.duplicated(keep='first')
+    return dict(zip(ids[first], first.to_numpy().nonzero()[0]))
+
+
+def refresh_book_features(csv_path):
+    """Re-encodes the model feature matrix for csv_path; called after compaction."""
+    stat = os.stat(csv_path)
+    return write_features(csv_path, read_customer_csv(csv_path), (stat.st_mtime_ns, stat.st_size))
+
+
+def clean_upload_columns(df):
+    """Strips BOMs/whitespace from uploaded column names and resolves aliases."""
+    df = df.rename(columns=lambda c: str(c).replace('\ufeff', '').strip())
+    return df.rename(columns=COLUMN_ALIASES)
+
+
+# Keys under which a snapshot caches derived data next to its column indexes.
+ROW_HASHES_KEY = "__row_hashes__"
+FEATURES_KEY = "__features__"
+
+
+def queue_customer_rows(csv_path, row_hashes, columns, df, added_by=None, mode=UPSERT):
+    """
+    Queues an upload on csv_path's ingestion log and returns the per-batch
+    report. columns is the CSV header and row_hashes() returns the store's
+    {CustomerID: hash} of the CSV as it is on disk. In upsert mode rows are
+    compared by content hash against it (plus the batches still pending in
+    the log) and only inserted / updated rows are queued.
+    """
+    df = clean_upload_columns(df)
+    if mode == APPEND or "CustomerID" not in df.columns or "CustomerID" not in columns:
+        get_ingest_log(csv_path).append(df, added_by=added_by, mode=APPEND)
+        return {"inserted": len(df), "updated": 0, "unchanged": 0, "duplicates_in_batch": 0, "rejected": 0}
+
+    report = get_ingest_log(csv_path).upsert(df, row_hashes, list(columns), added_by=added_by)
+    print(f"Upsert report for {csv_path}: {report}")
+    return report
+
+
+class CustomerStore:
+    """
+    Process-wide, in-memory view of the customer CSV.
+
+    The file is parsed once, CustomerIDs are normalised once and a hash index
+    maps every CustomerID to its row position, so a lookup is a dict hit plus
+    a positional row fetch instead of a full CSV parse and column scan.
+    The file's mtime/size is checked on access and the snapshot is rebuilt
+    when the file changes on disk.
+    """
+
+    def __init__(self, csv_path):
+        self.csv_path = csv_path
+        self._lock = threading.Lock()
+        self._signature = None
+        # (DataFrame, {CustomerID: row position}, {column: ColumnIndex}) swapped
+        # as one reference so readers never observe a frame paired with another
+        # frame's indexes. Column indexes are built lazily on first query.
+        self._snapshot = None
+
+    def _file_signature(self):
+        stat = os.stat(self.csv_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self):
+        df = read_customer_csv(self.csv_path)
+        index = build_customer_index(df["CustomerID"]) if "CustomerID" in df.columns else {}
+        return df, index, {}
+
+    def _current(self):
+        signature = self._file_signature()
+        snapshot = self._snapshot
+        if snapshot is not None and signature == self._signature:
+            return snapshot
+        with self._lock:
+            # Another thread may have reloaded while we waited on the lock.
+            if self._snapshot is not None and signature == self._signature:
+                return self._snapshot
+            snapshot = self._load()
+            self._snapshot = snapshot
+            self._signature = signature
+            print(f"Customer store loaded {len(snapshot[0])} rows from {self.csv_path}")
+            return snapshot
+
+    def exists(self):
+        return os.path.exists(self.csv_path)
+
+    def invalidate(self):
+        """Drop the cached snapshot so the next access re-reads the file."""
+        with self._lock:
+            self._snapshot = None
+            self._signature = None
+
+    def frame(self, columns=None):
+        """
+        Returns the current snapshot DataFrame, optionally restricted to
+        columns. Callers must treat it as read-only; it is shared between
+        requests.
+        """
+        df = self._current()[0]
+        if columns is None:
+            return df
+        return df[[col for col in columns if col in df.columns]]
+
+    def rows(self, start, stop, columns=None):
+        """Returns rows [start, stop) of the snapshot, in file order."""
+        return self.frame(columns).iloc[start:stop]
+
+    def get(self, customer_id, columns=None):
+        """
+        Returns the row for customer_id as a pandas Series, or None when the
+        ID is unknown. Pass columns to fetch only those fields.
+        """
+        df, index, _ = self._current()
+        pos = index.get(normalize_customer_id(customer_id))
+        if pos is None:
+            return None
+        if columns is None:
+            return df.iloc[pos]
+        return df.iloc[pos][[col for col in columns if col in df.columns]]
+
+    def append(self, df, added_by=None, mode=UPSERT):
+        """
+        Queues the rows in df on the ingestion log; they reach the CSV (and
+        this store's next snapshot) when the log is compacted. Returns the
+        inserted / updated / unchanged report for the batch.
+        """
+        if not self.exists():
+            return queue_customer_rows(self.csv_path, None, [], df, added_by, APPEND)
+        columns = self._current()[0].columns
+        return queue_customer_rows(self.csv_path, self._row_hashes, columns, df, added_by, mode)
+
+    def _row_hashes(self):
+        # {CustomerID: content hash} of the current snapshot, cached with it.
+        book, _, cache = self._current()
+        hashes = cache.get(ROW_HASHES_KEY)
+        if hashes is None:
+            hashes = cache[ROW_HASHES_KEY] = book_hashes(book, list(book.columns))
+        return hashes
+
+    def features(self, customer_ids=None):
+        """
+        Returns the encoded CRS / RAS FeatureMatrix of the current snapshot,
+        loaded from the .features.npz file written at ingest (or rebuilt if
+        that file is stale). customer_ids is accepted for parity with the
+        ORM store; the matrix always covers the whole book.
+        """
+        df, _, cache = self._current()
+        return self._features(df, cache)
+
+    def _features(self, df, cache):
+        matrix = cache.get(FEATURES_KEY)
+        if matrix is None:
+            with self._lock:
+                current = self._snapshot is not None and self._snapshot[0] is df
+                signature = self._signature if current else None
+            matrix = book_features(self.csv_path, df, signature) if signature else FeatureMatrix.from_frame(df)
+            cache[FEATURES_KEY] = matrix
+        return matrix
+
+    def snapshot(self, columns=None):
+        """(frame, FeatureMatrix) of one and the same snapshot; see frame and features."""
+        df, _, cache = self._current()
+        matrix = self._features(df, cache)
+        if columns is not None:
+            df = df[[col for col in columns if col in df.columns]]
+        return df, matrix
+
+    def query(self, filters, sort=(), limit=DEFAULT_QUERY_LIMIT, columns=None):
+        """Runs a filtered query; see customer_query.query_frame."""
+        df, _, column_indexes = self._current()
+
+        def index_for(column):
+            if column not in INDEXED_COLUMNS or column not in df.columns:
+                return None
+            if column not in column_indexes:
+                column_indexes[column] = ColumnIndex(df[column])
+            return column_indexes[column]
+
+        return query_frame(df, filters, sort, limit, columns, index_for=index_for)
+
+    def __contains__(self, customer_id):
+        return normalize_customer_id(customer_id) in self._current()[1]
+
+    def __len__(self):
+        return len(self.frame())
+
+
+# -------------------- ORM Backend --------------------
+
+def customer_objects_from_frame(df):
+    """
+    Converts an uploaded/CSV DataFrame into unsaved Customer instances:
+    aliases are resolved, unknown columns dropped, numeric columns coerced
+    and NaN turned into NULL. Rows without a CustomerID are skipped and for
+    repeated IDs the last row wins.
+    """
+    df = df.rename(columns=lambda c: str(c).replace('\ufeff', '').strip())
+    df = df.rename(columns=COLUMN_ALIASES)
+    if "CustomerID" not in df.columns:
+        return []
+    df = df.loc[:, ~df.columns.duplicated()]
+    df = df[[col for col in CUSTOMER_FIELDS if col in df.columns]].copy()
+    df = df[df["CustomerID"].notna()]
+    df["CustomerID"] = df["CustomerID"].map(normalize_customer_id)
+    df = df[df["CustomerID"] != ""]
+    df = df.drop_duplicates(subset="CustomerID", keep="last")
+    for col in df.columns:
+        if col in CUSTOMER_NUMERIC_FIELDS:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+        elif col != "CustomerID":
+            df[col] = df[col].map(lambda v: None if pd.isna(v) else str(v))
+    df = df.astype(object).where(df.notna(), None)
+    return [Customer(**record) for record in df.to_dict(orient="records")]
+
+
+def save_customer_objects(objs, batch_size=1000):
+    """
+    Writes Customer instances in batched INSERT ... ON CONFLICT statements
+    inside one transaction; an existing CustomerID has its row replaced.
+    """
+    update_fields = [f for f in CUSTOMER_FIELDS if f != "CustomerID"] + ["updated_at"]
+    with transaction.atomic():
+        Customer.objects.bulk_create(
+            objs,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["CustomerID"],
+            update_fields=update_fields,
+        )
+    return len(objs)
+
+
+ORM_LOOKUPS = {">": "__gt", ">=": "__gte", "<": "__lt", "<=": "__lte"}
+
+
+class OrmCustomerStore:
+    """
+    Customer store backed by the ml_models.Customer table. Point lookups go
+    through the unique CustomerID index; writes are transactional.
+    """
+
+    def exists(self):
+        return True
+
+    def invalidate(self):
+        pass
+
+    def _fields(self, columns):
+        if columns is None:
+            return CUSTOMER_FIELDS
+        return [col for col in columns if col in CUSTOMER_FIELDS]
+
+    def frame(self, columns=None):
+        fields = self._fields(columns)
+        records = Customer.objects.order_by("id").values(*fields).iterator(chunk_size=2000)
+        return pd.DataFrame.from_records(records, columns=fields)
+
+    def rows(self, start, stop, columns=None):
+        fields = self._fields(columns)
+        records = Customer.objects.order_by("id").values(*fields)[start:stop]
+        return pd.DataFrame.from_records(list(records), columns=fields)
+
+    def get(self, customer_id, columns=None):
+        record = (Customer.objects
+                  .filter(CustomerID=normalize_customer_id(customer_id))
+                  .values(*self._fields(columns))
+                  .first())
+        if record is None:
+            return None
+        return pd.Series({k: (np.nan if v is None else v) for k, v in record.items()})
+
+    def append(self, df, added_by=None, mode=UPSERT):
+        """
+        Upserts the rows by CustomerID. In upsert mode rows whose content
+        hash matches the stored row are skipped; append mode writes every row.
+        """
+        objs = customer_objects_from_frame(df)
+        incoming = pd.DataFrame([{f: getattr(o, f) for f in CUSTOMER_FIELDS} for o in objs],
+                                columns=CUSTOMER_FIELDS)
+        ids = clean_upload_columns(df).get("CustomerID", pd.Series(dtype=object)).dropna()
+        ids = ids.map(normalize_customer_id)
+        existing = pd.DataFrame.from_records(
+            list(Customer.objects.filter(CustomerID__in=list(incoming["CustomerID"])).values(*CUSTOMER_FIELDS)),
+            columns=CUSTOMER_FIELDS,
+        )
+        report, changed = classify_rows(book_hashes(existing, CUSTOMER_FIELDS), incoming, CUSTOMER_FIELDS)
+        report["duplicates_in_batch"] = int((ids != "").sum() - len(objs))
+        report["rejected"] = int(len(df) - (ids != "").sum())
+        if mode == APPEND:
+            report["updated"] += report["unchanged"]
+            report["unchanged"] = 0
+        else:
+            changed_ids = set(changed["CustomerID"])
+            objs = [o for o in objs if o.CustomerID in changed_ids]
+        save_customer_objects(objs)
+        return report
+
+    def features(self, customer_ids=None):
+        """Encodes a FeatureMatrix for customer_ids (the whole table when None)."""
+        qs = Customer.objects.order_by("id")
+        if customer_ids is not None:
+            qs = qs.filter(CustomerID__in=[normalize_customer_id(cid) for cid in customer_ids])
+        df = pd.DataFrame.from_records(list(qs.values(*CUSTOMER_FIELDS)), columns=CUSTOMER_FIELDS)
+        return FeatureMatrix.from_frame(df)
+
+    def query(self, filters, sort=(), limit=DEFAULT_QUERY_LIMIT, columns=None):
+        """Translates the query into ORM lookups so the database indexes do the work."""
+        unknown = [f["field"] for f in filters if f["field"] not in CUSTOMER_FIELDS]
+        unknown += [s["field"] for s in sort if s["field"] not in CUSTOMER_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(dict.fromkeys(unknown))}")
+        qs = Customer.objects.all()
+        for f in filters:
+            field, op, value = f["field"], f["op"], f["value"]
+            if op in ("==", "in", "!="):
+                values = equality_values(field in CUSTOMER_NUMERIC_FIELDS, value)
+                lookup = {f"{field}__in": values}
+                qs = qs.exclude(**lookup) if op == "!=" else qs.filter(**lookup)
+            elif op == "between":
+                qs = qs.filter(**{f"{field}__range": value})
+            else:
+                qs = qs.filter(**{f"{field}{ORM_LOOKUPS[op]}": value})
+        count = qs.count()
+        if sort:
+            qs = qs.order_by(*[("-" if s.get("desc") else "") + s["field"] for s in sort])
+        else:
+            qs = qs.order_by("id")
+        fields = self._fields(columns)
+        return count, pd.DataFrame.from_records(list(qs.values(*fields)[:limit]), columns=fields)
+
+    def __contains__(self, customer_id):
+        return Customer.objects.filter(CustomerID=normalize_customer_id(customer_id)).exists()
+
+    def __len__(self):
+        return Customer.objects.count()
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_customer_store(csv_path=None):
+    """
+    Returns the shared store for csv_path, creating it on first use.
+    With no path (or the main book path) the backend is picked by
+    settings.CUSTOMER_STORE_BACKEND.
+    """
+    path = os.path.abspath(csv_path or CUSTOMER_CSV_PATH)
+    backend = "csv"
+    if path == os.path.abspath(CUSTOMER_CSV_PATH):
+        backend = getattr(settings, "CUSTOMER_STORE_BACKEND", "csv")
+    key = (backend, path)
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            if key not in _stores:
+                _stores[key] = _make_store(backend, path)
+            store = _stores[key]
+    return store
+
+
+def _make_store(backend, path):
+    if backend == "orm":
+        return OrmCustomerStore()
+    if backend == "columnar":
+        from .columnar_store import ColumnarCustomerStore
+        return ColumnarCustomerStore(path)
+    return CustomerStore(path)
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+
+
+# -------------------- Customer Upsert / Dedup --------------------
+# Rows are compared through a content hash of their canonical text form, so a
+# value that arrives as 750 (JSON), "750" (CSV text) or 750.0 (pandas float)
+# hashes the same and a re-uploaded, unchanged row is reported as unchanged.
+
+UPSERT = "upsert"
+APPEND = "append"
+INGEST_MODES = (UPSERT, APPEND)
+
+# Bookkeeping columns that should not make a row count as "updated".
+HASH_EXCLUDED_COLUMNS = ("AddedBy",)
+
+
+def canonical_strings(df):
+    """
+    Returns df with every cell as canonical text: nulls become "", numbers
+    are formatted one way (integral values without a trailing .0) and
+    everything else is stripped str().
+    """
+    out = {}
+    for col in df.columns:
+        series = df[col]
+        text = series.astype(object).where(series.notna(), "").astype(str).str.strip()
+        num = pd.to_numeric(text.where(text != ""), errors="coerce")
+        is_num = num.notna()
+        if is_num.any():
+            values = num[is_num].astype(float)
+            formatted = values.astype(str)
+            integral = (values == np.floor(values)) & (values.abs() < 2 ** 53)
+            formatted[integral] = values[integral].astype("int64").astype(str)
+            text = text.copy()
+            text[is_num] = formatted
+        out[col] = text
+    result = pd.DataFrame(out, index=df.index)
+    if "CustomerID" in result.columns:
+        result["CustomerID"] = result["CustomerID"].str.replace('\ufeff', '')
+    return result
+
+
+def row_hashes(canonical, columns=None):
+    """uint64 content hash per row of an already-canonical frame."""
+    columns = [c for c in (columns or canonical.columns) if c not in HASH_EXCLUDED_COLUMNS]
+    return pd.util.hash_pandas_object(canonical[columns], index=False).to_numpy()
+
+
+def classify_rows(existing_hashes, incoming, columns):
+    """
+    Compares an incoming batch against {CustomerID: hash} of the current book.
+
+    Returns (report, changed) where report counts inserted / updated /
+    unchanged / duplicates_in_batch / rejected (rows without a CustomerID,
+    which are not written) and changed is the canonical frame of rows that
+    actually need writing (last occurrence wins within the batch).
+    """
+    canonical = canonical_strings(incoming.reindex(columns=columns))
+    rejected = int((canonical["CustomerID"] == "").sum())
+    canonical = canonical[canonical["CustomerID"] != ""]
+    deduped = canonical.drop_duplicates(subset="CustomerID", keep="last")
+    hashes = row_hashes(deduped, columns)
+
+    known = np.array([existing_hashes.get(cid) for cid in deduped["CustomerID"]], dtype=object)
+    is_new = np.array([h is None for h in known], dtype=bool)
+    is_same = ~is_new & (known == hashes)
+    report = {
+        "inserted": int(is_new.sum()),
+        "updated": int((~is_new & ~is_same).sum()),
+        "unchanged": int(is_same.sum()),
+        "duplicates_in_batch": int(len(canonical) - len(deduped)),
+        "rejected": rejected,
+    }
+    return report, deduped[~is_same]
+
+
+def book_hashes(book, columns):
+    """{CustomerID: content hash} for the first occurrence of each ID in book."""
+    canonical = canonical_strings(book.reindex(columns=columns))
+    first = ~canonical["CustomerID"].duplicated(keep="first")
+    return dict(zip(canonical["CustomerID"][first], row_hashes(canonical[first], columns)))
+
+
+def pending_hashes(book, batches, columns, pending=None):
+    """
+    {CustomerID: hash} the queued batches put over book (the book's own
+    {CustomerID: hash}): upsert rows replace an ID's hash, appended rows only
+    add IDs not seen yet (the first occurrence of an ID is the one lookups
+    see). Adds to and returns pending, so batches can be folded in as they
+    are logged; the book once they are applied is ChainMap(pending, book).
+    """
+    pending = {} if pending is None else pending
+    for batch in batches:
+        rows = pd.DataFrame.from_records(batch["rows"])
+        if "CustomerID" not in rows.columns:
+            continue
+        canonical = canonical_strings(rows.reindex(columns=columns))
+        canonical = canonical[canonical["CustomerID"] != ""]
+        batch_hashes = zip(canonical["CustomerID"], row_hashes(canonical, columns))
+        if batch.get("mode", APPEND) == UPSERT:
+            pending.update(batch_hashes)
+        else:
+            for cid, value in batch_hashes:
+                if cid not in pending and cid not in book:
+                    pending[cid] = value
+    return pending
+
+
+def upsert_strings(book, incoming):
+    """
+    Applies incoming rows (canonical strings) to book (the CSV read as text,
+    same columns). The first row of an ID in incoming is replaced in place and
+    its later duplicates in the book are dropped, new IDs are appended and
+    every other row is kept exactly as read.
+    """
+    incoming = incoming.drop_duplicates(subset="CustomerID", keep="last")
+    ids = book["CustomerID"].str.replace('\ufeff', '').str.strip()
+    touched = ids.isin(incoming["CustomerID"]).to_numpy()
+    first = touched & ~ids.duplicated(keep="first").to_numpy()
+    keep = ~touched | first
+
+    result = book.copy()
+    replacements = incoming.set_index("CustomerID", drop=False).loc[ids[first].to_numpy()]
+    result.loc[first, :] = replacements[book.columns].to_numpy()
+    new_rows = incoming[~incoming["CustomerID"].isin(ids)]
+    return pd.concat([result[keep], new_rows[book.columns]], ignore_index=True)
@@ -1,5 +1,21 @@
 import numpy as np
 
+
+def round_like_python(values, ndigits):
+    """
+    Elementwise round(value, ndigits) for arrays. np.round rounds x * 10**n
+    half to even, which can differ from Python's round on values that print
+    as a tie (e.g. 7.985); those few are rounded by round() itself.
+    """
+    values = np.asarray(values, dtype=float)
+    out = np.round(values, ndigits)
+    scaled = values * 10.0 ** ndigits
+    near_tie = np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < 1e-6
+    if near_tie.any():
+        out[near_tie] = [round(float(v), ndigits) for v in values[near_tie]]
+    return out
+
+
 def min_max_normalize(value, min_val, max_val):
     value = float(value)
     min_val = float(min_val)
@@ -64,3 +80,33 @@ def calculate_fd_bps(CRS, deposit_amount, tenure, base_rate,
     return bps, bonus_bps, final_fd_rate
 
 
+def calculate_fd_bps_array(CRS, deposit_amount, tenure, base_rate,
+                           deposit_amount_range=(0, 100000000), tenure_range=(0, 10)):
+    """
+    Vectorised calculate_fd_bps. CRS, deposit_amount and tenure are arrays
+    that broadcast against each other (e.g. shaped (customers, 1, 1),
+    (1, amounts, 1) and (1, 1, tenures) for a full offer grid).
+
+    Returns:
+        bps, bonus_bps, final_fd_rate arrays of the broadcast shape.
+    """
+    def normalize(values, bounds):
+        lo, hi = float(bounds[0]), float(bounds[1])
+        values = np.asarray(values, dtype=float)
+        if hi - lo == 0:
+            return np.full_like(values, 0.5)
+        return (values - lo) / (hi - lo)
+
+    CRS_norm = np.asarray(CRS, dtype=float) / 100.0
+    DS_norm = (normalize(deposit_amount, deposit_amount_range) + normalize(tenure, tenure_range)) / 2.0
+
+    # Same weights and bounds as calculate_fd_bps.
+    w1, w2, w3 = 0.5, 0.3, 0.2
+    market_factor = 0.3
+    min_bps, max_bps = 10, 100
+
+    weighted_score = w1 * CRS_norm + w2 * DS_norm + w3 * (1 - market_factor)
+    bonus_bps = round_like_python(np.clip(min_bps + (max_bps - min_bps) * weighted_score, min_bps, max_bps), 2)
+    bps = bonus_bps / 100
+    final_fd_rate = round_like_python(base_rate + bonus_bps / 100.0, 2)
+    return bps, bonus_bps, final_fd_rate
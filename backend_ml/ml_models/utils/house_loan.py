@@ -1,50 +1,64 @@
 import os
 import joblib
 import pickle
+import numpy as np
 import pandas as pd
 from django.conf import settings
 from sklearn.preprocessing import StandardScaler, LabelEncoder, PowerTransformer
+from .model_features import CRS_FEATURES, CRS_SPEC
+from .model_registry import get_models
+from .fixed_deposit import round_like_python
+from .prediction_cache import prediction_cache
+from .inference_batcher import MicroBatcher
+from .inference_pool import get_inference_pool
 
 
 # -------------------- Original ML Model Setup --------------------
-MODEL_DIR = os.path.join(settings.BASE_DIR, 'ml_models', 'model_weights')
-classification_model = joblib.load(os.path.join(MODEL_DIR, "rf_model.joblib"))
-classification_scaler = joblib.load(os.path.join(MODEL_DIR, "scaler.joblib"))
-
-with open(os.path.join(MODEL_DIR, "reg_final_model.pkl"), "rb") as f:
-    regression_model = pickle.load(f)
+# The CRS / RAS models (and the fitted RAS preprocessing) come from the model
+# registry: pass the bundle a request captured with get_models() so a whole
+# request is scored by one model version; without one the active version is used.
+# With settings.INFERENCE_POOL_WORKERS the matrix functions below score in the
+# inference worker processes (see inference_pool).
+
+# Largest CRS matrix scored with the flattened forest (see crs_forest).
+FLAT_FOREST_MAX_ROWS = 256
     
  
  
    
-def classification_model_prediction(input_data):
-    print("Loading classification model and scaler using joblib...")
-    
-    # Prepare input from CSV data; assuming input_data has all the required keys.
-    classification_input = {
-        'CreditScore': input_data['CreditScore'],
-        'Geography': input_data['Geography'],
-        'Gender': input_data['Gender'],
-        'Age': input_data['Age'],
-        'Tenure': input_data['Tenure'],
-        # Balance is the sum (we already computed this prior to call)
-        'Balance': input_data['Balance'],
-        'NumOfProducts': input_data['NumOfProducts'],
-        'HasCrCard': input_data['HasCrCard'],
-        'IsActiveMember': input_data['IsActiveMember'],
-        # EstimatedSalary is taken from AnnualIncome in our database.
-        'EstimatedSalary': input_data['EstimatedSalary']
-    }
-    
-    single_row_class = pd.DataFrame([classification_input])
-    print("Classification input keys:", classification_input.keys())
-    single_row_class_scaled = classification_scaler.transform(single_row_class)
-    class_prediction_proba = classification_model.predict_proba(single_row_class_scaled)
-    CRS = class_prediction_proba[0][0]  # probability of staying (strong relationship)
+def classification_model_prediction(input_data, models=None):
+    """
+    CRS for one customer. input_data is an encoded CRS row (see
+    model_features.CRS_SPEC) or a {feature: value} mapping of one.
+    """
+    models = models or get_models()
+    vector = CRS_SPEC.vector(input_data)
+    # Repeat quotes for an unchanged customer and model skip inference.
+    key = prediction_cache.key("crs", models, vector)
+    CRS = prediction_cache.get(key)
+    if CRS is None:
+        CRS = prediction_cache.put(key, float(crs_batcher.predict(models, vector)))
     print("Customer Strength (CRS) from model:", CRS)
     return CRS
 
 
+def classification_matrix_prediction(X, models=None):
+    """
+    CRS for every row of an encoded matrix in CRS_FEATURES order (see
+    model_features), e.g. rows gathered from a book's feature matrix.
+    """
+    models = models or get_models()
+    pool = get_inference_pool()
+    if pool is not None:
+        return pool.predict("crs", models.version, X)
+    scaled = models.classification_scaler.transform(pd.DataFrame(X, columns=CRS_FEATURES))
+    # The flattened forest gives the same probabilities without sklearn's per-call
+    # overhead; past a few thousand rows sklearn's compiled tree walk is faster.
+    if len(scaled) <= FLAT_FOREST_MAX_ROWS:
+        return models.crs_forest.predict_proba(scaled)[:, 0]
+    return models.classification_model.predict_proba(scaled)[:, 0]  # probability of staying (strong relationship)
+
+
 # def preprocess_input_for_regression(data):
 #     df = pd.DataFrame([data])
 
@@ -142,137 +156,88 @@ def classification_model_prediction(input_data):
 
 
 
-def preprocess_input_for_regression(data):
+def preprocess_input_for_regression(data, models=None):
+    """
+    Encodes and scales one RAS input (a dict of CSV fields, raw or already
+    encoded, or an encoded RAS_FEATURES row) with the fitted preprocessing
+    artifact; returns a 1-row matrix.
+    """
+    if not isinstance(data, dict):
+        return preprocess_matrix_for_regression(np.array(data, dtype=float, ndmin=2), models)
     df = pd.DataFrame([data])
 
     # Normalize column names: remove spaces and strip
     df.columns = df.columns.str.strip().str.replace(" ", "")
 
-    # Yes/No fields (from health_mapping)
-    yes_no_columns = ['BankruptcyHistory', 'PreviousLoanDefaults', 'HasCrCard', 'IsActiveMember']
-    yes_no_mapping = {"Yes": 1, "No": 0}
-
-    for col in yes_no_columns:
-        if col in df.columns:
-            df[col] = df[col].replace(yes_no_mapping)
-            try:
-                df[col] = df[col].astype('int')
-            except Exception as e:
-                print(f"Error converting {col} to int: {e}")
-                df[col] = df[col].fillna(0)
-
-    # EmploymentStatus Mapping (from health_mapping)
-    employment_mapping = {
-        "Full-Time Employed": 0,
-        "Government Employee": 0,
-        "Self-Employed": 1,
-        "Part-Time/Freelance": 2,
-        "Unemployed": 3
-    }
-    for col in ['EmploymentStatus', 'Employmentstatus']:  # just in case
-        if col in df.columns:
-            df[col] = df[col].map(employment_mapping).fillna(-1)
-
-    # EducationLevel Mapping (from health_mapping)
-    education_mapping = {
-        "Doctorate/Master's": 3,
-        "Bachelor's Degree": 2,
-        "Diploma/High School": 1,
-        "Below High School": 0
-    }
-    if 'EducationLevel' in df.columns:
-        df['EducationLevel'] = df['EducationLevel'].map(education_mapping).fillna(-1)
-
-    # PaymentHistory Mapping (from health_mapping)
-    payment_history_mapping = {
-        "High": 2,
-        "Middle": 1,
-        "Low": 0
-    }
-    if 'PaymentHistory' in df.columns:
-        if df['PaymentHistory'].dtype == object:
-            df['PaymentHistory'] = df['PaymentHistory'].map(payment_history_mapping).fillna(-1)
-
-    # MaritalStatus Mapping (from health_mapping)
-    marital_status_mapping = {
-        "Married": 2,
-        "Single": 1,
-        "Divorced/Separated": 0
-    }
-    if 'MaritalStatus' in df.columns:
-        df['MaritalStatus'] = df['MaritalStatus'].map(marital_status_mapping).fillna(-1)
-
-    # HomeOwnershipStatus Mapping (from health_mapping)
-    home_ownership_mapping = {
-        "Own Home": 2,
-        "Mortgage": 1,
-        "Renting": 0
-    }
-    if 'HomeOwnershipStatus' in df.columns:
-        df['HomeOwnershipStatus'] = df['HomeOwnershipStatus'].map(home_ownership_mapping).fillna(-1)
-
-    # LoanPurpose Mapping (from health_mapping)
-    loan_purpose_mapping = {
-        "Home Purchase": 5,
-        "Education Loan": 4,
-        "Car Loan": 3,
-        "Medical Loan": 2,
-        "Personal Loan": 1,
-        "Vacation/Leisure Loan": 0
-    }
-    if 'LoanPurpose' in df.columns:
-        df['LoanPurpose'] = df['LoanPurpose'].map(loan_purpose_mapping).fillna(-1)
-
-    # Select numeric columns (excluding object types)
-    num_cols = df.select_dtypes(exclude='object').columns.tolist()
-
-    # Remove unwanted columns if present
-    for col in ['RiskScore', 'LoanApproved', 'ApplicationDate']:
-        if col in num_cols:
-            num_cols.remove(col)
-
-    # Standard scaling
-    scaler = StandardScaler()
-    for col in num_cols:
-        df[col] = scaler.fit_transform(df[[col]])
-
-    # Power transformation (only for positive & variable columns)
-    transform_cols = [
-        col for col in num_cols
-        if df[col].nunique() > 1 and not (df[col] <= 0).any()
-        and col not in ['Age', 'Experience', 'PaymentHistory', 'LengthOfCreditHistory',
-                        'JobTenure', 'BaseInterestRate', 'InterestRate',
-                        'LoanApproved', 'ApplicationDate']
-    ]
-
-    pt = PowerTransformer(method='yeo-johnson')
-    for col in transform_cols:
-        try:
-            df[col] = pt.fit_transform(df[[col]])
-        except Exception as e:
-            print(f"Skipping transformation for '{col}' due to error: {e}")
-            df[col] = np.log1p(df[col].clip(lower=0))
-
-    # Final cleanup
-    df = df.drop(columns=['RiskScore', 'LoanApproved', 'ApplicationDate'], errors='ignore')
-    print("Columns after regression preprocessing:", df.columns)
-
-    return df.values
-
-
-def risk_assessment_prediction(input_data):
-    processed_data = preprocess_input_for_regression(input_data)
-    prediction = regression_model.predict(processed_data)[0]
+    return (models or get_models()).ras_preprocessor.transform_frame(df)
+
+
+def risk_assessment_prediction(input_data, models=None):
+    models = models or get_models()
+    processed_data = preprocess_input_for_regression(input_data, models)
+    key = prediction_cache.key("ras", models, processed_data)
+    prediction = prediction_cache.get(key)
+    if prediction is None:
+        prediction = prediction_cache.put(key, float(ras_batcher.predict(models, processed_data[0])))
     return prediction
 
 
-def regression_model_prediction(input_data):
+def regression_model_prediction(input_data, models=None):
     regression_input = input_data  # modify as needed if remapping is required
-    predicted_risk_raw = risk_assessment_prediction(regression_input)
+    predicted_risk_raw = risk_assessment_prediction(regression_input, models)
     RAS = predicted_risk_raw / 100.0  # Normalize the risk score if needed
     print(f"Predicted Risk Assessment Score (normalized): {RAS:.4f}")
     return RAS
 
+def preprocess_matrix_for_regression(X, models=None):
+    """Batch counterpart of preprocess_input_for_regression for an encoded RAS_FEATURES matrix."""
+    return (models or get_models()).ras_preprocessor.transform(X)
+
+
+def predict_ras_raw(processed, models):
+    """Raw regression output for preprocessed rows, via the booster's in-place predict when available."""
+    pool = get_inference_pool()
+    if pool is not None:
+        return pool.predict("ras_raw", models.version, processed)
+    booster = models.ras_booster
+    if booster is None:
+        return models.regression_model.predict(processed)
+    return booster.predict(processed)
+
+
+# Concurrent single quotes are scored together (see inference_batcher).
+crs_batcher = MicroBatcher("crs", lambda models, X: classification_matrix_prediction(X, models))
+ras_batcher = MicroBatcher("ras", lambda models, X: predict_ras_raw(X, models))
+
+
+def regression_matrix_prediction(X, models=None):
+    """Normalised RAS for every row of an encoded matrix in RAS_FEATURES order."""
+    models = models or get_models()
+    pool = get_inference_pool()
+    if pool is not None:
+        # Preprocessing and prediction both run in the worker.
+        return pool.predict("ras", models.version, X)
+    raw = predict_ras_raw(preprocess_matrix_for_regression(X, models), models)
+    # float64 before normalising, as a single quote does through float()
+    return np.asarray(raw, dtype=np.float64) / 100.0
+
+
+def calculate_house_loan_bps_array(CRS_values, RAS_normalized, base_rate):
+    """Vectorised calculate_house_loan_bps: returns (bps, bps_deduction, final_rate) arrays."""
+    MT = 0.30  # Fixed market trend value
+    w1 = 0.5   # Weight for CRS
+    w2 = 0.4   # Weight for risk (using 1 - RAS)
+    w3 = 0.1   # Weight for market trends (using 1 - MT)
+
+    bps = 10 + 90 * (w1 * np.asarray(CRS_values, dtype=float)
+                     + w2 * (1 - np.asarray(RAS_normalized, dtype=float))
+                     + w3 * (1 - MT))
+    bps = np.clip(round_like_python(bps, 2), 10, 100)
+    bps_deduction = bps / 100.0
+    final_rate = round_like_python(np.asarray(base_rate, dtype=float) - bps_deduction, 2)
+    return bps, bps_deduction, final_rate
+
+
 def calculate_house_loan_bps(CRS_value, RAS_normalized,base_rate):
     MT = 0.30  # Fixed market trend value
     w1 = 0.5   # Weight for CRS
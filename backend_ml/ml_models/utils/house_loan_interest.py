@@ -1,4 +1,6 @@
+import numpy as np
 import pandas as pd
+from .customer_store import get_customer_store
 feature_bps = {
     "PreviousLoanDefaults": 13.837,
     "Age": 9.548,
@@ -252,10 +254,9 @@ health_mapping = {
 }
 
 # --- Functions for Calculation ---
-def get_health_percent(feature_name, value):
-    if feature_name not in health_mapping:
-        return 100
-    for lower, upper, health in health_mapping[feature_name]:
+def band_health(bands, value):
+    """Health % of value: the first band it falls in (numeric [lower, upper) or an exact label), else 0."""
+    for lower, upper, health in bands:
         if isinstance(lower, (int, float)):
             if lower <= value < upper:
                 return health
@@ -264,6 +265,11 @@ def get_health_percent(feature_name, value):
                 return health
     return 0
 
+def get_health_percent(feature_name, value):
+    if feature_name not in health_mapping:
+        return 100
+    return band_health(health_mapping[feature_name], value)
+
 def calculate_final_bps(customer_data):
     total_bps = 0
     detailed = {}
@@ -277,6 +283,114 @@ def calculate_final_bps(customer_data):
         health[feat]=h
     return total_bps, detailed,health
 
+
+# --- Compiled rule engine (whole frames of customers) ---
+# Each feature's band list is compiled once. Numeric bands become sorted bin
+# edges plus a lookup array: every bound is an edge, so band membership is
+# constant between two edges and the health of each bin is taken from
+# band_health at the bin's lower edge. Label bands become a {label: health}
+# dict. Scoring a frame is then a searchsorted / map per feature and array
+# math, with the same results as calculate_final_bps row by row.
+
+# Missing or empty values count as 0, as in process_customer_house_loan. A
+# value that is not a number (e.g. 'No' in a numeric column) matches no numeric
+# band and scores 0 health, where band_health would raise TypeError.
+
+class NumericBands:
+    def __init__(self, bands):
+        self.edges = np.array(sorted({float(b) for lower, upper, _ in bands for b in (lower, upper)}))
+        # Bin 0 is below the first edge, bin i >= 1 is [edges[i-1], edges[i]).
+        first = self.edges[0]
+        below = np.nan if np.isneginf(first) else np.nextafter(first, -np.inf)
+        self.lut = np.array([band_health(bands, v) for v in [below, *self.edges]], dtype=float)
+
+    def health(self, column):
+        values = pd.to_numeric(column, errors="coerce").to_numpy(dtype=float)
+        unmatched = np.isnan(values) & column.notna().to_numpy()
+        values = np.where(np.isnan(values), 0.0, values)
+        health = self.lut[np.searchsorted(self.edges, values, side="right")]
+        health[unmatched] = 0
+        return health
+
+
+class LabelBands:
+    def __init__(self, bands):
+        self.codes = {}
+        for label, _, health in bands:
+            self.codes.setdefault(label, health)
+
+    def health(self, column):
+        # One dict lookup per distinct value; missing values (code -1) and 0 match no label.
+        codes, uniques = pd.factorize(column)
+        lut = np.array([self.codes.get(value, 0) for value in uniques] + [0], dtype=float)
+        return lut[codes]
+
+
+class RowBands:
+    """Band lists that mix numeric and label bands: scored value by value."""
+
+    def __init__(self, bands):
+        self.bands = bands
+
+    def health(self, column):
+        column = column.astype(object).where(column.notna(), 0)
+        return np.array([self._health(v) for v in column], dtype=float)
+
+    def _health(self, value):
+        try:
+            return band_health(self.bands, value)
+        except TypeError:
+            # Not a number: only the label bands can match.
+            return band_health([band for band in self.bands if isinstance(band[0], str)], value)
+
+
+class ConstantHealth:
+    """Features without a band list are fully healthy."""
+
+    def __init__(self, health=100):
+        self.health_value = float(health)
+
+    def health(self, column):
+        return np.full(len(column), self.health_value)
+
+
+def compile_bands(bands):
+    if bands is None:
+        return ConstantHealth()
+    numeric = [isinstance(lower, (int, float)) for lower, _, _ in bands]
+    if bands and all(numeric):
+        return NumericBands(bands)
+    if not any(numeric):
+        return LabelBands(bands)
+    return RowBands(bands)
+
+
+class RuleEngine:
+    """A rule set (feature -> BPS weight) compiled against a health mapping."""
+
+    def __init__(self, weights, mapping=None):
+        mapping = health_mapping if mapping is None else mapping
+        self.features = list(weights)
+        self.weights = np.array([weights[feat] for feat in self.features], dtype=float)
+        self.bands = [compile_bands(mapping.get(feat)) for feat in self.features]
+
+    def score(self, df):
+        """
+        Scores every row of df. Returns (total, bps, health): the total per
+        row plus feature x row matrices of earned BPS and health %, features
+        in rule-set order.
+        """
+        health = np.empty((len(self.features), len(df)))
+        for j, (feat, bands) in enumerate(zip(self.features, self.bands)):
+            column = df[feat] if feat in df.columns else pd.Series(0, index=df.index)
+            health[j] = bands.health(column)
+        bps = self.weights[:, None] * health / 100
+        total = np.zeros(len(df))
+        for earned in bps:  # summed in feature order, as calculate_final_bps does
+            total += earned
+        return total, bps, health
+
+
 def calculate_final_bps_fd(customer_data):
     total_bps = 0
     detailed = {}
@@ -292,19 +406,21 @@ def calculate_final_bps_fd(customer_data):
 
 
 
-def process_customer_house_loan(csv_path, customer_id, base_rate=10.0):
-    import pandas as pd
-
-    df = pd.read_csv(csv_path)
-    row = df[df['CustomerID'] == (str(customer_id))]
-    if row.empty:
+def _process_customer(csv_path, customer_id, rule_set, rules):
+    # rules: the rule_sets.RuleSet pricing this quote (the active one by default).
+    if rules is None:
+        from .rule_sets import get_rule_set
+        rules = get_rule_set()
+    weights = rules.weights[rule_set]
+    store = get_customer_store(csv_path)
+    row = store.get(customer_id, columns=list(weights))
+    if row is None:
         print(f"CustomerID {customer_id} not found.")
         return
-    row = row.iloc[0]
     
     # Build only the features we care about
     cust_data = {}
-    for feat in feature_bps:
+    for feat in weights:
         if feat in row:
             if not pd.isna(row[feat]):  # <-- correct check
                 cust_data[feat] = row[feat]
@@ -315,15 +431,19 @@ def process_customer_house_loan(csv_path, customer_id, base_rate=10.0):
             cust_data[feat] = 0
             print(f"Warning: '{feat}' missing—using 0.")
     
-    # Calculate BPS
-    total_bps, bps_details,health = calculate_final_bps(cust_data)
-    final_rate = base_rate - total_bps / 100
+    # Calculate BPS: read from the materialized score table when the store has one
+    from .score_table import customer_rule_scores
+    scores = customer_rule_scores(store, customer_id, rule_set, rules=rules)
+    if scores is None:
+        total, bps, health = rules.score(rule_set, pd.DataFrame([cust_data]))
+        scores = total[0], bps[:, 0], health[:, 0]
+    total_bps, bps_row, health_row = scores
+    bps_details = dict(zip(weights, bps_row.tolist()))
+    health = dict(zip(weights, health_row.tolist()))
+    return cust_data, float(total_bps), bps_details, health
 
-    print(f"\nTotal BPS Earned: {total_bps:.2f}")
-    print(f"Final Interest Rate: {final_rate:.2f}%\n")
-    print("Feature-wise Contribution:")
 
-    # Prepare enriched details
+def _enriched_details(cust_data, bps_details, health):
     enriched_details = []
     for f, bps in bps_details.items():
         enriched_details.append({
@@ -332,41 +452,33 @@ def process_customer_house_loan(csv_path, customer_id, base_rate=10.0):
             "bps": float(bps),
             "health": float(health[f])
         })
-    
-    print(f"\nSum of Contributions: {sum(bps_details.values()):.2f} bps")
-    
-    return enriched_details, total_bps
-
+    return enriched_details
 
 
+def process_customer_house_loan(csv_path, customer_id, base_rate=10.0, rules=None):
+    scored = _process_customer(csv_path, customer_id, "house_loan", rules)
+    if scored is None:
+        return
+    cust_data, total_bps, bps_details, health = scored
+    final_rate = base_rate - total_bps / 100
 
+    print(f"\nTotal BPS Earned: {total_bps:.2f}")
+    print(f"Final Interest Rate: {final_rate:.2f}%\n")
+    print("Feature-wise Contribution:")
 
+    # Prepare enriched details
+    enriched_details = _enriched_details(cust_data, bps_details, health)
+    
+    print(f"\nSum of Contributions: {sum(bps_details.values()):.2f} bps")
+    
+    return enriched_details, total_bps
 
-def process_customer_fixed_deposit(csv_path, customer_id, base_rate=10.0):
-    import pandas as pd
 
-    df = pd.read_csv(csv_path)
-    row = df[df['CustomerID'] == (str(customer_id))]
-    if row.empty:
-        print(f"CustomerID {customer_id} not found.")
+def process_customer_fixed_deposit(csv_path, customer_id, base_rate=10.0, rules=None):
+    scored = _process_customer(csv_path, customer_id, "fixed_deposit", rules)
+    if scored is None:
         return
-    row = row.iloc[0]
-    
-    # Build only the features we care about
-    cust_data = {}
-    for feat in feature_bps_fd:
-        if feat in row:
-            if not pd.isna(row[feat]):  # <-- correct check
-                cust_data[feat] = row[feat]
-            else:
-                cust_data[feat] = 0
-                print(f"Warning: '{feat}' is empty—using 0.")
-        else:
-            cust_data[feat] = 0
-            print(f"Warning: '{feat}' missing—using 0.")
-    
-    # Calculate BPS
-    total_bps, bps_details,health = calculate_final_bps_fd(cust_data)
+    cust_data, total_bps, bps_details, health = scored
     final_rate = base_rate - total_bps / 100
 
     print(f"\nTotal BPS Earned: {total_bps:.2f}")
@@ -374,14 +486,7 @@ def process_customer_fixed_deposit(csv_path, customer_id, base_rate=10.0):
     print("Feature-wise Contribution:")
 
     # Prepare enriched details
-    enriched_details = []
-    for f, bps in bps_details.items():
-        enriched_details.append({
-            "parameter": f,
-            "value": int(cust_data.get(f, 0)) if isinstance(cust_data.get(f, 0), (int, float)) else str(cust_data.get(f, 0)),
-            "bps": float(bps),
-            "health": float(health[f])
-        })
+    enriched_details = _enriched_details(cust_data, bps_details, health)
     
     print(f"\nSum of Contributions: {sum(bps_details.values()):.2f} bps")
     
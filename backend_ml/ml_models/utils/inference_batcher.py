@@ -0,0 +1,145 @@
+import time
+import threading
+import numpy as np
+from django.conf import settings
+
+
+# -------------------- Inference Micro-Batching --------------------
+# Concurrent single-row predictions are coalesced into one model call. There
+# is no background thread: the first caller to arrive becomes the leader,
+# collects whatever other callers queue up for at most the batching window (or
+# until the batch is full), scores them in one call and hands the results
+# back. If more rows queued up meanwhile, leadership passes to the oldest of
+# them. The leader only waits when other callers are in flight, so a request
+# on an idle server is scored straight away.
+
+INFERENCE_BATCHING = getattr(settings, "INFERENCE_BATCHING", True)
+INFERENCE_BATCH_WINDOW_MS = getattr(settings, "INFERENCE_BATCH_WINDOW_MS", 2.0)
+INFERENCE_MAX_BATCH = getattr(settings, "INFERENCE_MAX_BATCH", 64)
+
+
+class _Request:
+    __slots__ = ("models", "row", "result", "error", "finished", "lead", "done")
+
+    def __init__(self, models, row):
+        self.models = models
+        self.row = row
+        self.result = None
+        self.error = None
+        self.finished = False
+        self.lead = False
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent predict(models, row) calls into batch_fn(models, X)
+    calls, X being the stacked rows of callers that use the same model bundle.
+    """
+
+    def __init__(self, name, batch_fn, window_ms=INFERENCE_BATCH_WINDOW_MS,
+                 max_batch=INFERENCE_MAX_BATCH, enabled=INFERENCE_BATCHING):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.window = max(float(window_ms), 0.0) / 1000.0
+        self.max_batch = max(int(max_batch), 1)
+        self.enabled = enabled
+        self._cond = threading.Condition()
+        self._pending = []
+        self._running = False
+        self._callers = 0
+        # metrics
+        self.batches = 0
+        self.rows = 0
+        self.max_seen = 0
+        self.size_histogram = {}
+
+    def predict(self, models, row):
+        """Model output for one row, scored together with any concurrent rows."""
+        if not self.enabled:
+            return self.batch_fn(models, np.asarray(row, dtype=float)[np.newaxis, :])[0]
+
+        req = _Request(models, np.asarray(row, dtype=float).ravel())
+        with self._cond:
+            self._callers += 1
+            self._pending.append(req)
+            if not self._running:
+                self._running = True
+                req.lead = True
+            elif len(self._pending) >= self.max_batch:
+                self._cond.notify()
+        try:
+            while True:
+                if req.lead:
+                    req.lead = False
+                    self._lead()
+                req.done.wait()
+                if req.finished:
+                    break
+                req.done.clear()  # promoted to leader; our row is in the next batch
+        finally:
+            with self._cond:
+                self._callers -= 1
+
+        if req.error is not None:
+            raise req.error
+        return req.result
+
+    def _lead(self):
+        with self._cond:
+            if self.window and self._callers > 1:
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+
+        self._score(batch)
+
+        with self._cond:
+            if self._pending:
+                successor = self._pending[0]
+                successor.lead = True
+                successor.done.set()
+            else:
+                self._running = False
+
+    def _score(self, batch):
+        # One call per model bundle (normally there is only one, the active version).
+        groups = {}
+        for req in batch:
+            groups.setdefault(id(req.models), []).append(req)
+        for reqs in groups.values():
+            try:
+                results = self.batch_fn(reqs[0].models, np.vstack([req.row for req in reqs]))
+                for req, result in zip(reqs, results):
+                    req.result = result
+            except Exception as e:
+                for req in reqs:
+                    req.error = e
+        with self._cond:
+            self.batches += 1
+            self.rows += len(batch)
+            self.max_seen = max(self.max_seen, len(batch))
+            bucket = 1 << (len(batch) - 1).bit_length()  # 1, 2, 4, 8, ...
+            self.size_histogram[bucket] = self.size_histogram.get(bucket, 0) + 1
+        for req in batch:
+            req.finished = True
+            req.done.set()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "enabled": self.enabled,
+                "window_ms": self.window * 1000,
+                "max_batch": self.max_batch,
+                "batches": self.batches,
+                "rows": self.rows,
+                "mean_batch_size": round(self.rows / self.batches, 2) if self.batches else None,
+                "max_batch_size": self.max_seen,
+                # batch count by size, bucketed up to the next power of two
+                "batch_size_histogram": {f"<={k}": v for k, v in sorted(self.size_histogram.items())},
+            }
@@ -0,0 +1,136 @@
+import os
+import atexit
+import threading
+import multiprocessing
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from django.conf import settings
+
+
+# -------------------- Process-Pool Inference --------------------
+# Optional executor that moves model scoring out of the request threads into
+# a pool of worker processes, so one Django process can score on every core
+# instead of serialising on the GIL. Workers are spawned with Django set up
+# and the active model version loaded before the first request. A feature
+# matrix is never pickled: the request thread writes it into a shared-memory
+# segment, the worker scores it in place and writes the predictions back into
+# the same segment, and only the segment's name and shape cross the pipe.
+# Enabled with settings.INFERENCE_POOL_WORKERS > 0.
+
+INFERENCE_POOL_WORKERS = getattr(settings, "INFERENCE_POOL_WORKERS", 0)
+
+_pool = None
+_pool_lock = threading.Lock()
+_disabled = False
+
+
+# ---- worker side ----
+def _init_worker(settings_module, version):
+    import django
+    from django.apps import apps
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    if not apps.ready:
+        django.setup()
+    disable_inference_pool()  # a worker scores locally
+    from .model_registry import get_models
+    get_models(version)
+
+
+def _ping():
+    return os.getpid()
+
+
+def _attach(name):
+    # The parent owns (and unlinks) the segment; keep this process's resource
+    # tracker from claiming it too.
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args, **kwargs: None
+    try:
+        return SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def _score(kind, version, name, rows, cols):
+    from .model_registry import get_models
+    from .house_loan import (
+        classification_matrix_prediction, regression_matrix_prediction, predict_ras_raw,
+    )
+    scorers = {
+        "crs": classification_matrix_prediction,
+        "ras": regression_matrix_prediction,
+        "ras_raw": predict_ras_raw,
+    }
+    shm = _attach(name)
+    try:
+        X = np.ndarray((rows, cols), dtype=np.float64, buffer=shm.buf)
+        out = np.ndarray((rows,), dtype=np.float64, buffer=shm.buf, offset=X.nbytes)
+        out[:] = scorers[kind](X, get_models(version))
+        del X, out  # release the exported buffer before closing
+    finally:
+        shm.close()
+
+
+# ---- request side ----
+class InferencePool:
+    """Pre-warmed scoring processes fed through shared-memory matrices."""
+
+    def __init__(self, workers, version=None):
+        self.workers = int(workers)
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(os.environ.get("DJANGO_SETTINGS_MODULE", "backend_ml.settings"), version),
+        )
+
+    def warm(self):
+        """Blocks until the workers are up (and have loaded the models)."""
+        for future in [self.executor.submit(_ping) for _ in range(self.workers)]:
+            future.result()
+        print(f"Inference pool ready: {self.workers} worker(s)")
+        return self
+
+    def predict(self, kind, version, X):
+        """Scores the rows of X ("crs", "ras" or "ras_raw") in a worker; returns a float array."""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+        rows, cols = X.shape
+        if rows == 0:
+            return np.empty(0)
+        shm = SharedMemory(create=True, size=X.nbytes + rows * 8)
+        try:
+            np.ndarray(X.shape, dtype=np.float64, buffer=shm.buf)[:] = X
+            self.executor.submit(_score, kind, version, shm.name, rows, cols).result()
+            return np.ndarray((rows,), dtype=np.float64, buffer=shm.buf, offset=X.nbytes).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+def get_inference_pool():
+    """The process's inference pool, started on first use; None when disabled."""
+    global _pool
+    if _disabled or INFERENCE_POOL_WORKERS <= 0:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                from .model_registry import get_models
+                pool = InferencePool(INFERENCE_POOL_WORKERS, get_models().version)
+                _pool = pool.warm()
+                atexit.register(pool.shutdown)
+    return _pool
+
+
+def disable_inference_pool():
+    """Scores in-process from now on (worker processes, forked children)."""
+    global _pool, _disabled
+    _disabled = True
+    _pool = None
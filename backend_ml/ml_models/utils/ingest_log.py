@@ -0,0 +1,408 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import threading
+from collections import ChainMap
+import pandas as pd
+from django.conf import settings
+from .customer_upsert import UPSERT, APPEND, canonical_strings, classify_rows, pending_hashes, upsert_strings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+# -------------------- Ingestion Write-Ahead Log --------------------
+# Uploads never touch the customer CSV directly. Each upload is appended as one
+# JSON line to a per-book log under an exclusive file lock (held only for the
+# append + fsync, and for an upsert's comparison against the book), and a compactor folds pending batches into the CSV: it copies
+# the CSV, appends the batches aligned to the CSV header, and atomically
+# renames the copy over the original. Readers therefore only ever see a
+# complete CSV, and parallel uploads never interleave half-written rows.
+# Upsert batches replace rows by CustomerID, so when one is pending the book is
+# rewritten (still via a temp file + rename) instead of appended to; only the
+# replaced and new rows change, every other row keeps its text.
+# Before the rename, the compactor records which batches the new CSV holds (and
+# the new CSV's mtime/size) next to the log. If it dies between the rename and
+# removing the log, the next compaction sees that the CSV on disk is the one
+# recorded and skips those batches instead of appending them a second time.
+# The lock is released as soon as the log is gone; re-encoding the feature
+# matrix and rescoring the score table of the new book run after it, on a
+# background thread, so uploads never wait behind them.
+# Work done under the lock stays proportional to the upload. The pending row
+# count is kept in <stem>.wal.state, together with a generation that every
+# compaction renews. Each process keeps the hashes of the pending upserts for
+# the current generation and only parses the log lines added since it last
+# looked.
+
+INGEST_COMPACT_ROWS = getattr(settings, "INGEST_COMPACT_ROWS", 1000)
+INGEST_COMPACT_SECONDS = getattr(settings, "INGEST_COMPACT_SECONDS", 2.0)
+
+
+class FileLock:
+    """Exclusive inter-process lock on a sidecar file (flock / msvcrt)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._fh = None
+
+    def acquire(self, blocking=True):
+        if not self._thread_lock.acquire(blocking):
+            return False
+        fh = open(self.path, "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            else:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+        except OSError:
+            fh.close()
+            self._thread_lock.release()
+            return False
+        self._fh = fh
+        return True
+
+    def release(self):
+        fh, self._fh = self._fh, None
+        try:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+            else:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            fh.close()
+            self._thread_lock.release()
+
+    def __enter__(self):
+        if not self.acquire():
+            raise OSError(f"Could not lock {self.path}")
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def _csv_header(csv_path):
+    if not os.path.exists(csv_path) or os.path.getsize(csv_path) == 0:
+        return None
+    header = pd.read_csv(csv_path, nrows=0).columns
+    return list(header.astype(str).str.replace('\ufeff', '').str.strip())
+
+
+def _fsync_file(path):
+    with open(path, "rb") as f:
+        os.fsync(f.fileno())
+
+
+def _ends_with_newline(path):
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() == 0:
+            return True
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+class IngestLog:
+    """Write-ahead ingestion log for one customer CSV."""
+
+    def __init__(self, csv_path):
+        self.csv_path = csv_path
+        log_dir = os.path.join(os.path.dirname(csv_path), "ingest")
+        os.makedirs(log_dir, exist_ok=True)
+        stem = os.path.splitext(os.path.basename(csv_path))[0]
+        self.log_path = os.path.join(log_dir, f"{stem}.wal.ndjson")
+        self.applied_path = os.path.join(log_dir, f"{stem}.wal.applied")
+        self.state_path = os.path.join(log_dir, f"{stem}.wal.state")
+        self._lock = FileLock(os.path.join(log_dir, f"{stem}.lock"))
+        self._timer = None
+        self._timer_lock = threading.Lock()
+        self._refresh_thread = None
+        self._refresh_again = False
+        self._hash_cache = None
+
+    # ---- writes ----
+    def append(self, df, added_by=None, mode=UPSERT):
+        """
+        Durably queues the rows of df as one batch and returns its batch id.
+        mode is "upsert" (replace rows by CustomerID) or "append".
+        Compaction is scheduled in the background (or run now once enough
+        rows are pending).
+        """
+        with self._lock:
+            batch_id, pending = self._write(df, added_by, mode)
+        self._after_write(pending)
+        return batch_id
+
+    def upsert(self, df, book_hashes, columns, added_by=None):
+        """
+        Queues the rows of df that are new or changed and returns the
+        inserted / updated / unchanged report. Rows are compared against
+        book_hashes() ({CustomerID: hash} of the CSV as it is on disk) with
+        the batches still pending in the log applied on top. Both are read
+        with the log locked, so a compaction cannot slip in between.
+        """
+        with self._lock:
+            existing = self._pending_hashes(book_hashes(), columns)
+            report, changed = classify_rows(existing, df, columns)
+            if not len(changed):
+                return report
+            _, pending = self._write(changed, added_by, UPSERT)
+        self._after_write(pending)
+        return report
+
+    def _write(self, df, added_by, mode):
+        # Call with the lock held. Returns (batch id, rows now pending).
+        generation, pending = self._read_state()
+        batch = {
+            "batch_id": uuid.uuid4().hex,
+            "ts": time.time(),
+            "added_by": added_by,
+            "mode": mode,
+            "rows": json.loads(df.to_json(orient="records")),
+        }
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(batch) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        pending += len(df)
+        self._write_state(generation, pending)
+        print(f"Queued batch {batch['batch_id']} ({len(df)} rows) in ingest log.")
+        return batch["batch_id"], pending
+
+    def _after_write(self, pending):
+        if pending >= INGEST_COMPACT_ROWS:
+            self.compact()
+        else:
+            self._schedule_compaction()
+
+    def _schedule_compaction(self):
+        with self._timer_lock:
+            if self._timer is not None and self._timer.is_alive():
+                return
+            self._timer = threading.Timer(INGEST_COMPACT_SECONDS, self._background_compact)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _background_compact(self):
+        try:
+            self.compact()
+        except Exception as e:
+            print("Ingest log compaction failed:", e)
+
+    # ---- reads ----
+    def pending_batches(self):
+        """Reads queued batches; call with the lock held for an exact view."""
+        if not os.path.exists(self.log_path):
+            return []
+        with open(self.log_path, "r", encoding="utf-8") as f:
+            batches = [json.loads(line) for line in f if line.strip()]
+        applied = self._applied_ids()
+        return [b for b in batches if b["batch_id"] not in applied] if applied else batches
+
+    def _applied_ids(self):
+        """Ids of logged batches already in the CSV (a compaction died before removing the log)."""
+        try:
+            with open(self.applied_path, "r", encoding="utf-8") as f:
+                applied = json.load(f)
+            stat = os.stat(self.csv_path)
+        except (OSError, ValueError):
+            return set()
+        if applied.get("signature") != [stat.st_mtime_ns, stat.st_size]:
+            return set()
+        return set(applied.get("batch_ids", ()))
+
+    def pending_rows(self):
+        return self._read_state()[1]
+
+    def _read_state(self):
+        """(generation, pending row count) of the log."""
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            return state["generation"], int(state["rows"])
+        except (OSError, ValueError, KeyError, TypeError):
+            # No state yet (or a torn write): count the log once, in a new generation.
+            return uuid.uuid4().hex, sum(len(b["rows"]) for b in self.pending_batches())
+
+    def _write_state(self, generation, rows):
+        # Call with the lock held.
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"generation": generation, "rows": rows}, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _pending_hashes(self, book, columns):
+        """
+        {CustomerID: hash} of the book (book: its own {CustomerID: hash}) with
+        the pending batches applied. Call with the lock held; only log lines
+        this process has not read yet in the current generation are parsed.
+        """
+        generation = self._read_state()[0]
+        cache = self._hash_cache
+        if cache is None or (cache["generation"], cache["columns"]) != (generation, columns) or cache["book"] is not book:
+            cache = self._hash_cache = {"generation": generation, "columns": columns, "book": book,
+                                        "offset": 0, "hashes": {}}
+        batches, cache["offset"] = self._read_batches(cache["offset"])
+        applied = self._applied_ids()
+        pending_hashes(book, [b for b in batches if b["batch_id"] not in applied], columns, cache["hashes"])
+        return ChainMap(cache["hashes"], book)
+
+    def _read_batches(self, offset):
+        """(batches logged after byte offset, offset of the end of the last complete line)."""
+        if not os.path.exists(self.log_path):
+            return [], offset
+        with open(self.log_path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        lines = data[:end].decode("utf-8").splitlines()
+        return [json.loads(line) for line in lines if line.strip()], offset + end
+
+    # ---- compaction ----
+    def compact(self, blocking=True, wait=False):
+        """
+        Folds every pending batch into the CSV and truncates the log. Returns
+        the number of rows written (0 if nothing was pending or, with
+        blocking=False, another worker holds the lock). The feature matrix
+        and score table of the new book are refreshed after the lock is
+        released, in the background unless wait is set.
+        """
+        if not self._lock.acquire(blocking):
+            return 0
+        try:
+            written = self._fold_batches()
+        finally:
+            self._lock.release()
+        if written:
+            if wait:
+                self._refresh_features()
+            else:
+                self._schedule_refresh()
+        return written
+
+    def _fold_batches(self):
+        # Call with the lock held.
+        batches = self.pending_batches()
+        rows = [row for batch in batches for row in batch["rows"]]
+        if not rows:
+            self._remove_log()
+            return 0
+
+        df = pd.DataFrame.from_records(rows)
+        header = _csv_header(self.csv_path)
+        if header is not None:
+            dropped = [col for col in df.columns if col not in header]
+            if dropped:
+                print("Ingest compaction dropping columns not in CSV header:", dropped)
+            # Align to the existing header so appended values land under the right column.
+            df = df.reindex(columns=header)
+
+        tmp_path = self.csv_path + ".compact.tmp"
+        if header is not None and any(b.get("mode", APPEND) == UPSERT for b in batches):
+            # Upserts replace rows in place, so the book is rewritten. It is
+            # read as text and rows no batch touches are written back as read.
+            book = pd.read_csv(self.csv_path, dtype=str, keep_default_na=False)
+            book.columns = header
+            for batch in batches:
+                incoming = canonical_strings(pd.DataFrame.from_records(batch["rows"]).reindex(columns=header))
+                if batch.get("mode", APPEND) == UPSERT:
+                    book = upsert_strings(book, incoming)
+                else:
+                    book = pd.concat([book, incoming], ignore_index=True)
+            book.to_csv(tmp_path, index=False)
+            df = book
+        elif header is not None:
+            shutil.copyfile(self.csv_path, tmp_path)
+            if not _ends_with_newline(tmp_path):
+                with open(tmp_path, "a", encoding="utf-8") as f:
+                    f.write("\n")
+            df.to_csv(tmp_path, mode="a", header=False, index=False)
+        else:
+            df.to_csv(tmp_path, index=False)
+        self._record_applied(batches, tmp_path)
+        os.replace(tmp_path, self.csv_path)
+
+        self._remove_log()
+        print(f"Compacted {len(batches)} ingest batch(es), {len(rows)} rows, into {self.csv_path}")
+        return len(rows)
+
+    def _record_applied(self, batches, tmp_path):
+        # Call with the lock held, before tmp_path replaces the CSV.
+        _fsync_file(tmp_path)
+        stat = os.stat(tmp_path)
+        applied = {"batch_ids": [b["batch_id"] for b in batches], "signature": [stat.st_mtime_ns, stat.st_size]}
+        marker_tmp = self.applied_path + ".tmp"
+        with open(marker_tmp, "w", encoding="utf-8") as f:
+            json.dump(applied, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(marker_tmp, self.applied_path)
+
+    def _remove_log(self):
+        # Call with the lock held, once every logged batch is in the CSV.
+        removed = False
+        for path in (self.log_path, self.applied_path):
+            if os.path.exists(path):
+                os.remove(path)
+                removed = True
+        if removed or not os.path.exists(self.state_path):
+            self._write_state(uuid.uuid4().hex, 0)
+
+    def _schedule_refresh(self):
+        # One refresh thread per log; compactions that land while it runs
+        # make it go round once more.
+        with self._timer_lock:
+            self._refresh_again = True
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(target=self._background_refresh, daemon=True)
+            self._refresh_thread.start()
+
+    def _background_refresh(self):
+        while True:
+            with self._timer_lock:
+                if not self._refresh_again:
+                    return
+                self._refresh_again = False
+            self._refresh_features()
+
+    def _refresh_features(self):
+        # Encode the model feature columns while the new book is fresh; readers
+        # rebuild them lazily if this fails.
+        from .customer_store import refresh_book_features, get_customer_store
+        try:
+            refresh_book_features(self.csv_path)
+        except Exception as e:
+            print("Feature matrix refresh failed:", e)
+        # Regenerate the Arrow copy served by the columnar backend, if one is kept.
+        from .columnar_store import refresh_columnar
+        try:
+            refresh_columnar(self.csv_path)
+        except Exception as e:
+            print("Columnar copy refresh failed:", e)
+        # Rescore the changed rows of a materialized score table of this book.
+        try:
+            from .score_table import score_tables
+            score_tables.refresh(get_customer_store(self.csv_path))
+        except Exception as e:
+            print("Score table refresh failed:", e)
+
+
+_logs = {}
+_logs_lock = threading.Lock()
+
+
+def get_ingest_log(csv_path):
+    path = os.path.abspath(csv_path)
+    with _logs_lock:
+        if path not in _logs:
+            _logs[path] = IngestLog(path)
+        return _logs[path]
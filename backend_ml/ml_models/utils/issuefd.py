@@ -1,29 +1,25 @@
 import pandas as pd
 import numpy as np
-import joblib
 from sklearn.preprocessing import LabelEncoder
+from .model_registry import get_models
 
-# ── LOCAL PATH CONFIGURATION ───────────────────────────────────────────────
-TRAIN_CSV_RF   = r"C:\Users\Vishnu\Documents\Gitprojects\Jatayu\backend_ml\ml_models\model_weights\csv\train.csv"
-MODEL_PATH_RF  = r"C:\Users\Vishnu\Documents\Gitprojects\Jatayu\backend_ml\ml_models\model_weights\rf_model.joblib"
-SCALER_PATH_RF = r"C:\Users\Vishnu\Documents\Gitprojects\Jatayu\backend_ml\ml_models\model_weights\scaler.joblib"
+# ── MODEL CONFIGURATION ─────────────────────────────────────────────────────
+# The RF model, scaler and train.csv come from the model registry (model_weights/<version>).
 FEATURES_RF    = [
     'CreditScore','Geography','Gender','Age','Tenure',
     'Balance','NumOfProducts','HasCrCard','IsActiveMember',
     'EstimatedSalary'
 ]
 
-# ── LOAD MODEL & PREPROCESSOR ───────────────────────────────────────────────────
-rf_model   = joblib.load(MODEL_PATH_RF)
-rf_scaler  = joblib.load(SCALER_PATH_RF)  # Use this if you need to scale your inputs
-
 # ── FIT ENCODERS + COMPUTE MIN/MAX FOR RF FEATURES ──────────────────────────────
-rf_df = pd.read_csv(TRAIN_CSV_RF)
-le_geo = LabelEncoder().fit(rf_df['Geography'])
-le_gen = LabelEncoder().fit(rf_df['Gender'])
-rf_df['Geography'] = le_geo.transform(rf_df['Geography'])
-rf_df['Gender']    = le_gen.transform(rf_df['Gender'])
-feature_min_max_rf = {f: (rf_df[f].min(), rf_df[f].max()) for f in FEATURES_RF}
+def _fit_rf_allocator(models):
+    rf_df = pd.read_csv(models.train_csv('train.csv'))
+    le_geo = LabelEncoder().fit(rf_df['Geography'])
+    le_gen = LabelEncoder().fit(rf_df['Gender'])
+    rf_df['Geography'] = le_geo.transform(rf_df['Geography'])
+    rf_df['Gender']    = le_gen.transform(rf_df['Gender'])
+    feature_min_max_rf = {f: (rf_df[f].min(), rf_df[f].max()) for f in FEATURES_RF}
+    return le_geo, le_gen, feature_min_max_rf
 
 # ── BPS ALLOCATION FOR RF ────────────────────────────────────────────────────────
 def compute_scaled_bps(avg_rank, min_bps=10, max_bps=100):
@@ -32,15 +28,18 @@ def compute_scaled_bps(avg_rank, min_bps=10, max_bps=100):
     """
     return np.clip(avg_rank, 1, 100) / 100.0 * (max_bps - min_bps) + min_bps
 
-def allocate_bps_rf(input_data, ndigits=2):
+def allocate_bps_rf(input_data, ndigits=2, models=None):
     """
     Given a dict of input_data, returns a DataFrame with columns:
      - feature
      - importance (from the RF model)
      - bps (final bps factor for each feature)
     """
+    models = models or get_models()
+    le_geo, le_gen, feature_min_max_rf = models.derived('issuefd', _fit_rf_allocator)
+
     # Get feature importances and calculate the relative importance share.
-    imp = rf_model.feature_importances_
+    imp = models.classification_model.feature_importances_
     imp_share = imp / imp.sum()
 
     # Prepare a one‑row DataFrame and encode categorical variables.
@@ -78,12 +77,12 @@ def allocate_bps_rf(input_data, ndigits=2):
     })
 
 # ── HELPER FUNCTION TO RETURN FACTOR‑WISE BPS DICT + TOTAL ───────────────────────
-def get_factor_bps(input_data):
+def get_factor_bps(input_data, models=None):
     """
     Returns a dictionary mapping each RF feature to its BPS,
     plus 'total_bps' = sum of all feature BPS (multiplied by 2 as an example scaling).
     """
-    df_rf = allocate_bps_rf(input_data)
+    df_rf = allocate_bps_rf(input_data, models=models)
     bps_dict = {row.feature: float(row.bps) for row in df_rf.itertuples()}
     bps_dict['total_bps'] = float(df_rf['bps'].sum()) * 2
     return bps_dict
@@ -1,21 +1,16 @@
 import pandas as pd
 import numpy as np
-import joblib
-import pickle
 from sklearn.preprocessing import LabelEncoder
+from .model_registry import get_models
 
-# ── LOCAL PATH CONFIGURATION ───────────────────────────────────────────────
-TRAIN_CSV_RF   = r"C:\Users\Vishnu\Documents\Gitprojects\Jatayu\backend_ml\ml_models\model_weights\csv\train.csv"
-MODEL_PATH_RF  = r"C:\Users\Vishnu\Documents\Gitprojects\Jatayu\backend_ml\ml_models\model_weights\rf_model.joblib"
-SCALER_PATH_RF = r"C:\Users\Vishnu\Documents\Gitprojects\Jatayu\backend_ml\ml_models\model_weights\scaler.joblib"
+# ── MODEL CONFIGURATION ─────────────────────────────────────────────────────
+# Models and training CSVs come from the model registry (model_weights/<version>).
 FEATURES_RF    = [
     'CreditScore', 'Geography', 'Gender', 'Age', 'Tenure',
     'Balance', 'NumOfProducts', 'HasCrCard', 'IsActiveMember',
     'EstimatedSalary'
 ]
 
-TRAIN_CSV_XGB  = r"C:\Users\Vishnu\Documents\Gitprojects\Jatayu\backend_ml\ml_models\model_weights\csv\Loan.csv"
-MODEL_PATH_XGB = r"C:\Users\Vishnu\Documents\Gitprojects\Jatayu\backend_ml\ml_models\model_weights\reg_final_model.pkl"
 XGB_CAT        = ['MaritalStatus', 'HomeOwnershipStatus', 'LoanPurpose']
 EMP_MAP        = {"Unemployed": 0, "Self-Employed": 1, "Employed": 2}
 EDU_MAP        = {
@@ -24,106 +19,249 @@ EDU_MAP        = {
 }
 
 # ── LOAD MODELS & PREPROCESSORS ─────────────────────────────────────────────
-rf_model  = joblib.load(MODEL_PATH_RF)
-rf_scaler = joblib.load(SCALER_PATH_RF)
-xgb_model = pickle.load(open(MODEL_PATH_XGB, "rb"))
-
-# Preprocess the RF training data: fit label encoders and compute min/max values
-rf_df = pd.read_csv(TRAIN_CSV_RF)
-le_geo = LabelEncoder().fit(rf_df['Geography'])
-le_gen = LabelEncoder().fit(rf_df['Gender'])
-rf_df['Geography'] = le_geo.transform(rf_df['Geography'])
-rf_df['Gender']    = le_gen.transform(rf_df['Gender'])
-feature_min_max_rf = {f: (rf_df[f].min(), rf_df[f].max()) for f in FEATURES_RF}
-
-# Preprocess the XGB training data: map, encode and compute min/max for numeric features
-xgb_df = pd.read_csv(TRAIN_CSV_XGB)
-xgb_df['EmploymentStatus'] = xgb_df['EmploymentStatus'].map(EMP_MAP)
-xgb_df['EducationLevel']   = xgb_df['EducationLevel'].map(EDU_MAP)
-xgb_encoders = {}
-for c in XGB_CAT:
-    le = LabelEncoder().fit(xgb_df[c])
-    xgb_df[c] = le.transform(xgb_df[c])
-    xgb_encoders[c] = le
-feature_min_max_xgb = {
-    f: (xgb_df[f].min(), xgb_df[f].max())
-    for f in xgb_df.select_dtypes(include=np.number).columns
-}
+def _fit_allocators(models):
+    """Label encoders and min/max ranges for one model version, fitted on its training CSVs."""
+    # Preprocess the RF training data: fit label encoders and compute min/max values
+    rf_df = pd.read_csv(models.train_csv('train.csv'))
+    le_geo = LabelEncoder().fit(rf_df['Geography'])
+    le_gen = LabelEncoder().fit(rf_df['Gender'])
+    rf_df['Geography'] = le_geo.transform(rf_df['Geography'])
+    rf_df['Gender']    = le_gen.transform(rf_df['Gender'])
+    feature_min_max_rf = {f: (rf_df[f].min(), rf_df[f].max()) for f in FEATURES_RF}
+
+    # Preprocess the XGB training data: map, encode and compute min/max for numeric features
+    xgb_df = pd.read_csv(models.train_csv('Loan.csv'))
+    xgb_df['EmploymentStatus'] = xgb_df['EmploymentStatus'].map(EMP_MAP)
+    xgb_df['EducationLevel']   = xgb_df['EducationLevel'].map(EDU_MAP)
+    xgb_encoders = {}
+    for c in XGB_CAT:
+        le = LabelEncoder().fit(xgb_df[c])
+        xgb_df[c] = le.transform(xgb_df[c])
+        xgb_encoders[c] = le
+    feature_min_max_xgb = {
+        f: (xgb_df[f].min(), xgb_df[f].max())
+        for f in xgb_df.select_dtypes(include=np.number).columns
+    }
+    return {
+        'le_geo': le_geo,
+        'le_gen': le_gen,
+        'feature_min_max_rf': feature_min_max_rf,
+        'xgb_encoders': xgb_encoders,
+        'feature_min_max_xgb': feature_min_max_xgb,
+    }
+
 
 # ── ALLOCATION FUNCTIONS ─────────────────────────────────────────────────────
 def compute_scaled_bps(avg_rank, min_bps=10, max_bps=100):
     """Compute total BPS scaled based on the average rank."""
     return np.clip(avg_rank, 1, 100) / 100.0 * (max_bps - min_bps)
 
-def allocate_bps_rf_new(input_data, ndigits=2):
-    """Allocate BPS values using the Random Forest model."""
-    imp = rf_model.feature_importances_
-    imp_share = imp / imp.sum()
-    
-    df = pd.DataFrame([input_data])
-    df['Geography'] = le_geo.transform(df['Geography'])
-    df['Gender']    = le_gen.transform(df['Gender'])
-
-    ranks = []
-    for f in FEATURES_RF:
-        raw = float(df.at[0, f])
-        mn, mx = feature_min_max_rf[f]
-        r = 1.0 if mx <= mn else 1.0 + (np.clip(raw, mn, mx) - mn) / (mx - mn) * 99.0
-        ranks.append(r)
-    
-    avg_rank = np.mean(ranks)
-    total_bps = compute_scaled_bps(avg_rank)
-    init_bps = imp_share * total_bps
-    final   = np.round(init_bps * np.array(ranks) / 100.0, ndigits)
 
-    drift = round(init_bps.sum() * avg_rank / 100.0, ndigits) - final.sum()
-    if abs(drift) >= 10**(-ndigits):
-        final[np.argmax(imp_share)] += drift
+# ── PRECOMPUTED ALLOCATOR ───────────────────────────────────────────────────
+# Everything the allocation needs from a model version (importance shares,
+# min/max rank ranges, label codes) is laid out as arrays once per version.
+# Profiles are then allocated a batch at a time with array operations. Sums
+# and roundings run in the same order as the one-profile allocation used to
+# (pairwise for ndarray sums, left to right for sums over dicts), so the
+# drift correction and every BPS value come out identical.
+
+def _label_codes(encoder):
+    return {label: code for code, label in enumerate(encoder.classes_)}
+
+
+def _ranks(raw, mn, mx):
+    """Rank 1..100 of each raw value within its feature's training [min, max]."""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ranks = 1.0 + (np.clip(raw, mn, mx) - mn) / (mx - mn) * 99.0
+    return np.where(mx <= mn, 1.0, ranks)
+
+
+def _numeric(df, col, invalid, problems):
+    values = pd.to_numeric(df[col], errors='coerce')
+    bad = (values.isna() & df[col].notna()).to_numpy()
+    if bad.any():
+        invalid |= bad
+        problems.append(col)
+    return values.to_numpy(dtype=float)
+
+
+def _mapped(df, col, codes, invalid, problems, default=None):
+    values = df[col].map(codes)
+    if default is not None:
+        return values.fillna(default).to_numpy(dtype=float)
+    bad = values.isna().to_numpy()
+    if bad.any():
+        invalid |= bad
+        problems.append(col)
+    return values.to_numpy(dtype=float)
+
+
+class FactorAllocator:
+    """
+    The RF and XGB factor-BPS allocation of one model version, precomputed.
+    allocate() returns features x customers BPS matrices for a batch of profiles.
+    """
+
+    def __init__(self, models, imp_type='gain'):
+        fitted = models.derived('issuehouseloan', _fit_allocators)
+
+        # RF: importance shares and rank ranges in FEATURES_RF order
+        imp = models.classification_model.feature_importances_
+        self.rf_importance = imp
+        self.rf_share = imp / imp.sum()
+        self.rf_top = int(np.argmax(self.rf_share))
+        min_max_rf = fitted['feature_min_max_rf']
+        self.rf_min = np.array([min_max_rf[f][0] for f in FEATURES_RF], dtype=float)
+        self.rf_max = np.array([min_max_rf[f][1] for f in FEATURES_RF], dtype=float)
+        self.rf_labels = {'Geography': _label_codes(fitted['le_geo']),
+                          'Gender': _label_codes(fitted['le_gen'])}
 
+        # XGB: features in booster order, as get_score returns them
+        scores = models.regression_model.get_booster().get_score(importance_type=imp_type)
+        total_imp = sum(scores.values()) or 1.0
+        share = {f: w / total_imp for f, w in scores.items()}
+        self.xgb_features = list(scores)
+        self.xgb_importance = np.array([scores[f] for f in self.xgb_features], dtype=float)
+        self.xgb_share = np.array([share[f] for f in self.xgb_features])
+        self.xgb_top = self.xgb_features.index(max(share, key=share.get))
+        min_max_xgb = fitted['feature_min_max_xgb']
+        self.xgb_min = np.array([min_max_xgb[f][0] for f in self.xgb_features], dtype=float)
+        self.xgb_max = np.array([min_max_xgb[f][1] for f in self.xgb_features], dtype=float)
+        # The average rank is taken in the training CSV's column order.
+        self.xgb_rank_order = np.array([self.xgb_features.index(f) for f in min_max_xgb if f in scores],
+                                       dtype=np.intp)
+        self.xgb_labels = {c: _label_codes(le) for c, le in fitted['xgb_encoders'].items()}
+
+        # Combined features, in the (sorted) order get_factor_bps returns them
+        self.features = sorted(set(FEATURES_RF) | set(self.xgb_features))
+        self._rf_rows = np.array([self.features.index(f) for f in FEATURES_RF], dtype=np.intp)
+        self._xgb_rows = np.array([self.features.index(f) for f in self.xgb_features], dtype=np.intp)
+
+    # ---- encoding ----
+    def _rf_raw(self, df, invalid, problems):
+        raw = np.full((len(df), len(FEATURES_RF)), np.nan)
+        for j, f in enumerate(FEATURES_RF):
+            if f not in df.columns:
+                invalid[:] = True
+                problems.append(f)
+            elif f in self.rf_labels:
+                raw[:, j] = _mapped(df, f, self.rf_labels[f], invalid, problems)
+            else:
+                raw[:, j] = _numeric(df, f, invalid, problems)
+        return raw
+
+    def _xgb_raw(self, df, invalid, problems):
+        raw = np.zeros((len(df), len(self.xgb_features)))
+        for j, f in enumerate(self.xgb_features):
+            if f in ('EmploymentStatus', 'EducationLevel') or f in XGB_CAT:
+                if f not in df.columns:
+                    invalid[:] = True
+                    problems.append(f)
+                elif f == 'EmploymentStatus':
+                    raw[:, j] = _mapped(df, f, EMP_MAP, invalid, problems)
+                elif f == 'EducationLevel':
+                    raw[:, j] = _mapped(df, f, EDU_MAP, invalid, problems)
+                else:
+                    # unseen labels take the first class
+                    raw[:, j] = _mapped(df, f, self.xgb_labels[f], invalid, problems, default=0)
+            elif f in df.columns:
+                raw[:, j] = _numeric(df, f, invalid, problems)
+        return raw
+
+    # ---- allocation ----
+    def rf(self, df, ndigits=2):
+        """(bps, invalid, problems): RF BPS as customers x FEATURES_RF."""
+        invalid = np.zeros(len(df), dtype=bool)
+        problems = []
+        ranks = _ranks(self._rf_raw(df, invalid, problems), self.rf_min, self.rf_max)
+        avg_rank = ranks.mean(axis=1)
+        init_bps = self.rf_share * compute_scaled_bps(avg_rank)[:, None]
+        final = np.round(init_bps * ranks / 100.0, ndigits)
+        drift = np.round(init_bps.sum(axis=1) * avg_rank / 100.0, ndigits) - final.sum(axis=1)
+        fix = np.abs(drift) >= 10**(-ndigits)
+        final[fix, self.rf_top] += drift[fix]
+        final[invalid] = np.nan
+        return final, invalid, problems
+
+    def xgb(self, df, ndigits=2):
+        """(bps, invalid, problems): XGB BPS as customers x xgb_features."""
+        invalid = np.zeros(len(df), dtype=bool)
+        problems = []
+        ranks = _ranks(self._xgb_raw(df, invalid, problems), self.xgb_min, self.xgb_max)
+        avg_rank = ranks[:, self.xgb_rank_order].mean(axis=1)
+        init_bps = self.xgb_share * compute_scaled_bps(avg_rank)[:, None]
+        final = np.round(init_bps * ranks / 100.0, ndigits)
+        # sum() over dict values: left to right
+        init_sum = np.zeros(len(df))
+        final_sum = np.zeros(len(df))
+        for j in range(len(self.xgb_features)):
+            init_sum = init_sum + init_bps[:, j]
+            final_sum = final_sum + final[:, j]
+        drift = np.round(init_sum * avg_rank / 100.0, ndigits) - final_sum
+        fix = np.abs(drift) >= 10**(-ndigits)
+        final[fix, self.xgb_top] += drift[fix]
+        final[invalid] = np.nan
+        return final, invalid, problems
+
+    def allocate(self, df, ndigits=2):
+        """
+        Combined RF+XGB allocation for every row of df: (total, bps, valid)
+        with bps a len(features) x len(df) matrix. Rows that cannot be
+        allocated (unknown labels, non-numeric values) are NaN and not valid.
+        """
+        total, bps, invalid, _ = self._allocate(df, ndigits)
+        return total, bps.T, ~invalid
+
+    def _allocate(self, df, ndigits=2):
+        rf, rf_invalid, rf_problems = self.rf(df, ndigits)
+        xgb, xgb_invalid, xgb_problems = self.xgb(df, ndigits)
+        # Summed per feature as the groupby merge did: RF first, NaN counted as 0.
+        bps = np.zeros((len(df), len(self.features)))
+        bps[:, self._rf_rows] = np.where(np.isnan(rf), 0.0, rf)
+        bps[:, self._xgb_rows] = bps[:, self._xgb_rows] + np.where(np.isnan(xgb), 0.0, xgb)
+        invalid = rf_invalid | xgb_invalid
+        bps[invalid] = np.nan
+        total = bps.sum(axis=1)
+        return total, bps, invalid, rf_problems + xgb_problems
+
+
+def factor_allocator(models=None, imp_type='gain'):
+    """The FactorAllocator of a model version (the active one by default), built once per version."""
+    models = models or get_models()
+    return models.derived(('factor_allocator', imp_type), lambda m: FactorAllocator(m, imp_type))
+
+
+def _raise_invalid(df, problems):
+    fields = ", ".join(f"{col}={df[col].iloc[0]!r}" if col in df.columns else f"{col} (missing)"
+                       for col in problems)
+    raise ValueError(f"Cannot allocate factor BPS for: {fields}")
+
+
+# ── PER-PROFILE FUNCTIONS ───────────────────────────────────────────────────
+def allocate_bps_rf_new(input_data, ndigits=2, models=None):
+    """Allocate BPS values using the Random Forest model."""
+    allocator = factor_allocator(models)
+    df = pd.DataFrame([input_data])
+    final, invalid, problems = allocator.rf(df, ndigits)
+    if invalid[0]:
+        _raise_invalid(df, problems)
     return pd.DataFrame({
         'feature':    FEATURES_RF,
-        'importance': imp,
-        'bps':        final
+        'importance': allocator.rf_importance,
+        'bps':        final[0]
     })
 
-def allocate_bps_xgb_new(input_data, ndigits=2, imp_type='gain'):
+def allocate_bps_xgb_new(input_data, ndigits=2, imp_type='gain', models=None):
     """Allocate BPS values using the XGB model."""
-    scores = xgb_model.get_booster().get_score(importance_type=imp_type)
-    total_imp = sum(scores.values()) or 1.0
-    imp_share = {f: w / total_imp for f, w in scores.items()}
-
-    raw_vals = {}
-    for f in scores:
-        if f == 'EmploymentStatus':
-            raw_vals[f] = EMP_MAP[input_data[f]]
-        elif f == 'EducationLevel':
-            raw_vals[f] = EDU_MAP[input_data[f]]
-        elif f in XGB_CAT:
-            le = xgb_encoders[f]
-            v  = input_data[f]
-            raw_vals[f] = le.transform([v if v in le.classes_ else le.classes_[0]])[0]
-        else:
-            raw_vals[f] = float(input_data.get(f, 0.0))
-
-    ranks = {}
-    for f, (mn, mx) in feature_min_max_xgb.items():
-        if f in scores:
-            ranks[f] = 1.0 if mx <= mn else 1.0 + (np.clip(raw_vals[f], mn, mx) - mn) / (mx - mn) * 99.0
-
-    avg_rank = np.mean(list(ranks.values()))
-    total_bps = compute_scaled_bps(avg_rank)
-    init_bps = {f: imp_share[f] * total_bps for f in scores}
-    
-    final = {f: round(init_bps[f] * ranks[f] / 100.0, ndigits) for f in scores}
-    drift = round(sum(init_bps.values()) * avg_rank / 100.0, ndigits) - sum(final.values())
-    if abs(drift) >= 10**(-ndigits):
-        top = max(imp_share, key=imp_share.get)
-        final[top] += drift
-
+    allocator = factor_allocator(models, imp_type)
+    df = pd.DataFrame([input_data])
+    final, invalid, problems = allocator.xgb(df, ndigits)
+    if invalid[0]:
+        _raise_invalid(df, problems)
     return pd.DataFrame({
-        'feature':    list(final.keys()),
-        'importance': [scores[f] for f in final],
-        'bps':        [final[f] for f in final]
+        'feature':    allocator.xgb_features,
+        'importance': allocator.xgb_importance,
+        'bps':        final[0]
     })
 
 def merge_bps(df1, df2):
@@ -132,17 +270,19 @@ def merge_bps(df1, df2):
     m = c.groupby('feature', as_index=False)['bps'].sum()
     return m
 
-def get_factor_bps(input_data):
+def get_factor_bps(input_data, models=None):
     """
     Returns a dictionary mapping each feature to its combined (RF+XGB) BPS,
     plus a key 'total_bps' for the total across features.
     """
-    rf_df  = allocate_bps_rf_new(input_data)
-    xgb_df = allocate_bps_xgb_new(input_data)
-    merged = merge_bps(rf_df, xgb_df)
-    
-    bps_dict = {row.feature: row.bps for row in merged.itertuples()}
-    bps_dict['total_bps'] = float(merged['bps'].sum())
+    allocator = factor_allocator(models)
+    df = pd.DataFrame([input_data])
+    total, bps, invalid, problems = allocator._allocate(df)
+    if invalid[0]:
+        _raise_invalid(df, problems)
+
+    bps_dict = dict(zip(allocator.features, bps[0].tolist()))
+    bps_dict['total_bps'] = float(total[0])
     return bps_dict
 
 # ── SAMPLE EXECUTION ─────────────────────────────────────────────────────────
@@ -0,0 +1,451 @@
+import os
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+
+# -------------------- Model-Ready Feature Columns --------------------
+# The CRS (random forest) and RAS (XGBoost) inputs are encoded once per book
+# version instead of once per pricing request. The encoded matrices are written
+# next to the CSV as <stem>.features.npz, stamped with the CSV's mtime/size the
+# same way the Arrow file is, and scoring is a row gather out of them.
+
+TRAIN_CSV_RF = os.path.join(settings.BASE_DIR, 'ml_models', 'model_weights', 'csv', 'train.csv')
+
+# Classes the RF label encoders saw in train.csv (LabelEncoder sorts them);
+# used when the training CSV is not shipped with the weights.
+DEFAULT_GEOGRAPHY_CLASSES = ['France', 'Germany', 'Spain']
+DEFAULT_GENDER_CLASSES = ['Female', 'Male']
+
+# Categorical mappings used by the regression preprocessing. The codes are
+# those of the training data (model_weights/csv/Loan.csv): the ordinal
+# employment / education scales, and the sorted LabelEncoder order for the
+# other label columns. PaymentHistory is numeric in the training data.
+YES_NO_MAPPING = {"yes": 1, "no": 0, "true": 1, "false": 0, "1": 1, "0": 0}
+RAS_TRAINING_CODES = {
+    'EmploymentStatus': {"Employed": 0, "Self-Employed": 1, "Unemployed": 2},
+    'EducationLevel': {"High School": 0, "Associate": 1, "Bachelor": 2, "Master": 3, "Doctorate": 4},
+    'MaritalStatus': {"Divorced": 0, "Married": 1, "Single": 2, "Widowed": 3},
+    'HomeOwnershipStatus': {"Mortgage": 0, "Other": 1, "Own": 2, "Rent": 3},
+    'LoanPurpose': {"Auto": 0, "Debt Consolidation": 1, "Education": 2, "Home": 3, "Other": 4},
+}
+# Customer-book labels -> the training label they are scored as.
+RAS_CATEGORY_ALIASES = {
+    'EmploymentStatus': {
+        "Full-Time Employed": "Employed",
+        "Part-Time Employed": "Employed",
+        "Government Employee": "Employed",
+        "Self-employed": "Self-Employed",
+        "Part-Time/Freelance": "Self-Employed",
+        "Retired": "Unemployed",
+        "Student": "Unemployed",
+    },
+    'EducationLevel': {
+        "Below High School": "High School",
+        "Diploma/High School": "High School",
+        "Associate's Degree": "Associate",
+        "Bachelor's Degree": "Bachelor",
+        "Master's Degree": "Master",
+        "Doctorate/Master's": "Master",
+        "PhD": "Doctorate",
+    },
+    'MaritalStatus': {
+        "Divorced/Separated": "Divorced",
+    },
+    'HomeOwnershipStatus': {
+        "Own Home": "Own",
+        "Renting": "Rent",
+    },
+    'LoanPurpose': {
+        "Home Purchase": "Home",
+        "Home Renovation": "Home",
+        "Home Improvement": "Home",
+        "Car Loan": "Auto",
+        "Education Loan": "Education",
+        "Business Loan": "Other",
+        "Medical Expenses": "Other",
+        "Medical Loan": "Other",
+        "Personal Loan": "Other",
+        "Vacation Loan": "Other",
+        "Vacation/Leisure Loan": "Other",
+        "Wedding Loan": "Other",
+    },
+}
+# Book grades of the numeric training columns, placed at the training
+# deciles / quartiles of PaymentHistory (8-44 in Loan.csv).
+PAYMENT_HISTORY_MAPPING = {
+    "Excellent": 41.0,
+    "High": 36.0,
+    "Good": 36.0,
+    "Moderate": 26.0,
+    "Middle": 26.0,
+    "Low": 17.0,
+    "Poor": 12.0,
+}
+# UtilityBillsPaymentHistory is an on-time share (0-1) in the training data.
+UTILITY_BILLS_MAPPING = {
+    "On Time": 0.75,
+    "On-time": 0.75,
+    "Late": 0.25,
+}
+RAS_CATEGORY_MAPPINGS = {
+    **{col: {**codes, **{label: codes[target] for label, target in RAS_CATEGORY_ALIASES.get(col, {}).items()}}
+       for col, codes in RAS_TRAINING_CODES.items()},
+    'PaymentHistory': PAYMENT_HISTORY_MAPPING,
+    'UtilityBillsPaymentHistory': UTILITY_BILLS_MAPPING,
+}
+
+# Bumped whenever the encoding of stored feature matrices changes.
+FEATURE_ENCODING_VERSION = 2
+
+_crs_classes = None
+
+
+def crs_label_classes():
+    """
+    Returns {column: classes} for the RF label-encoded columns, read from the
+    training CSV the first time (sorted, as LabelEncoder.fit does).
+    """
+    global _crs_classes
+    if _crs_classes is None:
+        classes = {'Geography': DEFAULT_GEOGRAPHY_CLASSES, 'Gender': DEFAULT_GENDER_CLASSES}
+        if os.path.exists(TRAIN_CSV_RF):
+            train = pd.read_csv(TRAIN_CSV_RF, usecols=list(classes))
+            classes = {col: sorted(train[col].dropna().astype(str).unique()) for col in classes}
+        else:
+            print(f"{TRAIN_CSV_RF} not found; using default CRS label classes.")
+        _crs_classes = classes
+    return _crs_classes
+
+
+def _numeric(df, col):
+    if col not in df.columns:
+        return pd.Series(np.nan, index=df.index)
+    return pd.to_numeric(df[col], errors="coerce")
+
+
+def _text(df, col):
+    if col not in df.columns:
+        return pd.Series(np.nan, index=df.index, dtype=object)
+    series = df[col]
+    return series.astype(object).where(series.notna()).map(lambda v: v if pd.isna(v) else str(v).strip())
+
+
+def _label_codes(df, col, classes):
+    """
+    Label-encodes col with the training classes. Values the model never saw
+    (where LabelEncoder would raise) take classes[0] and are reported.
+    """
+    text = _text(df, col)
+    codes = pd.Series(pd.Categorical(text, categories=classes).codes, index=df.index).astype(float)
+    unseen = (codes < 0) & text.notna()
+    if unseen.any():
+        counts = text[unseen].value_counts()
+        print(f"[WARN] {col}: {int(unseen.sum())} value(s) not seen in training, scored as "
+              f"{classes[0]!r}: {', '.join(f'{label} ({n})' for label, n in counts.items())}")
+    codes[codes < 0] = 0.0
+    return codes.where(text.notna())
+
+
+def _yes_no(df, col):
+    """Yes/No (or 1/0) flags as 1.0 / 0.0; anything else is NaN."""
+    numeric = _numeric(df, col)
+    mapped = _text(df, col).str.lower().map(YES_NO_MAPPING).astype(float)
+    return mapped.fillna(numeric)
+
+
+def _mapped(df, col, mapping):
+    """Maps text categories to their codes (-1 if unknown); numeric values pass through."""
+    text = _text(df, col)
+    numeric = _numeric(df, col)
+    codes = text.map(mapping).astype(float).fillna(-1.0)
+    return numeric.where(numeric.notna(), codes.where(text.notna()))
+
+
+# -------------------- Feature Specs --------------------
+# Each model's input is declared once, as a FeatureSpec: per column the CSV
+# field(s) it is read from, how it is derived and encoded, and what happens
+# when it is absent. A spec compiles into an encoder that writes a frame of
+# raw customer rows straight into a float matrix, and encoded rows are
+# gathered out of a FeatureMatrix as arrays, with the request's loan terms
+# filled in. Missing inputs are a NaN mask over those arrays.
+
+class Feature:
+    """
+    One model input column.
+
+    source   -- CSV field(s) it is read from (default: the feature's name)
+    derive   -- how several sources are combined ("sum")
+    encoding -- "numeric", "label" (training classes), "yes_no" or "mapped"
+                (RAS_CATEGORY_MAPPINGS, or the mappings given to the encoder)
+    fill     -- None to leave a missing value missing, "request" for values
+                the quote request supplies, or a number to fill in
+    """
+
+    def __init__(self, name, source=None, derive=None, encoding="numeric", fill=None):
+        self.name = name
+        self.sources = (source,) if isinstance(source, str) else tuple(source or (name,))
+        self.derive = derive
+        self.encoding = encoding
+        self.fill = fill
+
+    def encoder(self, mappings):
+        """Compiles this column into a function df -> float array."""
+        if self.encoding == "label":
+            classes = crs_label_classes()[self.name]
+            read = lambda df, col: _label_codes(df, col, classes)
+        elif self.encoding == "yes_no":
+            read = _yes_no
+        elif self.encoding == "mapped" and self.name in mappings:
+            mapping = mappings[self.name]
+            read = lambda df, col: _mapped(df, col, mapping)
+        else:
+            read = _numeric
+
+        if self.derive == "sum":
+            def column(df):
+                return sum(read(df, col).to_numpy(dtype=float) for col in self.sources)
+        elif self.derive is None:
+            source = self.sources[0]
+
+            def column(df):
+                return read(df, source).to_numpy(dtype=float)
+        else:
+            raise ValueError(f"Unknown derivation {self.derive!r} for {self.name}.")
+
+        if self.fill is None or self.fill == "request":
+            return column
+        fill = float(self.fill)
+
+        def filled(df):
+            values = column(df)
+            return np.where(np.isnan(values), fill, values)
+        return filled
+
+
+class FeatureSpec:
+    """The ordered inputs of one model; name is the FeatureMatrix block ("crs" / "ras")."""
+
+    def __init__(self, name, features):
+        self.name = name
+        self.features = list(features)
+        self.names = [f.name for f in self.features]
+        self.index = {n: j for j, n in enumerate(self.names)}
+        self.request_features = tuple(f.name for f in self.features if f.fill == "request")
+        self._names = np.asarray(self.names, dtype=object)
+        self._request_cols = np.array([self.index[n] for n in self.request_features], dtype=np.intp)
+        self._compiled = None
+
+    def compile(self, mappings=None):
+        """Column encoders for this spec (the default ones are compiled once)."""
+        if mappings is None or mappings is RAS_CATEGORY_MAPPINGS:
+            if self._compiled is None:
+                self._compiled = [f.encoder(RAS_CATEGORY_MAPPINGS) for f in self.features]
+            return self._compiled
+        return [f.encoder(mappings) for f in self.features]
+
+    def encode(self, df, mappings=None, blank_request=True):
+        """
+        Encodes raw customer rows (CSV field names) into a float matrix in
+        spec order. With blank_request the request-supplied columns stay NaN.
+        """
+        out = np.empty((len(df), len(self.features)), dtype=float)
+        for j, column in enumerate(self.compile(mappings)):
+            out[:, j] = column(df)
+        if blank_request:
+            out[:, self._request_cols] = np.nan
+        return out
+
+    def gather(self, matrix, positions, **request):
+        """
+        This spec's encoded rows of a FeatureMatrix (a row for a scalar
+        position, else a matrix; always a copy), with request-supplied
+        columns set from request (scalars or one value per row).
+        """
+        X = np.array(getattr(matrix, self.name)[positions], dtype=float)
+        for name, value in request.items():
+            if name not in self.request_features:
+                raise ValueError(f"{name} is not a request field of the {self.name.upper()} model.")
+            try:
+                X[..., self.index[name]] = np.asarray(value, dtype=float)
+            except (TypeError, ValueError):
+                raise ValueError(f"{name} must be a number.")
+        return X
+
+    def missing(self, X):
+        """Boolean mask of the missing inputs of a row or matrix."""
+        return np.isnan(X)
+
+    def missing_fields(self, row):
+        """Names of the missing inputs of one row."""
+        return self._names[self.missing(np.asarray(row, dtype=float))].tolist()
+
+    def vector(self, values):
+        """One encoded row from a row array or a {feature: value} mapping."""
+        if isinstance(values, dict):
+            values = [values[name] for name in self.names]
+        return np.asarray(values, dtype=float).ravel()
+
+    def as_dict(self, row):
+        """{feature: value} for one row (e.g. for the LLM fallback prompt)."""
+        return dict(zip(self.names, np.asarray(row, dtype=float).tolist()))
+
+
+# Column order the CRS scaler / random forest were fitted on.
+CRS_SPEC = FeatureSpec("crs", [
+    Feature('CreditScore'),
+    Feature('Geography', encoding="label"),
+    Feature('Gender', encoding="label"),
+    Feature('Age'),
+    Feature('Tenure'),
+    # Balance for the model is savings plus checking.
+    Feature('Balance', source=('SavingsAccountBalance', 'CheckingAccountBalance'), derive="sum"),
+    Feature('NumOfProducts'),
+    Feature('HasCrCard', encoding="yes_no"),
+    Feature('IsActiveMember', encoding="yes_no"),
+    # AnnualIncome stands in for EstimatedSalary.
+    Feature('EstimatedSalary', source='AnnualIncome'),
+])
+
+# Column order the RAS regression input is assembled in.
+RAS_SPEC = FeatureSpec("ras", [
+    Feature('Age'),
+    Feature('AnnualIncome'),
+    Feature('CreditScore'),
+    Feature('EmploymentStatus', encoding="mapped"),
+    Feature('EducationLevel', encoding="mapped"),
+    Feature('Experience'),
+    # The loan terms come from the request, so their matrix columns stay NaN.
+    Feature('LoanAmount', fill="request"),
+    Feature('LoanDuration', fill="request"),
+    Feature('MaritalStatus', encoding="mapped"),
+    Feature('NumberOfDependents'),
+    Feature('HomeOwnershipStatus', encoding="mapped"),
+    Feature('MonthlyDebtPayments'),
+    Feature('CreditCardUtilizationRate'),
+    Feature('NumberOfOpenCreditLines'),
+    Feature('NumberOfCreditInquiries'),
+    Feature('DebtToIncomeRatio'),
+    Feature('BankruptcyHistory', encoding="yes_no"),
+    Feature('LoanPurpose', encoding="mapped"),
+    Feature('PreviousLoanDefaults'),
+    Feature('PaymentHistory', encoding="mapped"),
+    Feature('LengthOfCreditHistory'),
+    Feature('SavingsAccountBalance'),
+    Feature('CheckingAccountBalance'),
+    Feature('TotalAssets'),
+    Feature('TotalLiabilities'),
+    Feature('MonthlyIncome'),
+    Feature('UtilityBillsPaymentHistory', encoding="mapped"),
+    Feature('JobTenure'),
+    Feature('NetWorth'),
+    Feature('BaseInterestRate'),
+    Feature('InterestRate'),
+    Feature('MonthlyLoanPayment'),
+    Feature('TotalDebtToIncomeRatio'),
+])
+
+CRS_FEATURES = CRS_SPEC.names
+RAS_FEATURES = RAS_SPEC.names
+RAS_REQUEST_FEATURES = RAS_SPEC.request_features
+# Book columns the stored matrices are encoded from (the loan terms come from the request).
+FEATURE_SOURCE_COLUMNS = list(dict.fromkeys(
+    ["CustomerID"] + [col for spec in (CRS_SPEC, RAS_SPEC) for feat in spec.features
+                      if feat.fill != "request" for col in feat.sources]))
+
+
+def encode_ras_features(df, mappings=None, blank_request=True):
+    """
+    Returns the RAS model input for every row of df, as floats in
+    RAS_FEATURES order. Text categories go through mappings (default
+    RAS_CATEGORY_MAPPINGS). With blank_request the loan terms are left NaN
+    for the caller to fill in; otherwise they are read from df.
+    """
+    return pd.DataFrame(RAS_SPEC.encode(df, mappings, blank_request), index=df.index, columns=RAS_FEATURES)
+
+
+def unmapped_categories(df, mappings=None):
+    """{column: sorted labels} of the RAS category values of df that have no code in mappings."""
+    mappings = RAS_CATEGORY_MAPPINGS if mappings is None else mappings
+    unmapped = {}
+    for feat in RAS_SPEC.features:
+        if feat.encoding != "mapped" or feat.sources[0] not in df.columns:
+            continue
+        col = feat.sources[0]
+        text = _text(df, col)
+        labels = text[text.notna() & _numeric(df, col).isna()]
+        missing = sorted(set(labels) - set(mappings.get(feat.name, {})))
+        if missing:
+            unmapped[feat.name] = missing
+    return unmapped
+
+
+class FeatureMatrix:
+    """
+    Encoded CRS / RAS matrices for one version of a customer book, with a
+    CustomerID -> row position index (first occurrence wins).
+    """
+
+    def __init__(self, ids, crs, ras, signature=None):
+        self.ids = np.asarray(ids, dtype=str)
+        self.crs = np.asarray(crs, dtype=float)
+        self.ras = np.asarray(ras, dtype=float)
+        self.signature = signature
+        ids = pd.Series(self.ids)
+        first = ~ids.duplicated(keep='first')
+        self.index = dict(zip(ids[first], first.to_numpy().nonzero()[0]))
+
+    @classmethod
+    def from_frame(cls, df, signature=None):
+        if "CustomerID" in df.columns:
+            ids = df["CustomerID"].astype(str)
+        else:
+            ids = pd.Series("", index=df.index)
+        return cls(ids, CRS_SPEC.encode(df), RAS_SPEC.encode(df), signature)
+
+    def positions(self, customer_ids):
+        """Row positions for customer_ids (-1 where the ID is unknown)."""
+        return np.array([self.index.get(cid, -1) for cid in customer_ids], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def features_path_for(csv_path):
+    return os.path.splitext(csv_path)[0] + ".features.npz"
+
+
+def write_features(csv_path, df, signature):
+    """Writes the encoded matrices for df (the book at signature) next to csv_path."""
+    matrix = FeatureMatrix.from_frame(df, signature)
+    path = features_path_for(csv_path)
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, ids=matrix.ids, crs=matrix.crs, ras=matrix.ras,
+             signature=np.asarray(signature, dtype=np.int64), encoding=FEATURE_ENCODING_VERSION,
+             crs_features=np.asarray(CRS_FEATURES), ras_features=np.asarray(RAS_FEATURES))
+    os.replace(tmp_path, path)
+    print(f"Feature matrix written: {path} ({len(matrix)} rows)")
+    return matrix
+
+
+def read_features(csv_path, signature):
+    """Loads the stored matrices if they were built from the book at signature, else None."""
+    path = features_path_for(csv_path)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        if tuple(data["signature"]) != tuple(signature):
+            return None
+        if "encoding" not in data.files or int(data["encoding"]) != FEATURE_ENCODING_VERSION:
+            return None
+        if list(data["crs_features"]) != CRS_FEATURES or list(data["ras_features"]) != RAS_FEATURES:
+            return None
+        return FeatureMatrix(data["ids"], data["crs"], data["ras"], signature)
+
+
+def book_features(csv_path, df, signature):
+    """Stored matrices for the book at signature, rebuilding (and storing) them when stale."""
+    matrix = read_features(csv_path, signature)
+    if matrix is None:
+        matrix = write_features(csv_path, df, signature)
+    return matrix
@@ -0,0 +1,300 @@
+import os
+import re
+import hashlib
+import time
+import pickle
+import threading
+import joblib
+from django.conf import settings
+
+
+# -------------------- Model Registry --------------------
+# Model artifacts are versioned as sub-directories of model_weights:
+#
+#   model_weights/
+#       rf_model.joblib, scaler.joblib, reg_final_model.pkl, csv/   <- version "base"
+#       v2/rf_model.joblib, v2/scaler.joblib, v2/reg_final_model.pkl, v2/csv/ ...
+#
+# A version is loaded the first time it is used and then kept warm. Callers take
+# one ModelBundle per request (get_models()) and score everything with it, so
+# activating another version only swaps the registry's reference: requests that
+# already hold the old bundle finish on it, new requests get the new one. The
+# active version is recorded in model_weights/ACTIVE_VERSION so every worker
+# process follows a swap made through the admin endpoint.
+
+MODEL_DIR = os.path.join(settings.BASE_DIR, 'ml_models', 'model_weights')
+ACTIVE_VERSION_FILE = os.path.join(MODEL_DIR, "ACTIVE_VERSION")
+BASE_VERSION = "base"
+
+CRS_MODEL_FILE = "rf_model.joblib"
+CRS_SCALER_FILE = "scaler.joblib"
+RAS_MODEL_FILE = "reg_final_model.pkl"
+RAS_PREPROCESSOR_FILE = "ras_preprocessor.joblib"
+REQUIRED_FILES = (CRS_MODEL_FILE, CRS_SCALER_FILE, RAS_MODEL_FILE)
+
+
+def _version_key(version):
+    # Natural order, so v10 sorts after v9.
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", version)]
+
+
+class ModelBundle:
+    """
+    The CRS / RAS models of one version plus anything derived from them.
+    Artifacts are read on first access; a loaded bundle is never mutated.
+    """
+
+    def __init__(self, version, path):
+        self.version = version
+        self.path = path
+        self._lock = threading.RLock()
+        self._artifacts = {}
+        self._derived = {}
+        self.loaded_at = None
+        # Identifies the artifacts this bundle serves (e.g. in prediction cache keys),
+        # so weights replaced in place under the same version name are told apart.
+        stamps = [(name, os.stat(self.file(name)).st_mtime_ns, os.path.getsize(self.file(name)))
+                  for name in REQUIRED_FILES + (RAS_PREPROCESSOR_FILE,) if os.path.exists(self.file(name))]
+        self.fingerprint = f"{version}:{hashlib.blake2b(repr(stamps).encode(), digest_size=6).hexdigest()}"
+
+    def file(self, name):
+        return os.path.join(self.path, name)
+
+    def train_csv(self, name):
+        """Training CSV shipped with this version, else the base one."""
+        path = os.path.join(self.path, 'csv', name)
+        return path if os.path.exists(path) else os.path.join(MODEL_DIR, 'csv', name)
+
+    def _artifact(self, name, load):
+        try:
+            return self._artifacts[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._artifacts:
+                self._artifacts[name] = load()
+            return self._artifacts[name]
+
+    @property
+    def classification_model(self):
+        return self._artifact("classification_model", lambda: joblib.load(self.file(CRS_MODEL_FILE)))
+
+    @property
+    def crs_forest(self):
+        """The CRS forest as flat arrays (crs_forest.FlatForest), exported next to rf_model.joblib."""
+        from .crs_forest import FlatForest, forest_path_for, export_forest
+
+        def load():
+            model_path = self.file(CRS_MODEL_FILE)
+            forest = FlatForest.load(forest_path_for(model_path), model_path)
+            if forest is None:
+                print(f"{forest_path_for(model_path)} missing or stale; exporting it.")
+                try:
+                    forest = export_forest(self.classification_model, model_path)
+                except OSError as e:  # read-only weights: flatten in memory only
+                    print(f"[WARN] Could not save the CRS forest export: {e}")
+                    forest = FlatForest.from_sklearn(self.classification_model)
+            return forest
+        return self._artifact("crs_forest", load)
+
+    @property
+    def classification_scaler(self):
+        return self._artifact("classification_scaler", lambda: joblib.load(self.file(CRS_SCALER_FILE)))
+
+    @property
+    def regression_model(self):
+        def load():
+            with open(self.file(RAS_MODEL_FILE), "rb") as f:
+                return pickle.load(f)
+        return self._artifact("regression_model", load)
+
+    @property
+    def ras_booster(self):
+        """Native scorer for the regression model (ras_booster.RasBooster); None if it is not XGBoost."""
+        from .ras_booster import RasBooster
+        return self._artifact("ras_booster", lambda: RasBooster.from_model(self.regression_model))
+
+    @property
+    def ras_preprocessor(self):
+        # Fitted scaler / power transform / mappings for the regression input.
+        from .ras_preprocessing import load_ras_preprocessor
+        return self._artifact("ras_preprocessor", lambda: load_ras_preprocessor(self.file(RAS_PREPROCESSOR_FILE)))
+
+    def derived(self, key, build):
+        """State computed from this version's models (encoders, ranges...), built once."""
+        try:
+            return self._derived[key]
+        except KeyError:
+            pass
+        with self._lock:
+            if key not in self._derived:
+                self._derived[key] = build(self)
+            return self._derived[key]
+
+    def load(self):
+        """Loads every artifact now (used to warm a version before it goes live)."""
+        started = time.perf_counter()
+        self.crs_forest
+        self.classification_scaler
+        self.regression_model
+        self.ras_booster
+        self.ras_preprocessor
+        if self.loaded_at is None:
+            self.loaded_at = time.time()
+            print(f"Model version {self.version} loaded from {self.path} "
+                  f"in {time.perf_counter() - started:.2f}s")
+        return self
+
+    def describe(self):
+        return {"version": self.version, "path": self.path, "loaded_at": self.loaded_at}
+
+
+class ModelRegistry:
+    """Discovers model versions under model_dir and serves the active one."""
+
+    def __init__(self, model_dir=MODEL_DIR):
+        self.model_dir = model_dir
+        self.version_file = os.path.join(model_dir, os.path.basename(ACTIVE_VERSION_FILE))
+        self._lock = threading.Lock()
+        self._bundles = {}
+        self._active = None
+        self._version_file_stamp = None
+
+    # ---- discovery ----
+    def _is_version_dir(self, path):
+        return all(os.path.exists(os.path.join(path, name)) for name in REQUIRED_FILES)
+
+    def versions(self):
+        """Available versions, oldest first ("base" is the flat legacy layout)."""
+        found = []
+        if self._is_version_dir(self.model_dir):
+            found.append(BASE_VERSION)
+        if os.path.isdir(self.model_dir):
+            found.extend(sorted(
+                (name for name in os.listdir(self.model_dir)
+                 if name != 'csv' and self._is_version_dir(os.path.join(self.model_dir, name))),
+                key=_version_key,
+            ))
+        return found
+
+    def path_for(self, version):
+        return self.model_dir if version == BASE_VERSION else os.path.join(self.model_dir, version)
+
+    def _read_version_file(self):
+        try:
+            stat = os.stat(self.version_file)
+        except OSError:
+            return None, None
+        with open(self.version_file, "r", encoding="utf-8") as f:
+            return f.read().strip() or None, (stat.st_mtime_ns, stat.st_size)
+
+    def _default_version(self):
+        version, _ = self._read_version_file()
+        if version:
+            return version
+        configured = getattr(settings, "MODEL_VERSION", None)
+        if configured:
+            return configured
+        versions = self.versions()
+        if not versions:
+            raise FileNotFoundError(f"No model weights found under {self.model_dir}")
+        return BASE_VERSION if BASE_VERSION in versions else versions[-1]
+
+    # ---- loading ----
+    def bundle(self, version):
+        """The (lazily loaded) bundle of one version. Raises ValueError if unknown."""
+        version = str(version).strip()
+        bundle = self._bundles.get(version)
+        if bundle is not None:
+            return bundle
+        if os.sep in version or (os.altsep and os.altsep in version) or version in ("", ".", ".."):
+            raise ValueError(f"Invalid model version {version!r}.")
+        path = self.path_for(version)
+        if not self._is_version_dir(path):
+            raise ValueError(f"Unknown model version {version!r}; available: {self.versions()}")
+        with self._lock:
+            return self._bundles.setdefault(version, ModelBundle(version, path))
+
+    def active(self):
+        """The bundle new requests should score with."""
+        self._follow_version_file()
+        bundle = self._active
+        if bundle is None:
+            with self._lock:
+                bundle = self._active
+            if bundle is None:
+                bundle = self._swap(self.bundle(self._default_version()).load())
+        return bundle
+
+    def _follow_version_file(self):
+        # Another worker may have activated a version; a stat per call is cheap.
+        if self._active is None:
+            return
+        try:
+            stat = os.stat(self.version_file)
+        except OSError:
+            return
+        if (stat.st_mtime_ns, stat.st_size) == self._version_file_stamp:
+            return
+        version, stamp = self._read_version_file()
+        if version and version != self._active.version:
+            try:
+                self._swap(self.bundle(version).load())
+            except Exception as e:
+                print(f"[WARN] Could not switch to model version {version}: {e}")
+        self._version_file_stamp = stamp
+
+    def _swap(self, bundle):
+        with self._lock:
+            previous, self._active = self._active, bundle
+            # Keep the new and the previous version warm; in-flight requests
+            # still hold their own reference to anything older.
+            keep = {bundle.version} | ({previous.version} if previous else set())
+            self._bundles = {v: b for v, b in self._bundles.items() if v in keep}
+            self._bundles.setdefault(bundle.version, bundle)
+        if previous is not None and previous is not bundle:
+            # Cached predictions of the old version can no longer be hit.
+            from .prediction_cache import prediction_cache
+            prediction_cache.clear()
+        if previous is None or previous.version != bundle.version:
+            print(f"Active model version: {bundle.version}"
+                  + (f" (was {previous.version})" if previous else ""))
+        return bundle
+
+    # ---- hot swap ----
+    def activate(self, version):
+        """
+        Loads version fully, then makes it the active one in this process and
+        records it for the other workers. Returns (bundle, previous version).
+        """
+        bundle = self.bundle(version).load()
+        previous = self._active.version if self._active else None
+        tmp_path = self.version_file + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(bundle.version + "\n")
+        os.replace(tmp_path, self.version_file)
+        self._swap(bundle)
+        self._version_file_stamp = self._read_version_file()[1]
+        return bundle, previous
+
+    def describe(self):
+        active = self._active
+        return {
+            "active": active.version if active else None,
+            "versions": self.versions(),
+            "loaded": [b.describe() for b in self._bundles.values() if b.loaded_at is not None],
+        }
+
+
+registry = ModelRegistry()
+
+
+def get_models(version=None):
+    """The active ModelBundle, or the bundle of a specific version."""
+    if version is None:
+        return registry.active()
+    return registry.bundle(version).load()
+
+
+def activate_model_version(version):
+    return registry.activate(version)
@@ -0,0 +1,90 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from django.conf import settings
+
+
+# -------------------- Prediction Cache --------------------
+# CRS and RAS predictions for single quotes are memoised in a bounded LRU. The
+# key is a hash of the exact model-input vector plus the fingerprint of the
+# model bundle that scores it, so a changed customer row or a different model
+# simply produces a new key: stale entries are never returned and age out of
+# the LRU. Entries of a replaced model version are dropped when it is swapped.
+
+PREDICTION_CACHE_SIZE = getattr(settings, "PREDICTION_CACHE_SIZE", 50000)
+
+# Rough per-entry footprint (key bytes, boxed float, OrderedDict node).
+_ENTRY_BYTES = 200
+
+
+class PredictionCache:
+    """Thread-safe LRU of model outputs keyed by (model, input vector) hashes."""
+
+    def __init__(self, max_entries=PREDICTION_CACHE_SIZE):
+        self.max_entries = max(int(max_entries or 0), 0)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def key(self, kind, models, vector):
+        """Key for one input vector scored by models; None if it is not numeric."""
+        if not self.enabled:
+            return None
+        try:
+            values = np.asarray(vector, dtype=np.float64).ravel()
+        except (TypeError, ValueError):
+            return None
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{kind}|{models.fingerprint}|".encode())
+        digest.update(values.tobytes())
+        return digest.digest()
+
+    def get(self, key):
+        if key is None:
+            return None
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if key is None:
+            return value
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "approx_bytes": len(self._entries) * _ENTRY_BYTES,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+prediction_cache = PredictionCache()
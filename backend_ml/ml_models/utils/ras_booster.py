@@ -0,0 +1,98 @@
+import threading
+import numpy as np
+from django.conf import settings
+
+
+# -------------------- Native RAS Scoring --------------------
+# The RAS model is an XGBRegressor. Instead of going through the sklearn
+# wrapper's predict (config context, iteration-range lookup and input checks
+# on every call), the booster is called directly with inplace_predict on a
+# contiguous float32 matrix. Each thread keeps its own input buffer, so a
+# quote or a chunk of the book is copied into memory that is already
+# allocated. XGBoost works in float32 internally, so the predictions are the
+# wrapper's.
+
+RAS_PREDICT_THREADS = getattr(settings, "RAS_PREDICT_THREADS", None)
+RAS_BATCH_ROWS = getattr(settings, "RAS_BATCH_ROWS", 4096)
+
+
+class RasBooster:
+    """Scores encoded, preprocessed RAS matrices with the model's booster."""
+
+    def __init__(self, model, nthread=RAS_PREDICT_THREADS, batch_rows=RAS_BATCH_ROWS):
+        booster = model.get_booster()
+        # A private copy, so thread settings do not leak into the sklearn model.
+        self.booster = booster.copy() if hasattr(booster, "copy") else booster
+        self.n_features = int(self.booster.num_features())
+        self.missing = np.nan if getattr(model, "missing", None) is None else model.missing
+        self.iteration_range = _iteration_range(model)
+        self.batch_rows = max(int(batch_rows), 1)
+        self.nthread = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.set_threads(nthread)
+
+    @classmethod
+    def from_model(cls, model, **kwargs):
+        """A RasBooster for an XGBoost model, or None for anything else."""
+        if not hasattr(model, "get_booster"):
+            return None
+        try:
+            booster = model.get_booster()
+        except Exception:
+            return None
+        if not hasattr(booster, "inplace_predict"):
+            return None
+        return cls(model, **kwargs)
+
+    def set_threads(self, nthread):
+        """Threads XGBoost may use per call (None / 0: XGBoost's default, all cores)."""
+        nthread = int(nthread or 0)
+        with self._lock:
+            if nthread != self.nthread:
+                self.booster.set_param({"nthread": nthread})
+                self.nthread = nthread
+        return self
+
+    def _buffer(self, rows):
+        buf = getattr(self._local, "buf", None)
+        if buf is None or buf.shape[0] < rows:
+            buf = np.empty((rows, self.n_features), dtype=np.float32)
+            self._local.buf = buf
+        return buf[:rows]
+
+    def _predict_block(self, X):
+        buf = self._buffer(X.shape[0])
+        np.copyto(buf, X, casting="unsafe")
+        # inplace_predict reads buf directly; the result is a fresh array.
+        return np.asarray(self.booster.inplace_predict(
+            buf, iteration_range=self.iteration_range, missing=self.missing, validate_features=False,
+        ), dtype=np.float32).reshape(-1)
+
+    def predict(self, X):
+        """Raw model output for every row of X (one row or a matrix)."""
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"X has {X.shape[1]} features, the RAS model expects {self.n_features}.")
+        if X.shape[0] <= self.batch_rows:
+            return self._predict_block(X)
+        return np.concatenate([self._predict_block(X[i:i + self.batch_rows])
+                               for i in range(0, X.shape[0], self.batch_rows)])
+
+    def predict_batches(self, matrices):
+        """Yields predictions for each matrix of an iterable (e.g. chunks of a book)."""
+        for X in matrices:
+            yield self.predict(X)
+
+
+def _iteration_range(model):
+    # As XGBModel.predict: up to the early-stopping best iteration, if any.
+    try:
+        iteration_range = (0, model.best_iteration + 1)
+    except AttributeError:
+        iteration_range = (0, 0)
+    if getattr(model, "booster", None) == "gblinear":
+        iteration_range = (0, 0)
+    return iteration_range
@@ -0,0 +1,128 @@
+import os
+import numpy as np
+import pandas as pd
+import joblib
+from django.conf import settings
+from sklearn.preprocessing import PowerTransformer
+
+from .model_features import RAS_FEATURES, RAS_SPEC, RAS_CATEGORY_MAPPINGS, encode_ras_features, unmapped_categories
+
+
+# -------------------- RAS Preprocessing Artifact --------------------
+# The regression model's input preprocessing (categorical mappings, standard
+# scaling and a Yeo-Johnson power transform on the positive, skewed columns)
+# is fitted once on the training data by the fit_ras_preprocessor command and
+# saved next to reg_final_model.pkl. At request time it is a handful of numpy
+# operations over the encoded matrix, for one row or a whole book. Serving
+# never fits it: a missing or stale artifact is an error, not unscaled input.
+
+MODEL_DIR = os.path.join(settings.BASE_DIR, 'ml_models', 'model_weights')
+RAS_PREPROCESSOR_PATH = os.path.join(MODEL_DIR, "ras_preprocessor.joblib")
+TRAIN_CSV_RAS = os.path.join(MODEL_DIR, 'csv', 'Loan.csv')
+
+# Columns kept out of the power transform (as in the original preprocessing).
+POWER_EXCLUDED = ['Age', 'Experience', 'PaymentHistory', 'LengthOfCreditHistory',
+                  'JobTenure', 'BaseInterestRate', 'InterestRate']
+
+
+def _yeo_johnson(X, lambdas):
+    """Column-wise Yeo-Johnson transform of X with one lambda per column."""
+    X = np.asarray(X, dtype=float)
+    out = np.full_like(X, np.nan)
+    lambdas = np.broadcast_to(lambdas, X.shape)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pos = X >= 0
+        neg = X < 0
+        lam0 = np.abs(lambdas) < 1e-8
+        lam2 = np.abs(lambdas - 2) < 1e-8
+        out = np.where(pos & ~lam0, (np.power(X + 1, lambdas) - 1) / lambdas, out)
+        out = np.where(pos & lam0, np.log1p(np.where(pos, X, 0)), out)
+        out = np.where(neg & ~lam2, -(np.power(1 - X, 2 - lambdas) - 1) / (2 - lambdas), out)
+        out = np.where(neg & lam2, -np.log1p(-np.where(neg, X, 0)), out)
+    return out
+
+
+class RasPreprocessor:
+    """
+    Fitted preprocessing for the RAS regression model. Works on matrices in
+    RAS_FEATURES order (see model_features); missing values stay missing.
+    """
+
+    def __init__(self, features, mappings, mean, scale, power_mask, lambdas):
+        self.features = list(features)
+        self.mappings = mappings
+        self.mean = np.asarray(mean, dtype=float)
+        self.scale = np.asarray(scale, dtype=float)
+        self.power_mask = np.asarray(power_mask, dtype=bool)
+        self.lambdas = np.asarray(lambdas, dtype=float)
+
+    @classmethod
+    def fit(cls, train_df, mappings=None):
+        """
+        Fits the power transform and scaling on a training frame. Raises
+        ValueError if a training category has no code in mappings.
+        """
+        mappings = RAS_CATEGORY_MAPPINGS if mappings is None else mappings
+        unmapped = unmapped_categories(train_df, mappings)
+        if unmapped:
+            raise ValueError(f"Training categories without a RAS code: {unmapped}")
+        X = encode_ras_features(train_df, mappings, blank_request=False)
+        power_mask = np.array([
+            col not in POWER_EXCLUDED and X[col].nunique() > 1 and (X[col].dropna() > 0).all()
+            for col in RAS_FEATURES
+        ])
+        lambdas = np.ones(len(RAS_FEATURES))
+        if power_mask.any():
+            pt = PowerTransformer(method="yeo-johnson", standardize=False)
+            power_cols = X.loc[:, power_mask]
+            pt.fit(power_cols.fillna(power_cols.median()))
+            lambdas[power_mask] = pt.lambdas_
+
+        values = X.to_numpy(dtype=float)
+        values[:, power_mask] = _yeo_johnson(values[:, power_mask], lambdas[power_mask])
+        mean = np.nan_to_num(np.nanmean(values, axis=0))
+        scale = np.nanstd(values, axis=0)
+        scale = np.where((scale > 0) & np.isfinite(scale), scale, 1.0)
+        return cls(RAS_FEATURES, mappings, mean, scale, power_mask, lambdas)
+
+    def encode(self, df):
+        """Encodes a raw frame (CSV field names) into a RAS_FEATURES matrix."""
+        return RAS_SPEC.encode(df, self.mappings, blank_request=False)
+
+    def transform(self, X):
+        """Applies the fitted power transform and scaling to an encoded matrix."""
+        X = np.array(X, dtype=float, ndmin=2)
+        if self.power_mask.any():
+            X[:, self.power_mask] = _yeo_johnson(X[:, self.power_mask], self.lambdas[self.power_mask])
+        return (X - self.mean) / self.scale
+
+    def transform_frame(self, df):
+        return self.transform(self.encode(df))
+
+    def save(self, path=RAS_PREPROCESSOR_PATH):
+        joblib.dump(self, path)
+        return path
+
+
+def fit_ras_preprocessor(train_csv=TRAIN_CSV_RAS, path=RAS_PREPROCESSOR_PATH):
+    """Fits the preprocessor on train_csv and saves it to path."""
+    train_df = pd.read_csv(train_csv)
+    train_df.columns = train_df.columns.astype(str).str.strip().str.replace(" ", "")
+    preprocessor = RasPreprocessor.fit(train_df)
+    preprocessor.save(path)
+    print(f"RAS preprocessor fitted on {len(train_df)} rows and saved to {path}")
+    return preprocessor
+
+
+def load_ras_preprocessor(path=RAS_PREPROCESSOR_PATH):
+    """
+    Loads the saved preprocessor. Raises FileNotFoundError if it was never
+    fitted and ValueError if it was fitted for other features or mappings.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found; run `python manage.py fit_ras_preprocessor`.")
+    preprocessor = joblib.load(path)
+    if preprocessor.features != RAS_FEATURES or preprocessor.mappings != RAS_CATEGORY_MAPPINGS:
+        raise ValueError(f"{path} was fitted for other RAS features or category mappings; "
+                         f"refit it with `python manage.py fit_ras_preprocessor`.")
+    return preprocessor
@@ -0,0 +1,185 @@
+import json
+import time
+import hashlib
+import numpy as np
+import pandas as pd
+
+from .rule_sets import RuleSet, get_rule_set
+
+
+# -------------------- Rule-Set Impact Simulation --------------------
+# Answers "how would the book's rates move under this rule set?" before it goes
+# live. The whole customer store is scored under the baseline and the candidate
+# rule set, one vectorized RuleEngine pass each. The report compares the two:
+# summary statistics, histograms, mean BPS per feature and per segment, and
+# the customers whose BPS moves the most.
+
+IMPACT_SEGMENTS = ("EmploymentStatus", "HomeOwnershipStatus", "MaritalStatus", "EducationLevel", "LoanPurpose")
+IMPACT_TOP_MOVERS = 20
+IMPACT_BINS = 20
+# Numeric segment columns are bucketed into quantiles.
+IMPACT_NUMERIC_BUCKETS = 5
+IMPACT_MAX_DRIVERS = 5
+
+# Direction a BPS increase moves the customer's rate (house loan BPS is a
+# discount, FD BPS a bonus).
+RATE_DIRECTION = {"house_loan": -1, "fixed_deposit": 1}
+
+
+def candidate_rule_set(spec):
+    """The RuleSet to simulate: a rule-set version, or an inline rule-set document."""
+    if isinstance(spec, dict):
+        raw = json.dumps(spec, sort_keys=True).encode()
+        return RuleSet.from_dict("candidate", spec, f"candidate:{hashlib.blake2b(raw, digest_size=6).hexdigest()}")
+    if isinstance(spec, str) and spec.strip():
+        return get_rule_set(spec)
+    raise ValueError("candidate must be a rule-set version or a rule-set object.")
+
+
+def _round(value):
+    return None if value is None or np.isnan(value) else round(float(value), 4)
+
+
+def _stats(values):
+    if not len(values):
+        return {}
+    p0, p5, p50, p95, p100 = np.percentile(values, [0, 5, 50, 95, 100])
+    return {"mean": _round(values.mean()), "std": _round(values.std()), "min": _round(p0), "p5": _round(p5),
+            "median": _round(p50), "p95": _round(p95), "max": _round(p100)}
+
+
+def _edges(values, bins):
+    low, high = float(values.min()), float(values.max())
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    return np.linspace(low, high, bins + 1)
+
+
+def _segments(column):
+    """(segment code per row, segment labels); missing values get the last code."""
+    if pd.api.types.is_numeric_dtype(column) and column.nunique() > IMPACT_NUMERIC_BUCKETS:
+        column = pd.qcut(column, IMPACT_NUMERIC_BUCKETS, duplicates="drop")
+    codes, labels = pd.factorize(column, sort=True)
+    labels = [str(label) for label in labels]
+    if (codes < 0).any():
+        codes = np.where(codes < 0, len(labels), codes)
+        labels.append("(missing)")
+    return codes, labels
+
+
+def _feature_bps(rules, rule_set, bps, positions=None):
+    """Feature -> BPS row (all customers, or those at positions) of one rule set's bps matrix."""
+    rows = bps if positions is None else bps[:, positions]
+    return dict(zip(rules.weights[rule_set], rows))
+
+
+def simulate_rule_change(store, candidate, baseline=None, rule_set="house_loan", segments=None,
+                         top=IMPACT_TOP_MOVERS, bins=IMPACT_BINS):
+    """
+    Scores every customer of store under baseline (the active rule set by
+    default) and candidate, both RuleSets, and reports how the book's BPS
+    and rates would move. segments are the book columns to break the deltas
+    down by. Raises ValueError on bad input.
+    """
+    if rule_set not in RATE_DIRECTION:
+        raise ValueError(f"rule_set must be one of {sorted(RATE_DIRECTION)}.")
+    top, bins = int(top), int(bins)
+    if top < 0 or bins < 1:
+        raise ValueError("top must be >= 0 and bins >= 1.")
+    baseline = baseline or get_rule_set()
+    explicit = segments is not None
+    if not explicit:
+        segments = list(IMPACT_SEGMENTS)
+    elif not isinstance(segments, list) or not all(isinstance(col, str) for col in segments):
+        raise ValueError("segments must be a list of column names.")
+
+    started = time.perf_counter()
+    columns = list(dict.fromkeys(["CustomerID"] + baseline.columns + candidate.columns + segments))
+    book = store.frame(columns)
+    if not len(book):
+        raise ValueError("The customer book is empty.")
+    unknown = [col for col in segments if col not in book.columns]
+    if explicit and unknown:
+        raise ValueError(f"Unknown segment columns: {unknown}")
+    segments = [col for col in segments if col in book.columns]
+
+    base_total, base_bps, _ = baseline.score(rule_set, book)
+    cand_total, cand_bps, _ = candidate.score(rule_set, book)
+    delta = cand_total - base_total
+    rate_delta = RATE_DIRECTION[rule_set] * delta / 100
+    scored = time.perf_counter()
+
+    base_edges = _edges(np.concatenate([base_total, cand_total]), bins)
+    delta_edges = _edges(delta, bins)
+
+    base_features = _feature_bps(baseline, rule_set, base_bps.mean(axis=1))
+    cand_features = _feature_bps(candidate, rule_set, cand_bps.mean(axis=1))
+    by_feature = [{"feature": feat,
+                   "baseline_bps": _round(base_features.get(feat, 0.0)),
+                   "candidate_bps": _round(cand_features.get(feat, 0.0)),
+                   "delta_bps": _round(cand_features.get(feat, 0.0) - base_features.get(feat, 0.0))}
+                  for feat in dict.fromkeys(list(base_features) + list(cand_features))]
+    by_feature.sort(key=lambda row: -abs(row["delta_bps"]))
+
+    totals = {"baseline_bps": base_total, "candidate_bps": cand_total, "delta_bps": delta}
+    by_segment = {}
+    for col in segments:
+        codes, labels = _segments(book[col])
+        counts = np.bincount(codes, minlength=len(labels))
+        means = {key: np.bincount(codes, values, len(labels)) / np.maximum(counts, 1)
+                 for key, values in totals.items()}
+        by_segment[col] = [{"segment": label, "customers": int(counts[k]),
+                            **{key: _round(mean[k]) for key, mean in means.items()}}
+                           for k, label in enumerate(labels)]
+
+    top_movers = []
+    if top:
+        order = np.argpartition(-np.abs(delta), min(top, len(delta)) - 1)[:top]
+        order = order[np.argsort(-np.abs(delta[order]), kind="stable")]
+        base_rows = _feature_bps(baseline, rule_set, base_bps, order)
+        cand_rows = _feature_bps(candidate, rule_set, cand_bps, order)
+        features = list(dict.fromkeys(list(base_rows) + list(cand_rows)))
+        ids = (book["CustomerID"].astype(str).to_numpy() if "CustomerID" in book.columns
+               else np.arange(len(book)).astype(str))
+        for i, pos in enumerate(order.tolist()):
+            # The features whose BPS moved the most for this customer.
+            changes = [(feat, (cand_rows[feat][i] if feat in cand_rows else 0.0)
+                        - (base_rows[feat][i] if feat in base_rows else 0.0)) for feat in features]
+            drivers = sorted((item for item in changes if item[1]),
+                             key=lambda item: -abs(item[1]))[:IMPACT_MAX_DRIVERS]
+            top_movers.append({
+                "customer_id": ids[pos],
+                "baseline_bps": _round(base_total[pos]),
+                "candidate_bps": _round(cand_total[pos]),
+                "delta_bps": _round(delta[pos]),
+                "rate_delta": _round(rate_delta[pos]),
+                "drivers": {feat: _round(change) for feat, change in drivers},
+            })
+
+    return {
+        "rule_set": rule_set,
+        "baseline": {"version": baseline.version, "fingerprint": baseline.fingerprint},
+        "candidate": {"version": candidate.version, "fingerprint": candidate.fingerprint},
+        "customers": len(book),
+        "summary": {
+            "baseline_bps": _stats(base_total),
+            "candidate_bps": _stats(cand_total),
+            "delta_bps": _stats(delta),
+            "rate_delta": _stats(rate_delta),
+            # More BPS is a better rate for both products.
+            "better_rate": int((delta > 0).sum()),
+            "worse_rate": int((delta < 0).sum()),
+            "unchanged": int((delta == 0).sum()),
+        },
+        "histograms": {
+            "bps": {"edges": base_edges.round(4).tolist(),
+                    "baseline": np.histogram(base_total, base_edges)[0].tolist(),
+                    "candidate": np.histogram(cand_total, base_edges)[0].tolist()},
+            "delta_bps": {"edges": delta_edges.round(4).tolist(),
+                          "counts": np.histogram(delta, delta_edges)[0].tolist()},
+        },
+        "by_feature": by_feature,
+        "segments": by_segment,
+        "top_movers": top_movers,
+        "seconds": {"scoring": round(scored - started, 3), "total": round(time.perf_counter() - started, 3)},
+    }
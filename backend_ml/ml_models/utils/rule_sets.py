@@ -0,0 +1,295 @@
+import os
+import re
+import json
+import math
+import hashlib
+import threading
+from django.conf import settings
+
+from .house_loan_interest import RuleEngine, feature_bps, feature_bps_fd, health_mapping
+from .model_registry import _version_key
+
+
+# -------------------- Pricing Rule Sets --------------------
+# The rule engine's weights (feature_bps, feature_bps_fd) and health bands
+# (health_mapping) are versioned JSON files:
+#
+#   ml_models/rule_sets/
+#       v2.json           {"feature_bps": {...}, "feature_bps_fd": {...}, "health_mapping": {...}}
+#       ACTIVE_RULE_SET   <- the live version
+#
+# A band is [lower, upper, health] as in house_loan_interest, with null for an
+# open bound, or [label, label, health]. Every weighted feature needs a band
+# list; null marks a feature that always earns its full weight. The dicts built into
+# house_loan_interest are version "base". A file is validated and compiled
+# into RuleEngines when it is loaded, so a quote costs the same however many
+# bands a rule set has. Callers take one RuleSet per request (get_rule_set());
+# activating a version swaps the registry's reference, so quotes in flight
+# finish on the rule set they started with. Every process follows
+# ACTIVE_RULE_SET, and edits to the active file, with a stat per call.
+
+RULE_SET_DIR = os.path.join(settings.BASE_DIR, 'ml_models', 'rule_sets')
+ACTIVE_RULE_SET_FILE = os.path.join(RULE_SET_DIR, "ACTIVE_RULE_SET")
+BASE_RULE_SET = "base"
+
+# Engine name -> the key of its weights in a rule-set document.
+RULE_SET_WEIGHTS = {
+    "house_loan": "feature_bps",
+    "fixed_deposit": "feature_bps_fd",
+}
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _validate_weights(name, weights, errors):
+    if not isinstance(weights, dict) or not weights:
+        errors.append(f"{name} must be a non-empty object of feature -> BPS weight.")
+        return {}
+    valid = {}
+    for feat, weight in weights.items():
+        if not _is_number(weight) or not math.isfinite(weight):
+            errors.append(f"{name}.{feat}: weight must be a finite number.")
+        else:
+            valid[feat] = weight
+    return valid
+
+
+def _validate_bands(feat, bands, errors):
+    if bands is None:
+        return None
+    if not isinstance(bands, list) or not bands:
+        errors.append(f"health_mapping.{feat} must be a non-empty list of [lower, upper, health] bands.")
+        return None
+    parsed = []
+    for i, band in enumerate(bands):
+        where = f"health_mapping.{feat}[{i}]"
+        if not isinstance(band, (list, tuple)) or len(band) != 3:
+            errors.append(f"{where} must be [lower, upper, health].")
+            continue
+        lower, upper, health = band
+        if not _is_number(health) or not 0 <= health <= 100:
+            errors.append(f"{where}: health must be a number between 0 and 100.")
+            continue
+        if isinstance(lower, str):
+            if upper is not None and upper != lower:
+                errors.append(f"{where}: a label band is [label, label, health].")
+                continue
+            parsed.append((lower, lower, health))
+            continue
+        lower = float("-inf") if lower is None else lower
+        upper = float("inf") if upper is None else upper
+        if not (_is_number(lower) and _is_number(upper)) or lower > upper:
+            errors.append(f"{where}: bounds must be numbers (null for open) with lower <= upper, or a label.")
+            continue
+        parsed.append((lower, upper, health))
+    return parsed
+
+
+def _json_bound(value):
+    return None if _is_number(value) and math.isinf(value) else value
+
+
+class RuleSet:
+    """The weights and health bands of one rule-set version, compiled into RuleEngines."""
+
+    def __init__(self, version, feature_bps, feature_bps_fd, health_mapping, fingerprint=None):
+        self.version = version
+        self.feature_bps = feature_bps
+        self.feature_bps_fd = feature_bps_fd
+        self.health_mapping = health_mapping
+        self.weights = {"house_loan": feature_bps, "fixed_deposit": feature_bps_fd}
+        self.engines = {name: RuleEngine(weights, health_mapping) for name, weights in self.weights.items()}
+        # Raw columns the rule set reads.
+        self.columns = list(dict.fromkeys(feat for weights in self.weights.values() for feat in weights))
+        self.fingerprint = fingerprint or version
+
+    @classmethod
+    def from_dict(cls, version, data, fingerprint=None):
+        """Validates a rule-set document; raises ValueError listing every problem."""
+        if not isinstance(data, dict):
+            raise ValueError(f"Rule set {version}: expected a JSON object.")
+        errors = []
+        weights = {key: _validate_weights(key, data.get(key), errors) for key in RULE_SET_WEIGHTS.values()}
+        mapping = data.get("health_mapping")
+        if isinstance(mapping, dict):
+            for key, feat_weights in weights.items():
+                unbanded = [feat for feat in feat_weights if feat not in mapping]
+                if unbanded:
+                    errors.append(f"{key}: no health_mapping bands for {unbanded} "
+                                  "(use null for a feature that always earns its full weight).")
+        else:
+            errors.append("health_mapping is required: an object of feature -> bands.")
+            mapping = {}
+        bands = {feat: _validate_bands(feat, feat_bands, errors) for feat, feat_bands in mapping.items()}
+        bands = {feat: feat_bands for feat, feat_bands in bands.items() if feat_bands is not None}
+        if errors:
+            raise ValueError(f"Invalid rule set {version}: " + "; ".join(errors))
+        return cls(version, weights["feature_bps"], weights["feature_bps_fd"], bands, fingerprint)
+
+    @classmethod
+    def load(cls, version, path):
+        with open(path, "rb") as f:
+            raw = f.read()
+        try:
+            data = json.loads(raw)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Rule set {version} is not valid JSON: {e}")
+        fingerprint = f"{version}:{hashlib.blake2b(raw, digest_size=6).hexdigest()}"
+        return cls.from_dict(version, data, fingerprint)
+
+    def score(self, rule_set, df):
+        """(total, bps, health) of every row of df under one rule set; see RuleEngine.score."""
+        return self.engines[rule_set].score(df)
+
+    def to_dict(self):
+        mapping = {
+            feat: [[_json_bound(lower), _json_bound(upper), health] for lower, upper, health in bands]
+            for feat, bands in self.health_mapping.items()
+        }
+        # Weighted features without bands always earn their full weight.
+        mapping.update({feat: None for feat in self.columns if feat not in mapping})
+        return {
+            "feature_bps": self.feature_bps,
+            "feature_bps_fd": self.feature_bps_fd,
+            "health_mapping": mapping,
+        }
+
+    def describe(self):
+        return {"version": self.version, "fingerprint": self.fingerprint,
+                "features": {name: len(weights) for name, weights in self.weights.items()},
+                "banded_features": len(self.health_mapping)}
+
+
+BASE = RuleSet(BASE_RULE_SET, feature_bps, feature_bps_fd, health_mapping, f"{BASE_RULE_SET}:builtin")
+
+
+class RuleSetRegistry:
+    """Discovers rule-set versions under rules_dir and serves the active one."""
+
+    def __init__(self, rules_dir=RULE_SET_DIR):
+        self.rules_dir = rules_dir
+        self.version_file = os.path.join(rules_dir, os.path.basename(ACTIVE_RULE_SET_FILE))
+        # Reentrant: active() holds it while rule_set() caches a reloaded file.
+        self._lock = threading.RLock()
+        self._loaded = {}  # version -> (file stamp, RuleSet)
+        self._active = None
+        self._watch = None  # (pointer file stamp, active file stamp)
+
+    def versions(self):
+        """Available versions ("base" first, then the JSON files in natural order)."""
+        found = []
+        if os.path.isdir(self.rules_dir):
+            found = sorted((os.path.splitext(name)[0] for name in os.listdir(self.rules_dir)
+                            if name.endswith(".json")), key=_version_key)
+        return [BASE_RULE_SET] + [v for v in found if v != BASE_RULE_SET]
+
+    def path_for(self, version):
+        return os.path.join(self.rules_dir, f"{version}.json")
+
+    @staticmethod
+    def _stamp(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def rule_set(self, version):
+        """The compiled rule set of one version (reloaded if its file changed). Raises ValueError."""
+        version = str(version).strip()
+        if version == BASE_RULE_SET:
+            return BASE
+        if not re.fullmatch(r"[\w.-]+", version) or version in (".", ".."):
+            raise ValueError(f"Invalid rule-set version {version!r}.")
+        path = self.path_for(version)
+        stamp = self._stamp(path)
+        if stamp is None:
+            raise ValueError(f"Unknown rule-set version {version!r}; available: {self.versions()}")
+        loaded = self._loaded.get(version)
+        if loaded is not None and loaded[0] == stamp:
+            return loaded[1]
+        rules = RuleSet.load(version, path)
+        with self._lock:
+            self._loaded[version] = (stamp, rules)
+        print(f"Rule set {version} loaded from {path}")
+        return rules
+
+    def _default_version(self):
+        try:
+            with open(self.version_file, "r", encoding="utf-8") as f:
+                version = f.read().strip()
+        except OSError:
+            version = None
+        return version or getattr(settings, "RULE_SET_VERSION", None) or BASE_RULE_SET
+
+    def active(self):
+        """The rule set new quotes should be priced with."""
+        version = self._active.version if self._active else None
+        watch = (self._stamp(self.version_file),
+                 self._stamp(self.path_for(version)) if version and version != BASE_RULE_SET else None)
+        if self._active is not None and watch == self._watch:
+            return self._active
+        with self._lock:
+            if self._active is not None and watch == self._watch:
+                return self._active
+            previous = self._active
+            version = self._default_version()
+            try:
+                rules = self.rule_set(version)
+            except (OSError, ValueError) as e:
+                # A bad file never replaces a working rule set.
+                print(f"[WARN] Could not load rule set {version}: {e}")
+                rules = previous or BASE
+            self._active = rules
+            self._watch = (self._stamp(self.version_file),
+                           self._stamp(self.path_for(rules.version)) if rules.version != BASE_RULE_SET else None)
+        if previous is None or previous.fingerprint != rules.fingerprint:
+            print(f"Active rule set: {rules.version}" + (f" (was {previous.version})" if previous else ""))
+        return rules
+
+    def activate(self, version):
+        """
+        Loads and compiles version, then makes it the active rule set here and
+        records it for the other workers. Returns (rule set, previous version).
+        """
+        rules = self.rule_set(version)
+        previous = self.active().version
+        os.makedirs(self.rules_dir, exist_ok=True)
+        tmp_path = self.version_file + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(rules.version + "\n")
+        os.replace(tmp_path, self.version_file)
+        with self._lock:
+            self._active = rules
+            self._watch = (self._stamp(self.version_file),
+                           self._stamp(self.path_for(rules.version)) if rules.version != BASE_RULE_SET else None)
+        return rules, previous
+
+    def describe(self):
+        active = self.active()
+        return {"active": active.version, "versions": self.versions(), "rule_set": active.describe()}
+
+
+registry = RuleSetRegistry()
+
+
+def get_rule_set(version=None):
+    """The active RuleSet, or the rule set of a specific version."""
+    if version is None:
+        return registry.active()
+    return registry.rule_set(version)
+
+
+def activate_rule_set(version):
+    return registry.activate(version)
+
+
+def write_rule_set(rules, path):
+    """Writes rules as a rule-set JSON file (e.g. the base set, as a starting point for a new version)."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(rules.to_dict(), f, indent=2)
+    os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,243 @@
+import time
+import threading
+import numpy as np
+import pandas as pd
+
+from .customer_store import normalize_customer_id
+from .house_loan import classification_matrix_prediction
+from .model_features import CRS_SPEC
+from .model_registry import get_models
+from .rule_sets import get_rule_set
+
+
+# -------------------- Materialized Score Table --------------------
+# Everything a quote needs that depends only on the customer is scored for the
+# whole book ahead of the request. That covers CRS and, for each rule set, the
+# health % and earned BPS per feature plus the total. A quote is then a row
+# lookup plus the parts that depend on the request: the loan terms, the base
+# rate, RAS and market trends.
+#
+# A table belongs to one book snapshot, one model bundle and one rule set. When
+# the book changes (ingest compaction) only changed rows are rescored. Each row
+# is keyed by a hash of its rule inputs and a hash of its encoded CRS inputs,
+# and rows whose keys are already in the previous table are copied from it.
+# When the model version changes, CRS is rescored for every row and the rule
+# columns are kept; when the rule set changes, it is the other way round.
+#
+# The rule rater only needs the rule columns, so it never loads the model
+# bundle: it reads any table scored with its rule set, or builds a rule-only
+# table (CRS left NaN) that a later model table takes the rule columns from.
+#
+# Only stores that keep an in-memory snapshot of the book (csv, columnar) are
+# materialized; the ORM store is scored per request as before.
+
+SCORE_TABLE_CHUNK_ROWS = 10000
+
+# Score tables kept per store (the newest model / rule-set versions).
+_TABLES_PER_STORE = 2
+
+
+def _row_keys(frame):
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy()
+
+
+def _reuse(previous_keys, keys):
+    """Position in previous_keys of every key (-1 where it is new)."""
+    if previous_keys is None or not len(previous_keys):
+        return np.full(len(keys), -1, dtype=np.int64)
+    lookup = pd.Series(np.arange(len(previous_keys)), index=previous_keys)
+    lookup = lookup[~lookup.index.duplicated(keep="first")]
+    return lookup.reindex(keys).fillna(-1).to_numpy(dtype=np.int64)
+
+
+class ScoreTable:
+    """
+    Customer-only scores for every row of a FeatureMatrix (same row order):
+    crs, plus rules[rule_set] = (total, bps, health) as in RuleEngine.score.
+    A rule-only table has no models (version and fingerprint None, crs NaN).
+    """
+
+    def __init__(self, features, models, rule_set, crs, crs_keys, rules, rule_keys, rescored=None):
+        self.features = features
+        self.version = models.version if models is not None else None
+        self.fingerprint = models.fingerprint if models is not None else None
+        self.rule_set_version = rule_set.version
+        self.rules_fingerprint = rule_set.fingerprint
+        self.crs = crs
+        self.crs_keys = crs_keys
+        self.rules = rules
+        self.rule_keys = rule_keys
+        self.rescored = rescored or {}
+        self.built_at = time.time()
+
+    @classmethod
+    def build(cls, book, features, models, rule_set, previous=None):
+        """
+        Scores book (the raw rows behind features) with models and rule_set
+        (a rule_sets.RuleSet), copying the scores of unchanged rows from previous.
+        With models None only the rule columns are scored.
+        """
+        started = time.perf_counter()
+        n = len(features)
+        crs = np.full(n, np.nan)
+        crs_keys = None
+        todo = np.empty(0, dtype=np.int64)
+        if models is not None:
+            crs_keys = _row_keys(pd.DataFrame(features.crs))
+            same_model = previous is not None and previous.fingerprint == models.fingerprint
+            reuse = _reuse(previous.crs_keys if same_model else None, crs_keys)
+            if same_model:
+                crs[reuse >= 0] = previous.crs[reuse[reuse >= 0]]
+            # Rows with missing CRS inputs stay NaN (the RF cannot score them).
+            todo = np.flatnonzero((reuse < 0) & ~CRS_SPEC.missing(features.crs).any(axis=1))
+            for start in range(0, len(todo), SCORE_TABLE_CHUNK_ROWS):
+                rows = todo[start:start + SCORE_TABLE_CHUNK_ROWS]
+                crs[rows] = classification_matrix_prediction(features.crs[rows], models)
+
+        rules = {}
+        rule_keys = {}
+        rules_rescored = 0
+        same_rules = previous is not None and previous.rules_fingerprint == rule_set.fingerprint
+        for name, weights in rule_set.weights.items():
+            keys = rule_keys[name] = _row_keys(book.reindex(columns=list(weights)))
+            reuse = _reuse(previous.rule_keys.get(name) if same_rules else None, keys)
+            total = np.empty(n)
+            bps = np.empty((len(weights), n))
+            health = np.empty((len(weights), n))
+            old = np.flatnonzero(reuse >= 0)
+            if len(old):
+                prev_total, prev_bps, prev_health = previous.rules[name]
+                total[old] = prev_total[reuse[old]]
+                bps[:, old] = prev_bps[:, reuse[old]]
+                health[:, old] = prev_health[:, reuse[old]]
+            new = np.flatnonzero(reuse < 0)
+            if len(new):
+                total[new], bps[:, new], health[:, new] = rule_set.score(name, book.iloc[new])
+            rules[name] = (total, bps, health)
+            rules_rescored += len(new)
+
+        rescored = {"crs": int(len(todo)), "rules": rules_rescored}
+        table = cls(features, models, rule_set, crs, crs_keys, rules, rule_keys, rescored)
+        print(f"Score table built for {n} rows with model version {table.version} and rule set "
+              f"{rule_set.version} in {time.perf_counter() - started:.2f}s (rescored {rescored})")
+        return table
+
+    def position(self, customer_id):
+        """Row of customer_id, or None when the ID is unknown."""
+        return self.features.index.get(customer_id)
+
+    def rule_scores(self, rule_set, pos):
+        """(total, bps row, health row) of one rule set for the row at pos."""
+        total, bps, health = self.rules[rule_set]
+        return total[pos], bps[:, pos], health[:, pos]
+
+    def describe(self):
+        return {
+            "rows": len(self.features),
+            "model_version": self.version,
+            "rule_set_version": self.rule_set_version,
+            "built_at": self.built_at,
+            "rescored": self.rescored,
+        }
+
+
+class ScoreTables:
+    """The current score tables of each customer store, built and refreshed on access."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._store_locks = {}
+        self._tables = {}  # id(store) -> {(model, rule-set fingerprint): ScoreTable}, newest last
+
+    @staticmethod
+    def materialized(store):
+        return hasattr(store, "snapshot")
+
+    def get(self, store, models=None, rules=None):
+        """
+        The score table of store's current snapshot scored by models and rules
+        (the active versions by default); None for stores that are not materialized.
+        """
+        if not self.materialized(store):
+            return None
+        models = models or get_models()
+        rules = rules or get_rule_set()
+        table = self._tables.get(id(store), {}).get((models.fingerprint, rules.fingerprint))
+        if table is not None and table.features is store.features():
+            return table
+        return self._build(store, models, rules)
+
+    def rules(self, store, rules=None):
+        """
+        A score table of store's current snapshot with the rule columns of
+        rules (the active rule set by default); None for stores that are not
+        materialized. Never loads the model bundle: any table scored with
+        rules serves, and without one a rule-only table is built.
+        """
+        if not self.materialized(store):
+            return None
+        rules = rules or get_rule_set()
+        features = store.features()
+        for table in reversed(list(self._tables.get(id(store), {}).values())):
+            if table.rules_fingerprint == rules.fingerprint and table.features is features:
+                return table
+        return self._build(store, None, rules)
+
+    def _build(self, store, models, rules):
+        key = (models.fingerprint if models is not None else None, rules.fingerprint)
+        with self._lock:
+            store_lock = self._store_locks.setdefault(id(store), threading.Lock())
+        with store_lock:
+            tables = self._tables.get(id(store), {})
+            table = tables.get(key)
+            book, features = store.snapshot(rules.columns)
+            if table is not None and table.features is features:
+                return table
+            # Reuse from the newest table, whatever it was scored with.
+            previous = table or (list(tables.values())[-1] if tables else None)
+            table = ScoreTable.build(book, features, models, rules, previous)
+            tables = {k: t for k, t in tables.items() if k != key}
+            tables[key] = table
+            self._tables[id(store)] = dict(list(tables.items())[-_TABLES_PER_STORE:])
+        return table
+
+    def refresh(self, store):
+        """Brings an existing table of store up to date (e.g. right after ingest)."""
+        tables = self._tables.get(id(store))
+        if not tables:
+            return None
+        if list(tables.values())[-1].fingerprint is None:
+            # Only the rule rater has used this store so far; leave the models unloaded.
+            return self.rules(store)
+        return self.get(store)
+
+    def describe(self):
+        return [table.describe() for tables in list(self._tables.values()) for table in tables.values()]
+
+
+score_tables = ScoreTables()
+
+
+def customer_rule_scores(store, customer_id, rule_set, rules=None):
+    """
+    (total, bps row, health row) of customer_id from the score table; None if
+    not materialized. Does not load the model bundle.
+    """
+    table = score_tables.rules(store, rules)
+    if table is None:
+        return None
+    pos = table.position(normalize_customer_id(customer_id))
+    if pos is None:
+        return None
+    return table.rule_scores(rule_set, pos)
+
+
+def customer_crs(store, customer_id, models=None, rules=None):
+    """The customer's CRS from the score table; None if not materialized, unknown or unscorable."""
+    table = score_tables.get(store, models, rules)
+    if table is None:
+        return None
+    pos = table.position(normalize_customer_id(customer_id))
+    if pos is None or np.isnan(table.crs[pos]):
+        return None
+    return float(table.crs[pos])
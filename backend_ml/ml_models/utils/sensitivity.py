@@ -0,0 +1,172 @@
+import numpy as np
+import pandas as pd
+
+from .batch_pricing import LOAN_TERMS, loan_terms, house_loan_arrays
+from .customer_store import normalize_customer_id
+from .model_features import FeatureMatrix, CRS_SPEC, RAS_SPEC
+from .model_registry import get_models
+from .rule_sets import get_rule_set
+
+
+# -------------------- What-If Sensitivity --------------------
+# Re-prices one customer under a grid of changed inputs (e.g. "credit score
+# 750 and utilisation 20%") in a single pass. The customer's row is repeated
+# once per scenario and the perturbed columns are overwritten. The whole frame
+# then goes through the rule engine and one CRS and one RAS model call.
+# Besides the full grid, each feature is also varied on its own, with every
+# other input at the customer's value, to give its marginal BPS impact.
+
+SENSITIVITY_MAX_SCENARIOS = 20000
+
+
+def _model_inputs():
+    """Raw fields the CRS / RAS models read (the loan terms come from the request)."""
+    return {col for spec in (CRS_SPEC, RAS_SPEC) for feat in spec.features
+            if feat.fill != "request" for col in feat.sources}
+
+
+def _plain(value):
+    # numpy scalars / NaN -> JSON-friendly values
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+def _json(values, shape=None):
+    values = np.asarray(values, dtype=float)
+    values = np.where(np.isnan(values), None, values)
+    return (values.reshape(shape) if shape is not None else values).tolist()
+
+
+def _axes(perturbations, current, allowed):
+    """[(feature, values)] of the perturbation grid. Raises ValueError on bad input."""
+    if not isinstance(perturbations, dict) or not perturbations:
+        raise ValueError("perturbations must be a non-empty object of feature -> values.")
+    axes = []
+    for feat, values in perturbations.items():
+        if feat not in allowed:
+            raise ValueError(f"{feat} is not a pricing input; choose from {sorted(allowed)}.")
+        if isinstance(values, dict):
+            # {"delta": [-50, 50]}: offsets from the customer's current value
+            deltas = values.get("delta")
+            base = pd.to_numeric(pd.Series([current.get(feat)]), errors="coerce")[0]
+            if np.isnan(base):
+                raise ValueError(f"{feat}: delta needs a numeric current value.")
+            if not isinstance(deltas, list) or not deltas:
+                raise ValueError(f"{feat}: delta must be a non-empty list of numbers.")
+            try:
+                values = [float(base) + float(d) for d in deltas]
+            except (TypeError, ValueError):
+                raise ValueError(f"{feat}: delta must be a non-empty list of numbers.")
+        if not isinstance(values, list) or not values:
+            raise ValueError(f"{feat} must be a non-empty list of values (or {{\"delta\": [...]}}).")
+        for value in values:
+            if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+                raise ValueError(f"{feat}: values must be numbers or labels.")
+            if feat in LOAN_TERMS and isinstance(value, str):
+                raise ValueError(f"{feat}: values must be numbers.")
+        axes.append((feat, values))
+    return axes
+
+
+def sensitivity_surface(data, store, market_bps, models=None, rules=None):
+    """
+    Prices a customer of the book under every combination of the payload's
+    perturbations (feature -> list of values, or {"delta": [...]}), by the
+    rule engine (as the rater endpoint) and by the CRS/RAS models (as the
+    predict endpoint). Returns the axes, the baseline, the rate surfaces as
+    nested lists indexed [value of feature 1][value of feature 2]..., and
+    the marginal BPS of each feature on its own. Raises ValueError on bad input.
+    """
+    customer_id = normalize_customer_id(data.get("customer_id", ""))
+    if not customer_id:
+        raise ValueError("customer_id is required.")
+    terms = loan_terms(data, {})
+    row = store.get(customer_id)
+    if row is None:
+        raise ValueError(f"No customer with ID {customer_id}")
+    models = models or get_models()
+    rules = rules or get_rule_set()
+
+    current = {**row.to_dict(), **dict(zip(LOAN_TERMS, terms))}
+    allowed = set(rules.columns) | _model_inputs() | set(LOAN_TERMS)
+    axes = _axes(data.get("perturbations"), current, allowed)
+    shape = tuple(len(values) for _, values in axes)
+    n_grid = int(np.prod(shape))
+    # Row 0 is the customer as is, then each feature on its own, then the grid.
+    n = 1 + sum(shape) + n_grid
+    if n > SENSITIVITY_MAX_SCENARIOS:
+        raise ValueError(f"At most {SENSITIVITY_MAX_SCENARIOS} scenarios per request "
+                         f"(this grid needs {n}).")
+
+    # choice[k, i]: index into feature k's values for row i (-1: current value)
+    choice = np.full((len(axes), n), -1, dtype=np.intp)
+    start = 1
+    for k, size in enumerate(shape):
+        choice[k, start:start + size] = np.arange(size)
+        start += size
+    choice[:, start:] = np.indices(shape).reshape(len(axes), -1)
+
+    frame = pd.DataFrame([row]).infer_objects().iloc[np.zeros(n, dtype=np.intp)].reset_index(drop=True)
+    row_terms = np.tile(terms, (n, 1))
+    for k, (feat, values) in enumerate(axes):
+        options = np.array(list(values) + [current.get(feat)], dtype=object)
+        column = options[np.where(choice[k] < 0, len(values), choice[k])]
+        if feat in LOAN_TERMS:
+            row_terms[:, LOAN_TERMS.index(feat)] = column.astype(float)
+        else:
+            frame[feat] = pd.Series(column).infer_objects()
+
+    rule_bps = rules.score("house_loan", frame)[0]
+    rule_rate = row_terms[:, 2] - rule_bps / 100 - market_bps / 100
+    crs, complete, crs_scores, ras_scores, model_bps, _, model_rate = house_loan_arrays(
+        FeatureMatrix.from_frame(frame), np.arange(n, dtype=np.int64), row_terms, models)
+
+    grid = slice(1 + sum(shape), n)
+    marginal = {}
+    start = 1
+    for feat, values in axes:
+        rows = slice(start, start + len(values))
+        marginal[feat] = {
+            "values": values,
+            "rule_bps": _json(rule_bps[rows] - rule_bps[0]),
+            "model_bps": _json(model_bps[rows] - model_bps[0]),
+        }
+        start += len(values)
+
+    result = {
+        "customer_id": customer_id,
+        "loan_amount": terms[0],
+        "loan_duration": terms[1],
+        "base_rate": terms[2],
+        "market_bps": market_bps,
+        "features": [feat for feat, _ in axes],
+        "values": [values for _, values in axes],
+        "baseline": {
+            "inputs": {feat: _plain(current.get(feat)) for feat, _ in axes},
+            "rule_bps": _plain(rule_bps[0]),
+            "rule_rate": _plain(rule_rate[0]),
+            "CRS": _plain(crs_scores[0]),
+            "RAS": _plain(ras_scores[0]),
+            "model_bps": _plain(model_bps[0]),
+            "model_rate": _plain(model_rate[0]),
+        },
+        "surface": {
+            "rule_bps": _json(rule_bps[grid], shape),
+            "rule_rate": _json(rule_rate[grid], shape),
+            "CRS": _json(crs_scores[grid], shape),
+            "RAS": _json(ras_scores[grid], shape),
+            "model_bps": _json(model_bps[grid], shape),
+            "model_rate": _json(model_rate[grid], shape),
+        },
+        "marginal_bps": marginal,
+        "scenarios": n_grid,
+        "model_version": models.version,
+        "rule_set_version": rules.version,
+    }
+    if not complete.all():
+        first = int(np.flatnonzero(~complete)[0])
+        result["model_error"] = "Missing CRS fields: " + ", ".join(CRS_SPEC.missing_fields(crs[first]))
+    return result
@@ -15,7 +15,7 @@ import matplotlib.pyplot as plt
 from django.conf import settings
 import google.generativeai as genai
 from pandasai import SmartDataframe
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from langchain_google_genai import ChatGoogleGenerativeAI
 
@@ -32,15 +32,29 @@ from .utils.fiass import build_faiss_index_from_pdf
 from .utils.house_loan_rag import rag_predict_scores,rag_crs_predict_scores
 from .utils.web_scrape import save_sbi_fd_rates ,save_house_loan_to_json
 from .utils.extract_data import map_columns_with_llm , extract_text_from_pdf ,extract_customer_data_from_pdf
-from .utils.house_loan import classification_model_prediction , regression_model_prediction ,calculate_house_loan_bps,preprocess_input_for_regression
+from .utils.house_loan import classification_model_prediction , regression_model_prediction ,calculate_house_loan_bps,preprocess_input_for_regression, crs_batcher, ras_batcher
 from .utils.fixed_deposit import calculate_fd_bps
 from .utils.issuehouseloan import get_factor_bps
 from .utils.house_loan_interest import process_customer_fixed_deposit,process_customer_house_loan
 from .utils.market_trends import get_market_trends
+from .utils.customer_store import get_customer_store, normalize_customer_id, CUSTOMER_CSV_PATH
+from .utils.customer_query import parse_query
+from .utils.model_features import CRS_SPEC, RAS_SPEC
+from .utils.customer_upsert import UPSERT, INGEST_MODES
+from .utils.batch_pricing import batch_items_from_payload, house_loan_quotes, fd_offer_grid
+from .utils.model_registry import get_models, activate_model_version, registry as model_registry
+from .utils.prediction_cache import prediction_cache
+from .utils.score_table import score_tables, customer_crs
+from .utils.sensitivity import sensitivity_surface
+from .utils.rule_sets import get_rule_set, activate_rule_set, registry as rule_set_registry
+from .utils.rule_impact import simulate_rule_change, candidate_rule_set, IMPACT_TOP_MOVERS, IMPACT_BINS
 
 
 LOCAL_SCHEMA_COLUMNS = ["CustomerID", "CustomerName", "Tenure", "Age", "Gender", "MaritalStatus", "AnnualIncome", "MonthlyIncome", "CreditScore", "EmploymentStatus", "EducationLevel", "Experience", "LoanAmount", "LoanDuration", "NumberOfDependents", "HomeOwnershipStatus", "MonthlyDebtPayments", "CreditCardUtilizationRate", "NumberOfOpenCreditLines", "NumberOfCreditInquiries", "DebtToIncomeRatio", "BankruptcyHistory", "LoanPurpose", "PreviousLoanDefaults", "PaymentHistory", "LengthOfCreditHistory", "SavingsAccountBalance", "CheckingAccountBalance", "TotalAssets", "TotalLiabilities", "UtilityBillsPaymentHistory", "JobTenure", "NetWorth", "BaseInterestRate", "InterestRate", "MonthlyLoanPayment", "TotalDebtToIncomeRatio", "Geography", "NumOfProducts", "HasCrCard", "IsActiveMember"]
 
+# Fields returned by the customer detail lookup.
+CUSTOMER_SUMMARY_COLUMNS = ["CustomerID", "CustomerName", "Age", "CreditScore", "MaritalStatus", "EducationLevel", "AnnualIncome", "HomeOwnershipStatus"]
+
 
 
 
@@ -70,100 +84,43 @@ def get_house_loan_interest_rate(request):
             if loan_amount is None or loan_duration is None or base_rate is None:
                 return JsonResponse({"error": "LoanAmount, LoanDuration, and BaseRate are required."}, status=400)
 
-            # Load the customer data from CSV
-            db_path = os.path.join(settings.BASE_DIR, 'db', 'houseloan','sample_data.csv')
-            df = pd.read_csv(db_path)
-            df["CustomerID"] = df["CustomerID"].astype(str).str.replace('\ufeff', '').str.strip()
-            customer_id = str(customer_id).strip()
+            # One model version scores the whole request, even across a hot swap.
+            models = get_models()
 
-            # Now match the row
-            row = df[df["CustomerID"] == customer_id]
-            
+            # Gather the customer's encoded model inputs from the book's feature matrix
+            customer_id = normalize_customer_id(customer_id)
+            store = get_customer_store()
+            features = store.features([customer_id])
+            position = features.positions([customer_id])[0]
 
-            if row.empty:
+            if position < 0:
                 raise ValueError(f"No customer with ID {customer_id}")
 
-
-            customer_row = row.iloc[0]
-            geography_value = customer_row['Geography']
-            geography_encoded = pd.Categorical([geography_value]).codes[0]
-            gender_value = customer_row['Gender']
-            gender_encoded = pd.Categorical([gender_value]).codes[0]
-            cr_value = customer_row['HasCrCard']
-            cr_encoded = pd.Categorical([cr_value]).codes[0]
-            active_value = customer_row['IsActiveMember']
-            active_value_encoded = pd.Categorical([active_value]).codes[0]
-            crs_input = {
-                'CreditScore': customer_row['CreditScore'],
-                'Geography': geography_encoded,
-                'Gender': gender_encoded,
-                'Age': customer_row['Age'],
-                'Tenure': customer_row['Tenure'],
-                # Sum Checking and Savings balances to get the total Balance for the model.
-                'Balance': customer_row['SavingsAccountBalance'] + customer_row['CheckingAccountBalance'],
-                'NumOfProducts': customer_row['NumOfProducts'],
-                'HasCrCard': cr_encoded,
-                'IsActiveMember': active_value_encoded,
-                # Use AnnualIncome as EstimatedSalary as per your mapping.
-                'EstimatedSalary': customer_row['AnnualIncome']
-            }
-            missing_crs = [k for k, v in crs_input.items() if v is None or pd.isnull(v)]
+            crs_input = CRS_SPEC.gather(features, position)
+            missing_crs = CRS_SPEC.missing_fields(crs_input)
             print("Missing CRS fields:", missing_crs)
 
             # Assemble RAS inputs...
-            payment_value = customer_row['PaymentHistory']
-            payment_value_encoded = pd.Categorical([payment_value]).codes[0]
-            utility_payment_value = customer_row['UtilityBillsPaymentHistory']
-            utility_payment_value_encoded = pd.Categorical([utility_payment_value]).codes[0]
-            ras_input = {
-                'Age': customer_row['Age'],
-                'AnnualIncome': customer_row['AnnualIncome'],  # Assuming AnnualIncome is monthly
-                'CreditScore': customer_row['CreditScore'],
-                'EmploymentStatus': customer_row['EmploymentStatus'],
-                'EducationLevel': customer_row['EducationLevel'],
-                'Experience': customer_row['Experience'],
-                'LoanAmount': loan_amount,
-                'LoanDuration': loan_duration,
-                'MaritalStatus': customer_row['MaritalStatus'],
-                'NumberOfDependents': customer_row['NumberOfDependents'],
-                'HomeOwnershipStatus': customer_row['HomeOwnershipStatus'],
-                'MonthlyDebtPayments': customer_row['MonthlyDebtPayments'],
-                'CreditCardUtilizationRate': customer_row['CreditCardUtilizationRate'],
-                'NumberOfOpenCreditLines': customer_row['NumberOfOpenCreditLines'],
-                'NumberOfCreditInquiries': customer_row['NumberOfCreditInquiries'],
-                'DebtToIncomeRatio': customer_row['DebtToIncomeRatio'],
-                'BankruptcyHistory': customer_row['BankruptcyHistory'],
-                'LoanPurpose': customer_row['LoanPurpose'],
-                'PreviousLoanDefaults': customer_row['PreviousLoanDefaults'],
-                'PaymentHistory': payment_value_encoded,
-                'LengthOfCreditHistory': customer_row['LengthOfCreditHistory'],
-                'SavingsAccountBalance': customer_row['SavingsAccountBalance'],
-                'CheckingAccountBalance': customer_row['CheckingAccountBalance'],
-                'TotalAssets': customer_row['TotalAssets'],
-                'TotalLiabilities': customer_row['TotalLiabilities'],
-                'MonthlyIncome': customer_row['MonthlyIncome'],
-                'UtilityBillsPaymentHistory': utility_payment_value_encoded,
-                'JobTenure': customer_row['JobTenure'],
-                'NetWorth': customer_row['NetWorth'],
-                'BaseInterestRate': customer_row['BaseInterestRate'],
-                'InterestRate': customer_row['InterestRate'],
-                'MonthlyLoanPayment': customer_row['MonthlyLoanPayment'],
-                'TotalDebtToIncomeRatio': customer_row['TotalDebtToIncomeRatio']
-            }
-            missing_ras = [k for k, v in ras_input.items() if v is None or pd.isnull(v)]
+            ras_input = RAS_SPEC.gather(features, position, LoanAmount=loan_amount, LoanDuration=loan_duration)
+            missing_ras = RAS_SPEC.missing_fields(ras_input)
             print("Missing RAS fields:", missing_ras)
 
             # Predict CRS and RAS scores using the appropriate models.
             if not missing_crs or not missing_ras:
-                crs_score = classification_model_prediction(crs_input)
-                ras_score = regression_model_prediction(ras_input)
+                # CRS only depends on the customer: read it from the materialized score table.
+                crs_score = customer_crs(store, customer_id, models)
+                if crs_score is None:
+                    crs_score = classification_model_prediction(crs_input, models)
+                ras_score = regression_model_prediction(ras_input, models)
+                model_version = models.version
             else:
                 print(f"[WARN] Missing CRS fields {missing_crs}, using fallback.")
                 print(f"[WARN] Missing RAS fields {missing_ras}, using fallback.")
-                score = rag_predict_scores(ras_input,crs_input)
+                score = rag_predict_scores(RAS_SPEC.as_dict(ras_input), CRS_SPEC.as_dict(crs_input))
                 print("gemini response",score)
                 crs_score = score['CRS']
                 ras_score = score['RAS']
+                model_version = "llm_fallback"
 
             # Compute BPS and the final interest rate.
             bps, deduction, final_rate = calculate_house_loan_bps(crs_score, ras_score,base_rate)
@@ -176,7 +133,8 @@ def get_house_loan_interest_rate(request):
                 "BPS_Deduction": deduction,
                 "loan_amount": loan_amount,
                 "loan_duration": loan_duration,
-                "FinalRate": final_rate
+                "FinalRate": final_rate,
+                "model_version": model_version
             }
 
             print("Response:", response_data)
@@ -202,10 +160,11 @@ def get_house_loan_interest_rater(request):
                 return JsonResponse({"error": "Missing or invalid customer_id, LoanAmount, LoanDuration, or BaseRate."}, status=400)
 
             # Load customer CSV
-            csv_path = os.path.join(settings.BASE_DIR, 'db', 'houseloan', 'sample_data.csv')
+            csv_path = CUSTOMER_CSV_PATH
             
-            # updated bps calculation 
-            results ,bps= process_customer_house_loan(csv_path,customer_id,base_rate)
+            # updated bps calculation (one rule set for the whole quote)
+            rules = get_rule_set()
+            results ,bps= process_customer_house_loan(csv_path,customer_id,base_rate,rules)
             
 
             # bps based on market trends
@@ -222,7 +181,8 @@ def get_house_loan_interest_rater(request):
                 "customer_id": customer_id,
                 "loan_amount": loan_amount,
                 "loan_duration": loan_duration,
-                "results": results
+                "results": results,
+                "rule_set_version": rules.version
             })
 
         except Exception as e:
@@ -231,6 +191,79 @@ def get_house_loan_interest_rater(request):
     return JsonResponse({"error": "POST method required."}, status=405)
 
 
+@csrf_exempt
+def house_loan_batch_predict(request):
+    """
+    Prices many house-loan quotes in one call, streamed back as NDJSON (one
+    quote per line, same fields as house_loan_predict plus customer_id).
+
+    Endpoint: POST /api/house_loan_batch_predict/
+    Body:
+        {
+          "customer_ids": ["CUSTBEST", "CUSTBAD"],        # priced from the book, or
+          "profiles": [{"CustomerID": "X1", "CreditScore": 700, ...}],  # ad-hoc records
+          "LoanAmount": 500000, "LoanDuration": 240, "BaseRate": 8.5
+        }
+    A profile may carry its own LoanAmount / LoanDuration / BaseRate.
+    Priced quotes carry the model_version that scored them.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "POST method required."}, status=405)
+
+    try:
+        payload = json.loads(request.body or b"{}")
+        store = get_customer_store()
+        labels, matrix, positions, terms = batch_items_from_payload(payload, store)
+        models = get_models()
+        scores = score_tables.get(store, models) if payload.get("profiles") is None else None
+    except (ValueError, TypeError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+    print(f"Batch house-loan pricing: {len(labels)} quotes (model {models.version})")
+    chunks = house_loan_quotes(labels, matrix, positions, terms, models=models, scores=scores)
+    return StreamingHttpResponse(
+        ("".join(json.dumps(quote) + "\n" for quote in quotes) for quotes in chunks),
+        content_type="application/x-ndjson",
+    )
+
+
+@csrf_exempt
+def house_loan_sensitivity(request):
+    """
+    What-if pricing for one customer over a grid of changed inputs, evaluated
+    in one pass through the rule engine and the CRS/RAS models.
+
+    Endpoint: POST /api/house_loan_sensitivity/
+    Body:
+        {
+          "customer_id": "CUSTBEST", "LoanAmount": 500000, "LoanDuration": 240, "BaseRate": 8.5,
+          "perturbations": {"CreditScore": [650, 700, 750],
+                            "CreditCardUtilizationRate": {"delta": [-0.1, 0.1]}},
+          "market_bps": 12.5      # optional; fetched once via get_market_trends otherwise
+        }
+    Response: the axes (features, values), the baseline, rule / model rates as
+    nested lists indexed [value of feature 1][value of feature 2]..., and
+    marginal_bps (the BPS change when one feature moves on its own).
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "POST method required."}, status=405)
+
+    try:
+        payload = json.loads(request.body or b"{}")
+        market_bps = payload.get("market_bps")
+        market_bps = get_market_trends() if market_bps is None else float(market_bps)
+        result = sensitivity_surface(payload, get_customer_store(), market_bps,
+                                        get_models(), get_rule_set())
+    except (ValueError, TypeError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+    print(f"Sensitivity for {result['customer_id']}: {result['scenarios']} scenarios "
+          f"over {result['features']}")
+    return JsonResponse(result, status=200)
 
 
 @csrf_exempt
@@ -298,67 +331,127 @@ def get_house_loan_json_last_modified(request):
 # -------------------- GENERAL VIEWS -----------------------
 
 
+CUSTOMER_PAGE_MAX_LIMIT = 1000
+CUSTOMER_STREAM_CHUNK_SIZE = 500
+
+
+def _records_with_placeholders(df):
+    """
+    Converts a DataFrame slice to records, replacing every null with
+    "Not Obtained" in one vectorised pass instead of a per-cell loop.
+    """
+    df = df.astype(object).where(df.notna(), "Not Obtained")
+    return df.to_dict(orient='records')
+
+
+def _stream_customer_ndjson(store, start, stop, columns):
+    for chunk_start in range(start, stop, CUSTOMER_STREAM_CHUNK_SIZE):
+        chunk = store.rows(chunk_start, min(chunk_start + CUSTOMER_STREAM_CHUNK_SIZE, stop), columns)
+        yield "".join(json.dumps(record, default=str) + "\n" for record in _records_with_placeholders(chunk))
+
+
 @csrf_exempt
 def customer_details(request):
+    """
+    Lists customers.
+
+    Query params (all optional):
+        columns  comma-separated list of fields to return
+        limit    page size (max 1000); omit for the whole book
+        cursor   opaque cursor from a previous page's "next_cursor"
+        format   "ndjson" streams one JSON object per line in chunks
+    """
     if request.method != "GET":
         return JsonResponse({"error": "Only GET requests are allowed."}, status=405)
 
-    csv_folder = os.path.join(settings.BASE_DIR, "db", "houseloan")
-    csv_path = os.path.join(csv_folder, "sample_data.csv")  # Adjust this path if needed
-    if not os.path.exists(csv_path):
+    store = get_customer_store()
+    if not store.exists():
         return JsonResponse({"error": "CSV file not found"}, status=404)
 
     try:
-        df = pd.read_csv(csv_path)
-        json_data = df.to_dict(orient='records')  # Convert the DataFrame to a list of dictionaries
+        columns = request.GET.get("columns")
+        columns = [c.strip() for c in columns.split(",") if c.strip()] if columns else None
+        start = int(request.GET.get("cursor") or 0)
+        limit = request.GET.get("limit")
+        limit = int(limit) if limit else None
+        if start < 0 or (limit is not None and not 0 < limit <= CUSTOMER_PAGE_MAX_LIMIT):
+            raise ValueError
+    except ValueError:
+        return JsonResponse({"error": f"cursor must be >= 0 and limit between 1 and {CUSTOMER_PAGE_MAX_LIMIT}."}, status=400)
 
-        # Loop over each record and replace null values with "Not Obtained"
-        for record in json_data:
-            for key, value in record.items():
-                # Use pandas isna to catch NaN values as well as None
-                if pd.isna(value):
-                    record[key] = "Not Obtained"
+    try:
+        total = len(store)
+        stop = total if limit is None else min(start + limit, total)
+
+        if request.GET.get("format") == "ndjson":
+            return StreamingHttpResponse(
+                _stream_customer_ndjson(store, start, stop, columns),
+                content_type="application/x-ndjson",
+            )
+
+        json_data = _records_with_placeholders(store.rows(start, stop, columns))
+        next_cursor = str(stop) if stop < total else None
+        return JsonResponse({"details": json_data, "next_cursor": next_cursor, "total": total}, status=200)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+@csrf_exempt
+def customer_query(request):
+    """
+    Filtered customer search evaluated on the server.
+
+    Endpoint: POST /api/customer-query/
+    Body:
+        {
+          "filters": [{"field": "CreditScore", "op": ">", "value": 750},
+                      {"field": "Geography", "op": "==", "value": "France"}],
+          "sort": [{"field": "CreditScore", "desc": true}],
+          "limit": 100,
+          "columns": ["CustomerID", "CustomerName", "CreditScore"]
+        }
+    Ops: ==, !=, >, >=, <, <=, in, between.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "POST method required."}, status=405)
 
-        return JsonResponse({"details": json_data}, status=200)
+    try:
+        payload = json.loads(request.body or b"{}")
+        filters, sort, limit, columns = parse_query(payload)
+        count, result = get_customer_store().query(filters, sort, limit, columns)
+    except (ValueError, TypeError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
+    return JsonResponse({
+        "count": count,
+        "returned": len(result),
+        "results": _records_with_placeholders(result),
+    }, status=200)
+
+
 @csrf_exempt
 def customer_details_by_id(request, cid):
     if request.method != "GET":
         return JsonResponse({"error": "Only GET requests are allowed."}, status=405)
 
-    csv_folder = os.path.join(settings.BASE_DIR, "db", "houseloan")
-    csv_path = os.path.join(csv_folder, "sample_data.csv")
-
-    if not os.path.exists(csv_path):
+    store = get_customer_store()
+    if not store.exists():
         return JsonResponse({"error": "CSV file not found"}, status=404)
 
     try:
-        df = pd.read_csv(csv_path)
-        df["CustomerID"] = df["CustomerID"].astype(str)
-
-        customer = df[df["CustomerID"] == str(cid)]
-        if customer.empty:
+        customer = store.get(cid, columns=CUSTOMER_SUMMARY_COLUMNS)
+        if customer is None:
             return JsonResponse({"error": "Customer not found"}, status=404)
 
-        customer_dict = customer.iloc[0].to_dict()
+        customer_dict = customer.to_dict()
 
         # Replace nulls with "Not Obtained"
         for key in customer_dict:
             if pd.isna(customer_dict[key]):
                 customer_dict[key] = "Not Obtained"
 
-        minimal_data = {
-            "CustomerID": customer_dict.get("CustomerID"),
-            "CustomerName": customer_dict.get("CustomerName"),
-            "Age": customer_dict.get("Age"),
-            "CreditScore": customer_dict.get("CreditScore"),
-            "MaritalStatus": customer_dict.get("MaritalStatus"),
-            "EducationLevel": customer_dict.get("EducationLevel"),
-            "AnnualIncome": customer_dict.get("AnnualIncome"),
-            "HomeOwnershipStatus": customer_dict.get("HomeOwnershipStatus")
-        }
+        minimal_data = {col: customer_dict.get(col) for col in CUSTOMER_SUMMARY_COLUMNS}
 
         return JsonResponse(minimal_data, status=200)
 
@@ -406,6 +499,11 @@ def add_customer_data(request):
         added_by = request.POST.get('addedBy', 'admin')
         print("added_by:", added_by)
 
+        # "upsert" (default) replaces rows by CustomerID; "append" keeps every row.
+        mode = request.POST.get('mode', UPSERT).lower()
+        if mode not in INGEST_MODES:
+            return JsonResponse({"error": f"mode must be one of {list(INGEST_MODES)}."}, status=400)
+
         uploaded_file = request.FILES.get('file')
         if not uploaded_file:
             print("No file uploaded.")
@@ -445,16 +543,10 @@ def add_customer_data(request):
             print("DataFrame after appending AddedBy:")
             print(df.head())
 
-            local_db_path = os.path.join(settings.BASE_DIR, 'db', 'houseloan', 'sample_data.csv')
-            
-            if os.path.exists(local_db_path):
-                df.to_csv(local_db_path, mode='a', header=False, index=False)
-                print("CSV appended to existing file.")
-            else:
-                df.to_csv(local_db_path, index=False)
-                print("CSV created as new file.")
+            report = get_customer_store().append(df, added_by=added_by, mode=mode)
 
-            return JsonResponse({"message": "File processed and data saved.", "addedBy": added_by})
+            return JsonResponse({"message": "File processed and data saved.", "addedBy": added_by,
+                                 "mode": mode, "report": report})
 
         elif filename.endswith('.pdf'):
             try:
@@ -480,16 +572,10 @@ def add_customer_data(request):
             print("DataFrame created from PDF data:")
             print(df_pdf.head())
 
-            local_db_path = os.path.join(settings.BASE_DIR, 'db', 'houseloan', 'sample_data.csv')
-            
-            if os.path.exists(local_db_path):
-                df_pdf.to_csv(local_db_path, mode='a', header=False, index=False)
-                print("PDF data appended to existing CSV.")
-            else:
-                df_pdf.to_csv(local_db_path, index=False)
-                print("PDF data written to new CSV.")
+            report = get_customer_store().append(df_pdf, added_by=added_by, mode=mode)
 
-            return JsonResponse({"message": "PDF processed and customer data saved.", "addedBy": added_by})
+            return JsonResponse({"message": "PDF processed and customer data saved.", "addedBy": added_by,
+                                 "mode": mode, "report": report})
         else:
             print("Unsupported file type:", filename)
             return JsonResponse({"error": "File type not supported for processing."}, status=400)
@@ -499,6 +585,149 @@ def add_customer_data(request):
         return JsonResponse({"error": "An unexpected error occurred: " + str(e)}, status=500)
 
 
+@csrf_exempt
+def model_version_admin(request):
+    """
+    Lists the model versions under model_weights or hot-swaps the active one.
+
+    Endpoint: /api/admin/model-version/
+      GET  -> {"active": "base", "versions": ["base", "v2"], "loaded": [...],
+               "prediction_cache": {"hits": ..., "misses": ..., ...},
+               "inference_batching": {"crs": {"mean_batch_size": ..., ...}, "ras": {...}},
+               "score_tables": [{"rows": ..., "model_version": ..., "rescored": {...}}]}
+      POST {"version": "v2"} -> loads v2, then makes it the active version for
+           new requests; requests already in flight finish on the old one.
+    When settings.MODEL_ADMIN_TOKEN is set, the X-Admin-Token header must match it.
+    """
+    token = getattr(settings, "MODEL_ADMIN_TOKEN", None)
+    if token and request.headers.get("X-Admin-Token") != token:
+        return JsonResponse({"error": "Invalid admin token."}, status=403)
+
+    if request.method == "GET":
+        try:
+            get_models()
+            return JsonResponse({**model_registry.describe(), "prediction_cache": prediction_cache.stats(),
+                                 "inference_batching": {"crs": crs_batcher.stats(), "ras": ras_batcher.stats()},
+                                 "score_tables": score_tables.describe()})
+        except Exception as e:
+            return JsonResponse({"error": str(e)}, status=500)
+
+    if request.method != "POST":
+        return JsonResponse({"error": "Only GET and POST requests are allowed."}, status=405)
+
+    try:
+        data = json.loads(request.body or b"{}") if request.content_type == "application/json" else request.POST
+        version = data.get("version")
+        if not version:
+            raise ValueError("version is required.")
+        bundle, previous = activate_model_version(version)
+    except (ValueError, TypeError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+    print(f"Model version switched from {previous} to {bundle.version}")
+    try:
+        # Rescore the book's CRS now rather than on the next quote.
+        score_tables.refresh(get_customer_store())
+    except Exception as e:
+        print("Score table refresh failed:", e)
+    return JsonResponse({"message": f"Model version {bundle.version} is active.",
+                         "active": bundle.version, "previous": previous})
+
+
+@csrf_exempt
+def rule_set_admin(request):
+    """
+    Lists the pricing rule sets under ml_models/rule_sets or hot-swaps the active one.
+
+    Endpoint: /api/admin/rule-set/
+      GET  -> {"active": "base", "versions": ["base", "v2"], "rule_set": {...}}
+      POST {"version": "v2"} -> validates and compiles v2, then makes it the
+           active rule set for new quotes; an invalid file is rejected (400)
+           and the current rule set stays live.
+    When settings.MODEL_ADMIN_TOKEN is set, the X-Admin-Token header must match it.
+    """
+    token = getattr(settings, "MODEL_ADMIN_TOKEN", None)
+    if token and request.headers.get("X-Admin-Token") != token:
+        return JsonResponse({"error": "Invalid admin token."}, status=403)
+
+    if request.method == "GET":
+        try:
+            return JsonResponse(rule_set_registry.describe())
+        except Exception as e:
+            return JsonResponse({"error": str(e)}, status=500)
+
+    if request.method != "POST":
+        return JsonResponse({"error": "Only GET and POST requests are allowed."}, status=405)
+
+    try:
+        data = json.loads(request.body or b"{}") if request.content_type == "application/json" else request.POST
+        version = data.get("version")
+        if not version:
+            raise ValueError("version is required.")
+        rules, previous = activate_rule_set(version)
+    except (ValueError, TypeError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+    print(f"Rule set switched from {previous} to {rules.version}")
+    try:
+        # Rescore the book's rule columns now rather than on the next quote.
+        score_tables.refresh(get_customer_store())
+    except Exception as e:
+        print("Score table refresh failed:", e)
+    return JsonResponse({"message": f"Rule set {rules.version} is active.",
+                         "active": rules.version, "previous": previous,
+                         "fingerprint": rules.fingerprint})
+
+
+@csrf_exempt
+def rule_set_impact(request):
+    """
+    Simulates a candidate rule set over the whole customer book before it goes live.
+
+    Endpoint: POST /api/admin/rule-set/impact/
+    Body:
+        {
+          "candidate": "v3",                # a rule-set version, or an inline rule-set document
+          "baseline": "v2",                 # optional; the active rule set by default
+          "rule_set": "house_loan",         # or "fixed_deposit"
+          "segments": ["EmploymentStatus"], # optional book columns to break the deltas down by
+          "top": 20, "bins": 20
+        }
+    Response: summary statistics, BPS / delta histograms, mean BPS per feature
+    and per segment, and the customers whose BPS moves the most.
+    When settings.MODEL_ADMIN_TOKEN is set, the X-Admin-Token header must match it.
+    """
+    token = getattr(settings, "MODEL_ADMIN_TOKEN", None)
+    if token and request.headers.get("X-Admin-Token") != token:
+        return JsonResponse({"error": "Invalid admin token."}, status=403)
+    if request.method != "POST":
+        return JsonResponse({"error": "POST method required."}, status=405)
+
+    try:
+        payload = json.loads(request.body or b"{}")
+        candidate = candidate_rule_set(payload.get("candidate"))
+        baseline = get_rule_set(payload.get("baseline"))
+        report = simulate_rule_change(
+            get_customer_store(), candidate, baseline,
+            rule_set=payload.get("rule_set", "house_loan"),
+            segments=payload.get("segments"),
+            top=payload.get("top", IMPACT_TOP_MOVERS),
+            bins=payload.get("bins", IMPACT_BINS),
+        )
+    except (ValueError, TypeError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+    print(f"Rule-set impact {baseline.version} -> {candidate.version}: {report['customers']} customers "
+          f"in {report['seconds']['total']}s")
+    return JsonResponse(report, status=200)
+
+
 
 
 # -------------------- FIXED DEPOSIT VIEWS -----------------
@@ -605,56 +834,37 @@ def get_fixed_deposit_interest_rate(request):
             if loan_amount is None or loan_duration is None or base_rate is None:
                 return JsonResponse({"error": "LoanAmount, LoanDuration, and BaseRate are required."}, status=400)
 
-            # Load the customer data from CSV
-            db_path = os.path.join(settings.BASE_DIR, 'db', 'houseloan','sample_data.csv')
-            df = pd.read_csv(db_path)
-            df["CustomerID"] = df["CustomerID"].astype(str).str.replace('\ufeff', '').str.strip()
-            customer_id = str(customer_id).strip()
+            # One model version scores the whole request, even across a hot swap.
+            models = get_models()
 
-            # Now match the row
-            row = df[df["CustomerID"] == customer_id]
-            
+            # Gather the customer's encoded model inputs from the book's feature matrix
+            customer_id = normalize_customer_id(customer_id)
+            store = get_customer_store()
+            features = store.features([customer_id])
+            position = features.positions([customer_id])[0]
 
-            if row.empty:
+            if position < 0:
                 raise ValueError(f"No customer with ID {customer_id}")
 
-
-            customer_row = row.iloc[0]
-            geography_value = customer_row['Geography']
-            geography_encoded = pd.Categorical([geography_value]).codes[0]
-            gender_value = customer_row['Gender']
-            gender_encoded = pd.Categorical([gender_value]).codes[0]
-            cr_value = customer_row['HasCrCard']
-            cr_encoded = pd.Categorical([cr_value]).codes[0]
-            active_value = customer_row['IsActiveMember']
-            active_value_encoded = pd.Categorical([active_value]).codes[0]
-            crs_input = {
-                'CreditScore': customer_row['CreditScore'],
-                'Geography': geography_encoded,
-                'Gender': gender_encoded,
-                'Age': customer_row['Age'],
-                'Tenure': customer_row['Tenure'],
-                # Sum Checking and Savings balances to get the total Balance for the model.
-                'Balance': customer_row['SavingsAccountBalance'] + customer_row['CheckingAccountBalance'],
-                'NumOfProducts': customer_row['NumOfProducts'],
-                'HasCrCard': cr_encoded,
-                'IsActiveMember': active_value_encoded,
-                # Use AnnualIncome as EstimatedSalary as per your mapping.
-                'EstimatedSalary': customer_row['AnnualIncome']
-            }
-            missing_crs = [k for k, v in crs_input.items() if v is None or pd.isnull(v)]
+            crs_input = CRS_SPEC.gather(features, position)
+            missing_crs = CRS_SPEC.missing_fields(crs_input)
             print("Missing CRS fields:", missing_crs)
 
           
 
             # Predict CRS and RAS scores using the appropriate models.
             if not missing_crs :
-                crs_score = classification_model_prediction(crs_input)
+                # CRS only depends on the customer: read it from the materialized score table.
+                crs_score = customer_crs(store, customer_id, models)
+                if crs_score is None:
+                    crs_score = classification_model_prediction(crs_input, models)
+                model_version = models.version
             else:
                 print(f"[WARN] Missing CRS fields {missing_crs}, using fallback.")
-                score = rag_crs_predict_scores(crs_input)
+                score = rag_crs_predict_scores(CRS_SPEC.as_dict(crs_input))
                 print("gemini response",score)
                 crs_score = score['CRS']
+                model_version = "llm_fallback"
 
             # Compute BPS and the final interest rate.
             norm_crs = crs_score *100
@@ -670,7 +880,8 @@ def get_fixed_deposit_interest_rate(request):
                 "Bonus_bps": bonus_bps,
                 "loan_amount": loan_amount,
                 "loan_duration": loan_duration,
-                "FinalRate": final_rate
+                "FinalRate": final_rate,
+                "model_version": model_version
             }
 
             print("Response:", response_data)
@@ -697,10 +908,11 @@ def get_fixed_deposit_interest_rater(request):
                 return JsonResponse({"error": "Missing or invalid customer_id, LoanAmount, LoanDuration, or BaseRate."}, status=400)
 
             # Load customer CSV
-            csv_path = os.path.join(settings.BASE_DIR, 'db', 'houseloan', 'sample_data.csv')
+            csv_path = CUSTOMER_CSV_PATH
             
-            # updated bps calculation 
-            results ,bps= process_customer_fixed_deposit(csv_path,customer_id,base_rate)
+            # updated bps calculation (one rule set for the whole quote)
+            rules = get_rule_set()
+            results ,bps= process_customer_fixed_deposit(csv_path,customer_id,base_rate,rules)
             
             # bps based on market trends
             market_bps = get_market_trends()
@@ -716,7 +928,8 @@ def get_fixed_deposit_interest_rater(request):
                 "customer_id": customer_id,
                 "loan_amount": loan_amount,
                 "loan_duration": loan_duration,
-                "results": results
+                "results": results,
+                "rule_set_version": rules.version
             })
 
         except Exception as e:
@@ -728,6 +941,41 @@ def get_fixed_deposit_interest_rater(request):
 
 
 
+@csrf_exempt
+def fixed_deposit_batch_offers(request):
+    """
+    FD offers for many customers over a grid of deposit amounts and tenures.
+
+    Endpoint: POST /api/fixed_deposit_batch_offers/
+    Body:
+        {
+          "customer_ids": ["CUSTBEST", "CUSTBAD"],   # or "profiles": [{...}]
+          "amounts": [100000, 500000, 1000000],
+          "tenures": [1, 3, 5],
+          "BaseRate": 6.5
+        }
+    Response: the grid axes, CRS per customer, bonus_bps / final_rate
+    as nested lists indexed [customer][amount][tenure], and model_version.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "POST method required."}, status=405)
+
+    try:
+        payload = json.loads(request.body or b"{}")
+        store = get_customer_store()
+        models = get_models()
+        scores = score_tables.get(store, models) if payload.get("profiles") is None else None
+        result = fd_offer_grid(payload, store, models, scores)
+    except (ValueError, TypeError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+    print(f"Batch FD offers: {len(result['customer_ids'])} customers x "
+          f"{len(result['amounts'])} amounts x {len(result['tenures'])} tenures")
+    return JsonResponse(result, status=200)
+
+
 # -----------------------------Chat bot agent --------------------
 
 
@@ -736,7 +984,7 @@ def get_fixed_deposit_interest_rater(request):
 
 
 
-df = pd.read_csv("C:\\Users\\Vishnu\\Documents\\Gitprojects\\Jatayu\\backend_ml\\db\\houseloan\\sample_data.csv")
+df = pd.read_csv(CUSTOMER_CSV_PATH)
 current_df = SmartDataframe(
                     df,
                     config={